@@ -14,6 +14,16 @@ def _render_context(plan: Dict[str, Any]) -> str:
     return "\n".join(parts)
 
 
+def _ranked(graph: Any, fqns: List[str], limit: int) -> List[str]:
+    # Most central first, so truncation keeps the context that matters most
+    if hasattr(graph, "rank"):
+        try:
+            return list(graph.rank(fqns, limit))
+        except Exception:
+            pass
+    return list(fqns)[:limit]
+
+
 def _graph_context(graph: Any, plan: Dict[str, Any]) -> str:
     # Attempt to include defs, callers, and owners for referenced modules/symbols
     lines: List[str] = []
@@ -35,7 +45,7 @@ def _graph_context(graph: Any, plan: Dict[str, Any]) -> str:
             try:
                 # If token looks like module path, include defs
                 if hasattr(graph, "defs_in") and "." in t:
-                    defs = graph.defs_in(t)[:10]
+                    defs = _ranked(graph, graph.defs_in(t), 10)
                     if defs:
                         lines.append(f"Defs({t}): {', '.join(defs)}")
                         # Include callers of first few defs
@@ -48,7 +58,7 @@ def _graph_context(graph: Any, plan: Dict[str, Any]) -> str:
                                 )
                                 if callers:
                                     lines.append(
-                                        f"WhoCalls({fqn}): {', '.join(callers[:5])}"
+                                        f"WhoCalls({fqn}): {', '.join(_ranked(graph, callers, 5))}"
                                     )
                             except Exception:
                                 pass
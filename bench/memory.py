@@ -0,0 +1,103 @@
+"""Resident-memory benchmark for a built CodeGraph.
+
+Each measurement runs in a fresh interpreter: it records RSS, builds (or warm
+loads) the graph for a synthetic repo, touches every cache section and reports
+the RSS delta. ``--baseline REV`` repeats the measurement against the ``tools/``
+package of another git revision, for a before/after comparison.
+
+    python -m bench.memory --modules 100 --baseline HEAD~1
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, Optional
+
+from bench.synth import generate
+
+_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs against older revisions too, so it only relies on what every CodeGraph
+# had: optional arguments and attributes are probed before use
+_PROBE = r"""
+import inspect, json, os, sys, time
+sys.path.insert(0, sys.argv[1])
+
+def rss():
+    with open("/proc/self/statm") as rf:
+        return int(rf.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+from tools.code_graph import CodeGraph
+base = rss()
+t0 = time.perf_counter()
+g = CodeGraph(sys.argv[2])
+if sys.argv[3] == "warm":
+    kw = {}
+    if "daemon" in inspect.signature(CodeGraph.load_or_build).parameters:
+        kw["daemon"] = False
+    g = CodeGraph.load_or_build(sys.argv[2], **kw)
+else:
+    g.build()
+# Force lazily loaded sections in so every structure is counted
+n_syms = len(g.symbols_by_fqn)
+for name in ("calls_by_module", "callers_by_callee", "modules"):
+    len(getattr(g, name, ()))
+elapsed = time.perf_counter() - t0
+used = rss() - base
+n_calls = getattr(g, "num_calls", None)
+if n_calls is None:
+    n_calls = len(g.calls)
+print(json.dumps({"rss_mb": round(used / 2**20, 1), "seconds": round(elapsed, 2),
+                  "symbols": n_syms, "calls": n_calls}))
+"""
+
+
+def measure(src_root: str, repo: str, mode: str) -> Dict[str, Any]:
+    out = subprocess.check_output(
+        [sys.executable, "-c", _PROBE, src_root, repo, mode], text=True
+    )
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def _checkout_tools(rev: str, dest: str) -> None:
+    """Extract ``tools/`` at ``rev`` into ``dest`` without touching the tree."""
+    archive = subprocess.check_output(["git", "-C", _REPO, "archive", rev, "tools"])
+    subprocess.run(["tar", "-x", "-C", dest], input=archive, check=True)
+
+
+def run(
+    modules: int, funcs: int, packages: int, baseline: Optional[str] = None
+) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = os.path.join(tmp, "repo")
+        info = generate(repo, packages, modules, funcs)
+        report: Dict[str, Any] = {"repo": info}
+        for mode in ("cold", "warm"):
+            # cold rebuilds from source; warm reloads the cache cold just saved
+            report.setdefault("current", {})[mode] = measure(_REPO, repo, mode)
+        if baseline:
+            old = os.path.join(tmp, "baseline")
+            os.makedirs(old)
+            _checkout_tools(baseline, old)
+            shutil.rmtree(os.path.join(repo, ".codegraph"), ignore_errors=True)
+            for mode in ("cold", "warm"):
+                report.setdefault("baseline", {})[mode] = measure(old, repo, mode)
+        return report
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="CodeGraph RSS benchmark")
+    p.add_argument("--packages", type=int, default=10)
+    p.add_argument("--modules", type=int, default=50, help="Modules per package")
+    p.add_argument("--funcs", type=int, default=100, help="Functions per module")
+    p.add_argument("--baseline", default=None, help="git revision to compare against")
+    a = p.parse_args()
+    print(json.dumps(run(a.modules, a.funcs, a.packages, a.baseline), indent=2))
+
+
+if __name__ == "__main__":
+    main()
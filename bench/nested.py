@@ -0,0 +1,82 @@
+"""Indexing time on deeply nested code.
+
+Generates one module whose functions nest ``depth`` levels deep, each level
+making ``calls`` calls, and times ``_summarize_tree`` on it. The single-pass
+visitor touches each node once, so time grows linearly with depth; for
+comparison ``--reference`` also times re-walking every def's subtree to collect
+its calls (the approach the visitor replaced, had it indexed nested defs), which
+grows quadratically.
+
+    python -m bench.nested --calls 200 --reference
+"""
+
+import argparse
+import ast
+import json
+import time
+from typing import Any, Dict, List
+
+from tools.code_graph import _summarize_tree
+
+
+def nested_source(depth: int, calls: int) -> str:
+    lines: List[str] = []
+    for d in range(depth):
+        pad = "    " * d
+        lines.append(f"{pad}def f{d}(x):")
+        lines.extend(f"{pad}    g{i}(x)" for i in range(calls))
+    lines.append("    " * depth + "return x")
+    return "\n".join(lines) + "\n"
+
+
+def _walk_per_def(tree: ast.AST) -> int:
+    n = 0
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            n += sum(isinstance(sub, ast.Call) for sub in ast.walk(node))
+    return n
+
+
+def _best(fn: Any, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(depths: List[int], calls: int, reference: bool, repeat: int = 3) -> List[Dict[str, Any]]:
+    rows = []
+    for depth in depths:
+        tree = ast.parse(nested_source(depth, calls))
+        summary = _summarize_tree("bench.py", "bench", False, "bench.py", tree)
+        row: Dict[str, Any] = {
+            "depth": depth,
+            "nodes": sum(1 for _ in ast.walk(tree)),
+            "symbols": len(summary.symbols),
+            "calls": len(summary.calls),
+            "visitor_s": round(
+                _best(lambda: _summarize_tree("bench.py", "bench", False, "bench.py", tree), repeat),
+                4,
+            ),
+        }
+        if reference:
+            row["walk_per_def_s"] = round(_best(lambda: _walk_per_def(tree), repeat), 4)
+        rows.append(row)
+    return rows
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Nested-code indexing benchmark")
+    p.add_argument("--depths", default="10,20,40,80", help="comma-separated nesting depths")
+    p.add_argument("--calls", type=int, default=100, help="Calls per nesting level")
+    p.add_argument("--reference", action="store_true", help="Also time per-def re-walks")
+    a = p.parse_args()
+    depths = [int(d) for d in a.depths.split(",") if d]
+    for row in run(depths, a.calls, a.reference):
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
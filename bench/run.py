@@ -0,0 +1,176 @@
+"""CodeGraph timing suite over a synthetic repo.
+
+Times a cold ``build``, a no-change rebuild from the warm cache, a single-file
+incremental rebuild and the hot queries (``who_calls``, ``tests_for_module``,
+``search_refs``). Results are JSON (best of ``--repeat`` runs, in seconds) so
+runs on different commits can be compared:
+
+    python -m bench.run --out logs/bench.json
+    python -m bench.run --compare logs/bench.json --threshold 0.2
+
+With ``--compare``, any metric slower than the baseline by more than the
+threshold fraction (and by more than ``--floor`` seconds, to ignore timer noise
+on sub-millisecond queries) is reported and the exit status is 1.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+from bench.synth import generate
+from tools.code_graph import CodeGraph
+
+_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Roadmap targets (docs/ROADMAP.md): metric -> upper bound in seconds
+TARGETS = {"cold_build_s": 3.0, "incremental_s": 0.4}
+
+
+def _best(fn: Callable[[], Any], repeat: int, setup: Callable[[], Any] = lambda: None) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        setup()
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _per_call(fn: Callable[[Any], Any], args: List[Any], repeat: int) -> float:
+    """Best average seconds per call of ``fn`` over ``args``."""
+    return _best(lambda: [fn(a) for a in args], repeat) / max(1, len(args))
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "-C", _REPO, "rev-parse", "--short", "HEAD"],
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except Exception:
+        return ""
+
+
+def run_suite(
+    root: str, jobs: int = 1, repeat: int = 3, queries: int = 200
+) -> Dict[str, float]:
+    results: Dict[str, float] = {}
+
+    def cold() -> None:
+        CodeGraph(root).build(ignore_cache=True, jobs=jobs)
+
+    results["cold_build_s"] = _best(cold, repeat)
+    warm = lambda: CodeGraph.load_or_build(root, daemon=False)  # noqa: E731
+    warm()
+    results["no_change_rebuild_s"] = _best(warm, repeat)
+
+    # Alternate one module between two contents so every run sees a change
+    target = os.path.join(root, "pkg0", "m0.py")
+    with open(target, "r", encoding="utf-8") as rf:
+        original = rf.read()
+    state = {"n": 0}
+
+    def edit() -> None:
+        state["n"] += 1
+        with open(target, "w", encoding="utf-8") as wf:
+            wf.write(original + f"\n\ndef bench_edit_{state['n']}(x):\n    return f0(x)\n")
+
+    results["incremental_s"] = _best(warm, repeat, setup=edit)
+    with open(target, "w", encoding="utf-8") as wf:
+        wf.write(original)
+    g = warm()
+
+    modules = sorted(m for m in g.modules if not m.startswith("tests"))
+    step = max(1, len(modules) // queries)
+    sample = modules[::step][:queries]
+    results["who_calls_s"] = _per_call(g.who_calls, [f"{m}.f1" for m in sample], repeat)
+    results["tests_for_module_s"] = _per_call(g.tests_for_module, sample, repeat)
+    patterns = [r"def fan\(", r"ext0\(x\)", r"class C1\d\b"]
+    g.search_refs(patterns[0])  # build the trigram index outside the timing
+    results["search_refs_s"] = _per_call(g.search_refs, patterns, repeat)
+    return results
+
+
+def compare(
+    current: Dict[str, float], baseline: Dict[str, float], threshold: float, floor: float
+) -> List[str]:
+    """Human-readable regressions of ``current`` against ``baseline``."""
+    out = []
+    for metric, base in sorted(baseline.items()):
+        cur = current.get(metric)
+        if cur is None or base <= 0:
+            continue
+        if cur > base * (1 + threshold) and cur - base > floor:
+            out.append(f"{metric}: {base:.4f}s -> {cur:.4f}s (+{(cur / base - 1) * 100:.0f}%)")
+    return out
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="CodeGraph benchmark suite")
+    p.add_argument("--packages", type=int, default=10)
+    p.add_argument("--modules", type=int, default=50, help="Modules per package")
+    p.add_argument("--funcs", type=int, default=100, help="Functions per module")
+    p.add_argument("--fanout", type=int, default=1, help="Imports per module")
+    p.add_argument("--nesting", type=int, default=0, help="Nested def depth per module")
+    p.add_argument("--jobs", type=int, default=1)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--root", default=None, help="Reuse/generate the repo here")
+    p.add_argument("--out", default=None, help="Write results JSON to this path")
+    p.add_argument("--compare", default=None, help="Baseline results JSON")
+    p.add_argument("--threshold", type=float, default=0.2)
+    p.add_argument("--floor", type=float, default=0.001)
+    a = p.parse_args()
+
+    params = {
+        "packages": a.packages,
+        "modules": a.modules,
+        "funcs": a.funcs,
+        "fanout": a.fanout,
+        "nesting": a.nesting,
+        "jobs": a.jobs,
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        root = a.root or os.path.join(tmp, "repo")
+        if not os.path.isdir(os.path.join(root, "pkg0")):
+            generate(root, a.packages, a.modules, a.funcs, a.fanout, a.nesting)
+        results = run_suite(root, jobs=a.jobs, repeat=a.repeat)
+    report: Dict[str, Any] = {
+        "meta": {
+            "rev": _git_rev(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "params": params,
+        "results": {k: round(v, 6) for k, v in results.items()},
+        "targets": {k: results[k] < bound for k, bound in TARGETS.items()},
+    }
+    regressions: List[str] = []
+    if a.compare:
+        with open(a.compare, "r", encoding="utf-8") as rf:
+            base = json.load(rf)
+        if base.get("params") != params:
+            print("[bench] warning: baseline was run with different params", file=sys.stderr)
+        regressions = compare(results, base.get("results", {}), a.threshold, a.floor)
+        report["regressions"] = regressions
+    text = json.dumps(report, indent=2)
+    if a.out:
+        os.makedirs(os.path.dirname(os.path.abspath(a.out)), exist_ok=True)
+        with open(a.out, "w", encoding="utf-8") as wf:
+            wf.write(text + "\n")
+    print(text)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
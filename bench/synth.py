@@ -0,0 +1,89 @@
+"""Synthetic repository generator for CodeGraph benchmarks.
+
+Produces ``packages`` packages of ``modules`` modules each. Every module holds
+``funcs`` chained functions, a class with methods, ``fanout`` imports from the
+following modules (called from ``fan``) and, with ``nesting`` > 0, a function
+nesting that many levels of defs. Each module gets a matching
+``tests/test_*.py``, so symbols, call edges, imports and the test map all scale
+with the requested size.
+"""
+
+import argparse
+import os
+from typing import Dict, List
+
+
+def _module_source(i: int, n_mods: int, packages: int, funcs: int, fanout: int, nesting: int) -> str:
+    src: List[str] = []
+    for k in range(fanout):
+        j = (i + 1 + k) % n_mods
+        src.append(f"from pkg{j % packages}.m{j} import f0 as ext{k}\n")
+    src.append("\n")
+    for j in range(funcs):
+        callee = f"f{j + 1}(x)" if j + 1 < funcs else "fan(x)"
+        src.append(
+            f"def f{j}(x):\n"
+            f'    """doc {j}"""\n'
+            f"    return {callee} + len([x])\n\n"
+        )
+    fan = " + ".join(f"ext{k}(x)" for k in range(fanout)) or "x"
+    src.append(f"def fan(x):\n    return {fan}\n\n")
+    if nesting:
+        for d in range(nesting):
+            pad = "    " * d
+            src.append(f"{pad}def deep{d}(x):\n{pad}    y = f0(x)\n")
+        src.append("    " * nesting + "return y\n")
+        for d in reversed(range(nesting - 1)):
+            src.append("    " * (d + 1) + f"return deep{d + 1}(y)\n")
+        src.append("\n")
+    src.append(
+        f"class C{i}:\n"
+        f"    def run(self, x):\n"
+        f"        return self.step(x)\n\n"
+        f"    def step(self, x):\n"
+        f"        return f0(x)\n"
+    )
+    return "".join(src)
+
+
+def generate(
+    root: str,
+    packages: int = 10,
+    modules: int = 50,
+    funcs: int = 100,
+    fanout: int = 1,
+    nesting: int = 0,
+) -> Dict[str, int]:
+    n_mods = packages * modules
+    os.makedirs(os.path.join(root, "tests"), exist_ok=True)
+    for p in range(packages):
+        d = os.path.join(root, f"pkg{p}")
+        os.makedirs(d, exist_ok=True)
+        open(os.path.join(d, "__init__.py"), "w").close()
+    for i in range(n_mods):
+        pkg = i % packages
+        with open(os.path.join(root, f"pkg{pkg}", f"m{i}.py"), "w") as wf:
+            wf.write(_module_source(i, n_mods, packages, funcs, fanout, nesting))
+        with open(os.path.join(root, "tests", f"test_m{i}.py"), "w") as wf:
+            wf.write(
+                f"from pkg{pkg}.m{i} import f0, C{i}\n\n"
+                f"def test_m{i}():\n"
+                f"    assert C{i}().run(1) == f0(1)\n"
+            )
+    return {"modules": n_mods, "files": n_mods * 2 + packages}
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Generate a synthetic Python repo")
+    p.add_argument("root")
+    p.add_argument("--packages", type=int, default=10)
+    p.add_argument("--modules", type=int, default=50, help="Modules per package")
+    p.add_argument("--funcs", type=int, default=100, help="Functions per module")
+    p.add_argument("--fanout", type=int, default=1, help="Imports per module")
+    p.add_argument("--nesting", type=int, default=0, help="Nested def depth per module")
+    a = p.parse_args()
+    print(generate(a.root, a.packages, a.modules, a.funcs, a.fanout, a.nesting))
+
+
+if __name__ == "__main__":
+    main()
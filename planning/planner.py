@@ -1,6 +1,9 @@
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Set, Tuple
 from tools.code_graph import CodeGraph
 import os
+import re
+
+_HUNK = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+\d+(?:,(\d+))? @@")
 
 
 def _extract_modules_from_task(task: str) -> List[str]:
@@ -25,17 +28,11 @@ def _tests_for_modules(graph: Any, modules: List[str]) -> List[str]:
 
 def plan(*, task: str, graph: Any) -> Dict[str, Any]:
     mods = _extract_modules_from_task(task)
-    # Expand impacted modules via reverse imports
+    # Expand impacted modules via (transitive) reverse imports
     impacted: List[str] = []
     try:
         if isinstance(graph, CodeGraph):
-            # For each mentioned module, include modules that import it (reverse deps)
-            rev = set()
-            for m in mods:
-                for mod, deps in getattr(graph, "module_imports", {}).items():
-                    if m in deps or m.split(".")[0] in deps:
-                        rev.add(mod)
-            impacted = sorted(set(mods) | rev)
+            impacted = sorted(set(mods) | set(graph.impacted(mods)))
         else:
             impacted = mods
     except Exception:
@@ -74,11 +71,62 @@ def impacted_from_diff(diff_text: str, graph: CodeGraph) -> Tuple[List[str], Lis
         except Exception:
             continue
     modules = list(dict.fromkeys(modules))
-    # Reverse importers
-    rev = set()
-    for m in modules:
-        for mod, deps in getattr(graph, "module_imports", {}).items():
-            if m in deps or m.split(".")[0] in deps:
-                rev.add(mod)
-    impacted = sorted(set(modules) | rev)
+    # Reverse importers, transitively
+    try:
+        impacted = graph.impacted(modules)
+    except Exception:
+        impacted = sorted(modules)
     return files, impacted
+
+
+def changed_lines_from_diff(diff_text: str) -> Dict[str, List[int]]:
+    """Pre-image line numbers touched by each file of a unified diff.
+
+    These index the code the last coverage run measured: removed/replaced
+    lines, plus the neighbours of pure insertions. Each hunk's old/new line
+    counts are tracked, so a removed ``-- x`` or added ``++ y`` line inside it
+    is not taken for a file header.
+    """
+    out: Dict[str, Set[int]] = {}
+    old_path = None
+    cur: Set[int] = set()
+    old_ln = 0
+    old_left = new_left = 0  # lines still due in the current hunk
+    prev = ""
+    for line in diff_text.splitlines():
+        if old_left > 0 or new_left > 0:
+            tag = line[:1] or " "
+            if tag == "-":
+                cur.add(old_ln)
+                old_ln += 1
+                old_left -= 1
+            elif tag == "+":
+                if prev not in ("-", "+"):
+                    # Pure insertion: the lines around it
+                    cur.update(n for n in (old_ln - 1, old_ln) if n > 0)
+                new_left -= 1
+            elif tag == " ":
+                old_ln += 1
+                old_left -= 1
+                new_left -= 1
+            if tag != "\\":
+                prev = tag
+            continue
+        if line.startswith("--- "):
+            part = line[4:].strip()
+            old_path = None if part == "/dev/null" else part
+            continue
+        if line.startswith("+++ "):
+            part = line[4:].strip()
+            path = old_path if part == "/dev/null" else part
+            if path and (path.startswith("a/") or path.startswith("b/")):
+                path = path[2:]
+            cur = out.setdefault(path, set()) if path else set()
+            continue
+        m = _HUNK.match(line)
+        if m:
+            old_ln = int(m.group(1))
+            old_left = int(m.group(2) or 1)
+            new_left = int(m.group(3) or 1)
+            prev = ""
+    return {f: sorted(lines) for f, lines in out.items()}
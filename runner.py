@@ -3,8 +3,8 @@ import sys
 import time
 from tools.code_graph import CodeGraph
 from llm_client import LLMClient
-from planning.planner import plan, impacted_from_diff
-from verify.tests import run_tests
+from planning.planner import plan, impacted_from_diff, changed_lines_from_diff
+from verify.tests import SANDBOX_WORKDIR, run_tests
 from act.patcher import propose_and_apply
 from verify.static import run_static
 from verify.runtime import run_runtime
@@ -51,6 +51,11 @@ def run_task(task: str) -> dict:
     logger = JsonLogger()
     with logger.step("codegraph_build"):
         graph = CodeGraph.load_or_build("./repo")
+        # Per-test coverage contexts from the previous verify run, if any;
+        # a sandboxed run recorded paths under the container's mount point
+        cov_data = os.path.join("logs", ".coverage")
+        if os.path.exists(cov_data) and hasattr(graph, "attach_coverage"):
+            graph.attach_coverage(cov_data, {SANDBOX_WORKDIR: os.getcwd()})
     with logger.step("llm_init"):
         llm = LLMClient()
     state = {"loops": 0}
@@ -82,14 +87,21 @@ def run_task(task: str) -> dict:
             test_patterns = []
         if _time_left() <= 0:
             break
-        # Prefer nodeids from CodeGraph when possible using diff
+        # Prefer nodeids from CodeGraph when possible using diff: the tests whose
+        # recorded coverage touched the changed lines, else the test nodes of
+        # impacted modules
         nodeids = None
         try:
             if isinstance(diff, str) and diff.strip():
                 files, impacted = impacted_from_diff(diff, graph)  # type: ignore[arg-type]
                 nodes: list[str] = []
-                for m in impacted:
-                    nodes.extend(graph.pytest_nodes_by_module.get(m, []))
+                covering = getattr(graph, "tests_covering", None)
+                if covering is not None:
+                    for f, lines in changed_lines_from_diff(diff).items():
+                        nodes.extend(covering(f, lines))
+                if not nodes:
+                    for m in impacted:
+                        nodes.extend(graph.pytest_nodes_by_module.get(m, []))
                 nodeids = sorted(list(dict.fromkeys(nodes))) if nodes else None
         except Exception:
             nodeids = None
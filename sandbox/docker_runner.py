@@ -88,6 +88,7 @@ def run_in_sandbox(
                     "PATH",
                     "PER_STEP_SECONDS",
                     "COV_FAIL_UNDER",
+                    "COVERAGE_FILE",
                 )
             ):
                 argv += ["-e", f"{k}={v}"]
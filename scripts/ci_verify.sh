@@ -1,14 +1,14 @@
 #!/usr/bin/env bash
 set -euo pipefail
+mkdir -p logs
 
-echo "[ci] Build CodeGraph (no-cache)"
-python -m tools.code_graph ./repo --no-cache --dump || { echo "[ci] code_graph failed"; exit 1; }
-
-echo "[ci] Unresolved (non-builtin) calls"
-python -m tools.code_graph ./repo --unresolved | sed -n '1,50p' || true
+echo "[ci] Build CodeGraph (no-cache); summary + unresolved (non-builtin) calls"
+printf '%s\n' '{"dump": true}' '{"unresolved": true}' \
+  | python -m tools.code_graph ./repo --no-cache --batch > logs/code_graph.ndjson \
+  || { echo "[ci] code_graph failed"; exit 1; }
+sed -n '1,50p' logs/code_graph.ndjson
 
 echo "[ci] Static and tests"
-mkdir -p logs
 make verify || { echo "[ci] verify failed"; exit 1; }
 
 echo "[ci] OK"
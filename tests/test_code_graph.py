@@ -1,9 +1,1021 @@
+import os
+import time
+
+import pytest
+
 from tools.code_graph import CodeGraph
 
 
+def _write_pkg(root):
+    pkg = root / "pkg"
+    pkg.mkdir(parents=True, exist_ok=True)
+    (pkg / "__init__.py").write_text("", encoding="utf-8")
+    (pkg / "util.py").write_text(
+        "def helper(x):\n    return x + 1\n\n\nclass Base:\n    def run(self):\n        return helper(1)\n",
+        encoding="utf-8",
+    )
+    (pkg / "core.py").write_text(
+        "from pkg.util import helper, Base\n\n\ndef main():\n    return helper(2)\n",
+        encoding="utf-8",
+    )
+    tests = root / "tests"
+    tests.mkdir(parents=True, exist_ok=True)
+    (tests / "test_core.py").write_text(
+        "from pkg.core import main\n\n\ndef test_main():\n    assert main() == 3\n",
+        encoding="utf-8",
+    )
+
+
 def test_code_graph_builds():
     g = CodeGraph.load_or_build("./repo", ignore_cache=True)
     assert isinstance(g.indexed_files, list)
     assert isinstance(g.modules, dict)
     # Should at least scan zero or more files; existence of dict ensures build ran
     assert g.calls is not None
+
+
+def test_parallel_build_matches_serial(tmp_path):
+    _write_pkg(tmp_path)
+    serial = CodeGraph.load_or_build(str(tmp_path), ignore_cache=True)
+    parallel = CodeGraph.load_or_build(str(tmp_path), ignore_cache=True, jobs=2)
+    assert parallel.indexed_files == serial.indexed_files
+    assert parallel.symbols_by_fqn == serial.symbols_by_fqn
+    assert parallel.calls == serial.calls
+    assert parallel.module_imports == serial.module_imports
+    assert parallel.pytest_nodes_by_module == serial.pytest_nodes_by_module
+    assert "pkg.core.main" in parallel.who_calls("pkg.util.helper")
+
+
+def _scan_who_calls(g, fqn):
+    short = fqn.split(".")[-1]
+    return sorted(a for a, b in g.calls if b == fqn or b.split(".")[-1] == short)
+
+
+def test_call_index_tracks_incremental_rebuild(tmp_path):
+    _write_pkg(tmp_path)
+    g = CodeGraph.load_or_build(str(tmp_path))
+    assert sorted(g.who_calls("pkg.util.helper")) == _scan_who_calls(
+        g, "pkg.util.helper"
+    )
+    assert g.calls_of("pkg.core.main") == ["pkg.util.helper"]
+    (tmp_path / "pkg" / "core.py").write_text(
+        "from pkg.util import Base\n\n\ndef main():\n    return Base().run()\n",
+        encoding="utf-8",
+    )
+    g2 = CodeGraph.load_or_build(str(tmp_path))
+    assert "pkg.core.main" not in g2.who_calls("pkg.util.helper")
+    assert sorted(g2.who_calls("pkg.util.helper")) == _scan_who_calls(
+        g2, "pkg.util.helper"
+    )
+    assert sorted(g2.refs_of("pkg.util.Base")) == sorted(
+        (a, b) for a, b in g2.calls if b.split(".")[-1] == "Base"
+    )
+
+
+def test_incremental_reindex_matches_cold_build(tmp_path):
+    _write_pkg(tmp_path)
+    CodeGraph.load_or_build(str(tmp_path))
+    (tmp_path / "pkg" / "util.py").write_text(
+        "def helper2(x):\n    return x\n\n\nclass Base:\n    def run(self):\n        return helper2(1)\n",
+        encoding="utf-8",
+    )
+    (tmp_path / "pkg" / "extra.py").write_text(
+        "from pkg.util import helper2\n\n\ndef go():\n    return helper2(3)\n",
+        encoding="utf-8",
+    )
+    (tmp_path / "tests" / "test_core.py").unlink()
+    warm = CodeGraph.load_or_build(str(tmp_path))
+    cold = CodeGraph.load_or_build(str(tmp_path), ignore_cache=True)
+    assert warm.symbols_by_fqn == cold.symbols_by_fqn
+    assert sorted(warm.calls) == sorted(cold.calls)
+    assert {m: sorted(mi.defs) for m, mi in warm.modules.items()} == {
+        m: sorted(mi.defs) for m, mi in cold.modules.items()
+    }
+    assert "pkg.util.helper" not in warm.symbols_by_fqn
+    assert sorted(warm.who_calls("pkg.util.helper2")) == ["pkg.extra.go", "pkg.util.Base.run"]
+
+
+def test_no_change_rebuild_reads_only_cache(tmp_path, monkeypatch):
+    import builtins
+
+    _write_pkg(tmp_path)
+    CodeGraph.load_or_build(str(tmp_path))
+    # touching a file moves its stat tuple but not its content
+    util = tmp_path / "pkg" / "util.py"
+    os.utime(util, ns=(util.stat().st_atime_ns, util.stat().st_mtime_ns + 10**9))
+    g = CodeGraph(str(tmp_path))
+    g.build()
+    assert g._file_stats[str(util)][1] == util.stat().st_mtime_ns
+
+    opened = []
+    real_open = builtins.open
+
+    def spy_open(path, *args, **kwargs):
+        opened.append(str(path))
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "open", spy_open)
+    g2 = CodeGraph.load_or_build(str(tmp_path))
+    assert [os.path.basename(p) for p in opened] == ["manifest.bin"]
+    assert "pkg.util.helper" in g2.symbols_by_fqn
+
+
+def test_binary_cache_loads_sections_lazily(tmp_path):
+    _write_pkg(tmp_path)
+    cold = CodeGraph.load_or_build(str(tmp_path))
+    warm = CodeGraph.load_or_build(str(tmp_path))
+    assert set(warm._lazy_sections) >= {"symbols", "calls", "imports", "tests"}
+    assert warm.module_imports == cold.module_imports
+    assert "imports" not in warm._lazy_sections
+    assert "symbols" in warm._lazy_sections
+    assert warm.pytest_nodes_by_module == cold.pytest_nodes_by_module
+    assert warm.symbols_by_fqn == cold.symbols_by_fqn
+    assert warm.calls == cold.calls
+    assert warm.who_calls("pkg.util.helper") == cold.who_calls("pkg.util.helper")
+    assert warm.modules == cold.modules
+    # JSON stays available for export
+    assert warm.export_json()["module_imports"] == cold.module_imports
+
+
+def test_incremental_save_writes_only_changed_shards(tmp_path):
+    _write_pkg(tmp_path)
+    CodeGraph.load_or_build(str(tmp_path))
+    cache = tmp_path / ".codegraph"
+    pack_stat = (cache / "pack.bin").stat()
+    (tmp_path / "pkg" / "util.py").write_text(
+        "def helper(x):\n    return x + 2\n\n\ndef more():\n    return helper(0)\n",
+        encoding="utf-8",
+    )
+    CodeGraph.load_or_build(str(tmp_path))
+    assert (cache / "pack.bin").stat().st_mtime_ns == pack_stat.st_mtime_ns
+    assert os.listdir(cache / "shards") == ["pkg.util.bin"]
+    (tmp_path / "pkg" / "core.py").unlink()
+
+    warm = CodeGraph.load_or_build(str(tmp_path))
+    reloaded = CodeGraph.load_or_build(str(tmp_path))
+    cold = CodeGraph.load_or_build(str(tmp_path), ignore_cache=True)
+    for g in (warm, reloaded):
+        assert g.symbols_by_fqn == cold.symbols_by_fqn
+        assert sorted(g.calls) == sorted(cold.calls)
+        assert g.modules == cold.modules
+        assert g.module_imports == cold.module_imports
+        assert sorted(g.who_calls("pkg.util.helper")) == ["pkg.util.more"]
+    assert os.listdir(cache / "shards") == []
+
+
+def test_full_pack_write_compacts_string_table(tmp_path):
+    _write_pkg(tmp_path)
+    g = CodeGraph.load_or_build(str(tmp_path), daemon=False)
+    for i in range(3):
+        (tmp_path / "pkg" / "core.py").write_text(
+            f"from pkg.util import helper, Base\n\n\ndef main_{i}():\n"
+            f"    return helper(2) + Base().run() + gone_{i}()\n",
+            encoding="utf-8",
+        )
+        g.refresh()
+    assert "pkg.core.main_0" in g._strings.ids
+    g._has_pack = False  # force the next save to rewrite the pack
+    g._save_cache(str(tmp_path / ".codegraph"))
+    live = {x for edge in g.iter_calls() for x in edge}
+    live.update(g._strings[v] for raw in g.raw_callees.values() for v in raw.values())
+    assert set(g._strings.strings) == live
+    assert "pkg.core.main_0" not in g._strings.ids
+    cold = CodeGraph.load_or_build(str(tmp_path), ignore_cache=True, daemon=False)
+    assert sorted(g.calls) == sorted(cold.calls)
+    assert sorted(g.who_calls("pkg.util.helper")) == ["pkg.core.main_2", "pkg.util.Base.run"]
+    assert sorted(g.refs_of("pkg.util.helper")) == sorted(cold.refs_of("pkg.util.helper"))
+    reloaded = CodeGraph.load_or_build(str(tmp_path), daemon=False)
+    assert len(reloaded._strings) == len(live)
+    assert sorted(reloaded.calls) == sorted(cold.calls)
+    assert not reloaded._compact_strings()
+
+
+def test_sqlite_backend_tracks_incremental_rebuild(tmp_path):
+    import sqlite3
+
+    from tools.code_graph_sqlite import SqliteCodeGraph
+
+    _write_pkg(tmp_path)
+    db = str(tmp_path / "graph.db")
+    g = CodeGraph.load_or_build(str(tmp_path), sqlite_path=db)
+    g.export_sqlite(db)  # re-export must not duplicate rows
+    with SqliteCodeGraph(db) as q:
+        assert sorted(q.who_calls("pkg.util.helper")) == sorted(
+            g.who_calls("pkg.util.helper")
+        )
+        assert q.defs_in("pkg.util") == g.defs_in("pkg.util")
+        assert q.owners_of("helper") == g.owners_of("helper")
+        assert q.tests_for_module("pkg.core") == g.tests_for_module("pkg.core")
+        assert q.module_for_file("pkg/core.py") == "pkg.core"
+    (tmp_path / "pkg" / "core.py").write_text(
+        "from pkg.util import helper\n\n\ndef main():\n    return 0\n",
+        encoding="utf-8",
+    )
+    g2 = CodeGraph.load_or_build(str(tmp_path), sqlite_path=db)
+    with SqliteCodeGraph(db) as q:
+        assert q.who_calls("pkg.util.helper") == ["pkg.util.Base.run"]
+        assert q.defs_in("pkg.core") == g2.defs_in("pkg.core")
+        assert q.calls_of("pkg.core.main") == []
+    conn = sqlite3.connect(db)
+    n_calls = conn.execute("SELECT COUNT(*) FROM calls").fetchone()[0]
+    conn.close()
+    assert n_calls == len(g2.calls)
+
+    # A new test module moves test-map rows of the modules it imports
+    (tmp_path / "tests" / "test_util.py").write_text(
+        "from pkg.util import helper\n\n\ndef test_helper():\n    assert helper(1) == 2\n",
+        encoding="utf-8",
+    )
+    g3 = CodeGraph.load_or_build(str(tmp_path), sqlite_path=db)
+    assert "tests.test_util" in g3.tests_for_module("pkg.util")
+    with SqliteCodeGraph(db) as q:
+        assert q.tests_for_module("pkg.util") == g3.tests_for_module("pkg.util")
+    reloaded = CodeGraph.load_or_build(str(tmp_path), daemon=False)
+    assert reloaded.tests_for_module("pkg.util") == g3.tests_for_module("pkg.util")
+
+    # Coverage rows of rewritten modules follow the graph
+    util = str(tmp_path / "pkg" / "util.py")
+    _write_coverage_db(str(tmp_path / ".coverage"), [(util, "", [1, 2])])
+    g3.attach_coverage(str(tmp_path / ".coverage"))
+    g3.export_sqlite(db, ["pkg.util"])
+    conn = sqlite3.connect(db)
+    rows = conn.execute("SELECT file, line FROM coverage ORDER BY line").fetchall()
+    conn.close()
+    assert rows == [("pkg/util.py", 1), ("pkg/util.py", 2)]
+
+
+def test_sqlite_rewritten_after_cache_advanced_without_it(tmp_path):
+    from tools.code_graph_sqlite import SqliteCodeGraph, is_current
+
+    _write_pkg(tmp_path)
+    db = str(tmp_path / "graph.db")
+    CodeGraph.load_or_build(str(tmp_path), sqlite_path=db)
+    (tmp_path / "pkg" / "util.py").write_text(
+        "def helper(x):\n    return x\n", encoding="utf-8"
+    )
+    # A run without the database picks up the edit and advances the cache
+    CodeGraph.load_or_build(str(tmp_path), daemon=False)
+    assert not is_current(db, str(tmp_path))
+    g = CodeGraph.load_or_build(str(tmp_path), sqlite_path=db)
+    assert is_current(db, str(tmp_path))
+    with SqliteCodeGraph(db) as q:
+        assert q.defs_in("pkg.util") == g.defs_in("pkg.util") == [
+            "pkg.util",
+            "pkg.util.helper",
+        ]
+
+
+def test_cli_sqlite_query_skips_graph_when_db_is_current(tmp_path, monkeypatch, capsys):
+    import json
+    import sys
+
+    from tools import code_graph
+    from tools.code_graph_sqlite import is_current
+
+    _write_pkg(tmp_path)
+    db = str(tmp_path / "graph.db")
+    g = CodeGraph.load_or_build(str(tmp_path), sqlite_path=db)
+    assert is_current(db, str(tmp_path))
+    argv = ["code_graph", str(tmp_path), "--sqlite", db, "--defs-in", "pkg.util"]
+    monkeypatch.setattr(sys, "argv", argv)
+
+    def no_graph(*a, **k):
+        raise AssertionError("graph loaded")
+
+    with monkeypatch.context() as m:
+        m.setattr(CodeGraph, "load_or_build", no_graph)
+        code_graph._cli()
+    assert json.loads(capsys.readouterr().out) == g.defs_in("pkg.util")
+
+    # Stale database: the graph is loaded (and refreshes the rows) first
+    (tmp_path / "pkg" / "util.py").write_text(
+        "def helper(x):\n    return x\n", encoding="utf-8"
+    )
+    assert not is_current(db, str(tmp_path))
+    code_graph._cli()
+    assert json.loads(capsys.readouterr().out) == ["pkg.util", "pkg.util.helper"]
+    assert is_current(db, str(tmp_path))
+
+
+def test_search_symbols_ranks_and_tracks_reindex(tmp_path):
+    from tools.code_graph_sqlite import SqliteCodeGraph
+
+    _write_pkg(tmp_path)
+    (tmp_path / "pkg" / "http.py").write_text(
+        'def parseHttpResponse(raw):\n    """Parse a raw HTTP response."""\n    return raw\n',
+        encoding="utf-8",
+    )
+    db = str(tmp_path / "graph.db")
+    g = CodeGraph.load_or_build(str(tmp_path), sqlite_path=db)
+    assert g.search_symbols("parse response", k=1)[0][0] == "pkg.http.parseHttpResponse"
+    with SqliteCodeGraph(db) as q:
+        assert q.search_symbols("http response", k=1)[0][0] == (
+            "pkg.http.parseHttpResponse"
+        )
+    (tmp_path / "pkg" / "http.py").write_text(
+        "def decode_body(raw):\n    return raw\n", encoding="utf-8"
+    )
+    g.build(sqlite_path=db)
+    assert [f for f, _ in g.search_symbols("decode body")] == ["pkg.http.decode_body"]
+    assert g.search_symbols("parse response") == []
+    with SqliteCodeGraph(db) as q:
+        assert [f for f, _ in q.search_symbols("decode")] == ["pkg.http.decode_body"]
+        assert q.search_symbols("response") == []
+
+
+def test_search_refs_trigram_fallback_tracks_changes(tmp_path, monkeypatch):
+    import subprocess
+
+    from tools.repo_scan import ripgrep
+    from tools.trigram_index import TrigramIndex
+
+    def no_rg(*a, **k):
+        raise FileNotFoundError("rg")
+
+    monkeypatch.setattr(subprocess, "check_output", no_rg)
+    # Without a graph, ripgrep() walks every text file and writes no cache
+    (tmp_path / "notes.txt").write_text("see helper(7)\n", encoding="utf-8")
+    assert ripgrep(r"helper\(\d\)", str(tmp_path)) == [f"{tmp_path / 'notes.txt'}:1:see helper(7)"]
+    assert not (tmp_path / ".codegraph").exists()
+    _write_pkg(tmp_path)
+    g = CodeGraph.load_or_build(str(tmp_path))
+    assert sorted(r[0] for r in g.search_refs(r"helper\(\d\)")) == [
+        "pkg/core.py",
+        "pkg/util.py",
+    ]
+    assert ripgrep(r"helper\(2\)", str(tmp_path), graph=g) == [
+        f"{tmp_path / 'pkg' / 'core.py'}:5:    return helper(2)"
+    ]
+    assert g._trigrams.candidates(r"(Base|main)\(\)") == {
+        str(tmp_path / "pkg" / "core.py"),
+        str(tmp_path / "pkg" / "util.py"),
+        str(tmp_path / "tests" / "test_core.py"),
+    }
+    assert g.search_refs("nothing_like_this") == []
+    assert g.search_refs("a+") != []  # too short to narrow: full scan
+
+    (tmp_path / "pkg" / "core.py").write_text(
+        "def main():\n    return 0\n", encoding="utf-8"
+    )
+    added = []
+    real_add = TrigramIndex.add
+    monkeypatch.setattr(
+        TrigramIndex, "add", lambda self, p, h: (added.append(p), real_add(self, p, h))
+    )
+    g2 = CodeGraph.load_or_build(str(tmp_path))
+    assert [r[0] for r in g2.search_refs(r"helper\(\d\)")] == ["pkg/util.py"]
+    assert added == [str(tmp_path / "pkg" / "core.py")]
+
+
+def test_trigram_index_reuses_ids_of_removed_files(tmp_path):
+    from tools.trigram_index import TrigramIndex
+
+    a, b = tmp_path / "a.py", tmp_path / "b.py"
+    a.write_text("alpha_func()\n", encoding="utf-8")
+    b.write_text("beta_func()\n", encoding="utf-8")
+    idx = TrigramIndex()
+    for _ in range(5):
+        idx.sync({str(a): "1", str(b): "1"})
+        idx.sync({str(b): "1"})
+    assert len(idx.paths) == 2 and "alp" not in idx.postings
+    idx.sync({str(a): "2", str(b): "1"})
+    assert idx.candidates("alpha_func") == {str(a)}
+    idx.remove([str(b)])
+    idx.save(str(tmp_path / "tri.bin"))
+    loaded = TrigramIndex.load(str(tmp_path / "tri.bin"))
+    assert loaded.paths == [str(a)] and loaded.candidates("beta_func") == set()
+    assert loaded.candidates("alpha_func") == {str(a)}
+
+
+@pytest.mark.parametrize("poll", [None, 0.05])
+def test_daemon_serves_queries_and_tracks_edits(tmp_path, poll):
+    import threading
+
+    from tools.code_graph_daemon import CodeGraphDaemon, RemoteCodeGraph, connect
+
+    _write_pkg(tmp_path)
+    d = CodeGraphDaemon(str(tmp_path), poll=poll)
+    t = threading.Thread(target=d.serve_forever, daemon=True)
+    t.start()
+    try:
+        for _ in range(100):
+            if connect(str(tmp_path)) is not None:
+                break
+            time.sleep(0.02)
+        g = CodeGraph.load_or_build(str(tmp_path))
+        assert isinstance(g, RemoteCodeGraph)
+        assert sorted(g.who_calls("pkg.util.helper")) == [
+            "pkg.core.main",
+            "pkg.util.Base.run",
+        ]
+        assert g.module_for_file("pkg/core.py") == "pkg.core"
+        assert "pkg.util" in g.module_imports["pkg.core"]
+        assert g.stats()["modules"] == len(d.graph.modules)
+        with pytest.raises(AttributeError):
+            g.symbols_by_fqn
+        (tmp_path / "pkg" / "core.py").write_text(
+            "def main():\n    return 0\n", encoding="utf-8"
+        )
+        g2 = CodeGraph.load_or_build(str(tmp_path))
+        assert g2.who_calls("pkg.util.helper") == ["pkg.util.Base.run"]
+        assert g2.calls_of("pkg.core.main") == []
+        # Cached attrs are refetched once the daemon's generation moves
+        assert g.module_imports["pkg.core"] == []
+
+        assert d.handle({"id": 1, "method": "nope"})["error"]["code"] == -32601
+        assert d.handle({"id": 2, "method": "attr", "params": ["nope"]})["error"]["code"] == -32601
+        d.graph.mro = lambda cls: {}[cls]  # a KeyError inside a real query
+        assert d.handle({"id": 3, "method": "mro", "params": ["x"]})["error"]["code"] == -32603
+        local = CodeGraph.load_or_build(str(tmp_path), daemon=False)
+        assert local.who_calls("pkg.util.helper") == ["pkg.util.Base.run"]
+        g2._client.call("shutdown")
+        t.join(5)
+        assert not t.is_alive()
+    finally:
+        d.stop()
+    assert CodeGraph.load_or_build(str(tmp_path)).__class__ is CodeGraph
+
+
+def test_impacted_closure_handles_cycles_and_tracks_edits(tmp_path):
+    from planning.planner import impacted_from_diff
+
+    _write_pkg(tmp_path)
+    pkg = tmp_path / "pkg"
+    (pkg / "app.py").write_text("from pkg import core\n", encoding="utf-8")
+    (pkg / "cyc_a.py").write_text("import pkg.cyc_b\nimport pkg.util\n", encoding="utf-8")
+    (pkg / "cyc_b.py").write_text("from pkg.cyc_a import *\n", encoding="utf-8")
+    g = CodeGraph.load_or_build(str(tmp_path))
+    assert g.impacted(["pkg.core"]) == ["pkg.app", "pkg.core", "tests.test_core"]
+    assert g.impacted(["pkg.util.helper"], depth=1) == [
+        "pkg.core",
+        "pkg.cyc_a",
+        "pkg.util",
+    ]
+    assert g.impacted(["pkg.util"]) == [
+        "pkg.app",
+        "pkg.core",
+        "pkg.cyc_a",
+        "pkg.cyc_b",
+        "pkg.util",
+        "tests.test_core",
+    ]
+    assert g.impacted(["pkg.cyc_b"]) == ["pkg.cyc_a", "pkg.cyc_b"]
+    diff = "--- a/pkg/core.py\n+++ b/pkg/core.py\n@@ -1 +1 @@\n"
+    assert impacted_from_diff(diff, g) == (
+        ["pkg/core.py"],
+        ["pkg.app", "pkg.core", "tests.test_core"],
+    )
+
+    (pkg / "app.py").write_text("import pkg.cyc_b\n", encoding="utf-8")
+    assert g.refresh()
+    assert g.impacted(["pkg.core"]) == ["pkg.core", "tests.test_core"]
+    assert g.impacted(["pkg.cyc_a"]) == ["pkg.app", "pkg.cyc_a", "pkg.cyc_b"]
+    warm = CodeGraph.load_or_build(str(tmp_path))
+    assert warm.impacted(["pkg.util"]) == g.impacted(["pkg.util"])
+
+
+def _numbits(lines):
+    buf = bytearray(max(lines) // 8 + 1)
+    for n in lines:
+        buf[n // 8] |= 1 << (n % 8)
+    return bytes(buf)
+
+
+def _write_coverage_db(path, rows):
+    """Minimal coverage.py data file: rows of (abs_path, context, lines)."""
+    import sqlite3
+
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "CREATE TABLE file (id INTEGER PRIMARY KEY, path TEXT UNIQUE);"
+        "CREATE TABLE context (id INTEGER PRIMARY KEY, context TEXT UNIQUE);"
+        "CREATE TABLE line_bits (file_id INTEGER, context_id INTEGER, numbits BLOB,"
+        " UNIQUE (file_id, context_id));"
+    )
+    for f, ctx, lines in rows:
+        conn.execute("INSERT OR IGNORE INTO file(path) VALUES(?)", (f,))
+        conn.execute("INSERT OR IGNORE INTO context(context) VALUES(?)", (ctx,))
+        conn.execute(
+            "INSERT INTO line_bits VALUES("
+            "(SELECT id FROM file WHERE path=?), (SELECT id FROM context WHERE context=?), ?)",
+            (f, ctx, _numbits(lines)),
+        )
+    conn.commit()
+    conn.close()
+
+
+def test_attach_coverage_from_xml_and_data_file(tmp_path):
+    _write_pkg(tmp_path)
+    g = CodeGraph.load_or_build(str(tmp_path))
+    util = str(tmp_path / "pkg" / "util.py")
+    xml = tmp_path / "coverage.xml"
+    xml.write_text(
+        '<?xml version="1.0" ?><coverage><sources><source>/nonexistent</source>'
+        "</sources><packages><package><classes>"
+        '<class filename="pkg/util.py"><lines>'
+        '<line number="1" hits="1"/><line number="2" hits="3"/>'
+        '<line number="6" hits="1"/><line number="7" hits="0"/>'
+        "</lines></class></classes></package></packages></coverage>",
+        encoding="utf-8",
+    )
+    g.attach_coverage_from_xml(str(xml))
+    assert list(g.coverage_files[util]) == [1, 2, 6]
+    assert g.coverage_of("pkg.util.helper") == 1.0
+    assert g.coverage_of("pkg.util.Base.run") == 0.5
+    assert g.coverage_of("pkg.core.main") == 0.0
+
+    data = tmp_path / ".coverage"
+    _write_coverage_db(
+        str(data), [(util, "", [1, 2]), (util, "tests/test_core.py::test_main|run", [6])]
+    )
+    g2 = CodeGraph.load_or_build(str(tmp_path))
+    g2.attach_coverage(str(data))
+    assert g2.coverage_files == g.coverage_files
+    assert g2.symbol_coverage == g.symbol_coverage
+
+
+def test_tests_covering_maps_changed_lines_to_nodeids(tmp_path):
+    from planning.planner import changed_lines_from_diff
+
+    _write_pkg(tmp_path)
+    util = str(tmp_path / "pkg" / "util.py")
+    core = str(tmp_path / "pkg" / "core.py")
+    data = tmp_path / ".coverage"
+    _write_coverage_db(
+        str(data),
+        [
+            (util, "", [1]),
+            (util, "tests/test_core.py::test_main|run", [1, 2]),
+            (core, "tests/test_core.py::test_main|run", [1, 4, 5]),
+            (util, "tests/test_util.py::test_run[a]|run", [1, 6, 7]),
+            (util, "tests/test_util.py::test_run[a]|setup", [1]),
+        ],
+    )
+    g = CodeGraph.load_or_build(str(tmp_path))
+    g.attach_coverage(str(data))
+    assert g.tests_covering("pkg/util.py", [2]) == ["tests/test_core.py::test_main"]
+    assert g.tests_covering(util, [1]) == [
+        "tests/test_core.py::test_main",
+        "tests/test_util.py::test_run[a]",
+    ]
+    assert g.tests_covering("pkg/util.py", [3, 4]) == []
+    assert g.tests_covering("pkg/other.py", [1]) == []
+
+    diff = (
+        "--- a/pkg/util.py\n+++ b/pkg/util.py\n@@ -6,2 +6,3 @@\n"
+        "     def run(self):\n-        return helper(1)\n+        x = 1\n+        return helper(x)\n"
+        "--- /dev/null\n+++ b/pkg/new.py\n@@ -0,0 +1 @@\n+x = 1\n"
+    )
+    changed = changed_lines_from_diff(diff)
+    assert changed == {"pkg/util.py": [7], "pkg/new.py": []}
+    assert g.tests_covering("pkg/util.py", changed["pkg/util.py"]) == [
+        "tests/test_util.py::test_run[a]"
+    ]
+
+
+def test_tests_covering_with_sandboxed_paths_and_header_like_lines(tmp_path):
+    from planning.planner import changed_lines_from_diff
+
+    _write_pkg(tmp_path)
+    data = tmp_path / ".coverage"
+    # Recorded inside a container with the tree mounted at /work
+    _write_coverage_db(
+        str(data), [("/work/pkg/util.py", "tests/test_util.py::test_run|run", [6, 7])]
+    )
+    g = CodeGraph.load_or_build(str(tmp_path))
+    g.attach_coverage(str(data), {"/work": str(tmp_path)})
+    # Removed "-- x" / added "++ y" lines look like file headers
+    diff = (
+        "--- a/pkg/util.py\n+++ b/pkg/util.py\n@@ -5,3 +5,3 @@\n"
+        " class Base:\n--- old comment\n+++ new comment\n"
+        "         return helper(1)\n"
+    )
+    changed = changed_lines_from_diff(diff)
+    assert changed == {"pkg/util.py": [6]}
+    assert g.tests_covering("pkg/util.py", changed["pkg/util.py"]) == [
+        "tests/test_util.py::test_run"
+    ]
+
+
+def test_call_edges_stored_as_id_arrays(tmp_path):
+    from array import array
+
+    _write_pkg(tmp_path)
+    g = CodeGraph.load_or_build(str(tmp_path))
+    edges = g.calls_by_module["pkg.core"]
+    assert isinstance(edges, array) and len(edges) % 2 == 0
+    assert ("pkg.core.main", "pkg.util.helper") in g.calls
+    assert g.calls_of("pkg.core.main") == ["pkg.util.helper"]
+    assert sorted(g.who_calls("pkg.util.helper")) == ["pkg.core.main", "pkg.util.Base.run"]
+    assert g.symbols_by_fqn["pkg.util.helper"].module is g.symbols_by_fqn["pkg.util.Base"].module
+
+    time.sleep(0.01)
+    (tmp_path / "pkg" / "core.py").write_text(
+        "from pkg.util import helper\n\n\ndef main():\n    return 0\n", encoding="utf-8"
+    )
+    g2 = CodeGraph.load_or_build(str(tmp_path))
+    assert g2.calls_of("pkg.core.main") == []
+    assert g2.who_calls("pkg.util.helper") == ["pkg.util.Base.run"]
+    assert g2.refs_of("pkg.util.helper") == [("pkg.util.Base.run", "pkg.util.helper")]
+    cold = CodeGraph.load_or_build(str(tmp_path), ignore_cache=True)
+    assert sorted(g2.calls) == sorted(cold.calls)
+    assert g2.num_calls == len(cold.calls)
+
+
+@pytest.mark.parametrize("git", [False, True])
+def test_enumeration_skips_ignored_and_excluded_files(tmp_path, git):
+    import subprocess
+
+    _write_pkg(tmp_path)
+    for rel in (
+        ".venv/lib/site.py",
+        "node_modules/x/gen.py",
+        "logs/actuator/run1/patched.py",
+        "build_out/tmp.py",
+        "pkg/vendored/lib.py",
+        "pkg/generated_pb2.py",
+    ):
+        (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel).write_text("def f():\n    return 1\n", encoding="utf-8")
+    (tmp_path / ".gitignore").write_text("build_out/\n*_pb2.py\n", encoding="utf-8")
+    (tmp_path / ".codegraphignore").write_text("pkg/vendored/\n", encoding="utf-8")
+    if git:
+        subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+        subprocess.run(["git", "-C", str(tmp_path), "add", "pkg"], check=True)
+        # Tracked but deleted from the work tree
+        (tmp_path / "pkg" / "__init__.py").unlink()
+
+    g = CodeGraph.load_or_build(str(tmp_path), excludes=["tests/"])
+    rel = sorted(os.path.relpath(f, tmp_path) for f in g.indexed_files)
+    expected = ["pkg/core.py", "pkg/util.py"]
+    assert rel == (expected if git else ["pkg/__init__.py"] + expected)
+    assert "pkg.core.main" in g.who_calls("pkg.util.helper")
+
+
+def test_nested_defs_are_symbols_and_own_their_calls(tmp_path):
+    pkg = tmp_path / "pkg"
+    pkg.mkdir()
+    (pkg / "__init__.py").write_text("", encoding="utf-8")
+    (pkg / "nest.py").write_text(
+        "def outer(x):\n"
+        "    y = prep(x)\n"
+        "    def inner(z):\n"
+        "        class Local:\n"
+        "            def go(self):\n"
+        "                return deep()\n"
+        "        return shallow(z)\n"
+        "    return inner(y)\n",
+        encoding="utf-8",
+    )
+    g = CodeGraph.load_or_build(str(tmp_path), ignore_cache=True)
+    for fqn in ("pkg.nest.outer.inner", "pkg.nest.outer.inner.Local", "pkg.nest.outer.inner.Local.go"):
+        assert fqn in g.symbols_by_fqn
+    assert "pkg.nest.outer.y" not in g.symbols_by_fqn
+    assert g.symbols_by_fqn["pkg.nest.outer.inner"].qualname == "outer"
+    assert sorted(g.calls_of("pkg.nest.outer")) == ["pkg.nest.outer.inner", "prep"]
+    assert g.calls_of("pkg.nest.outer.inner") == ["shallow"]
+    assert g.calls_of("pkg.nest.outer.inner.Local.go") == ["deep"]
+
+
+def test_method_calls_resolve_through_mro(tmp_path):
+    _write_pkg(tmp_path)
+    pkg = tmp_path / "pkg"
+    (pkg / "__init__.py").write_text("from pkg.util import Base\n", encoding="utf-8")
+    (pkg / "mixins.py").write_text(
+        "class Loud:\n    def shout(self):\n        return 1\n", encoding="utf-8"
+    )
+    (pkg / "child.py").write_text(
+        "import pkg.mixins\nfrom pkg import Base\n\n\n"
+        "class Child(pkg.mixins.Loud, Base):\n"
+        "    def run(self):\n"
+        "        return super().run() + self.shout()\n\n"
+        "    def go(self):\n"
+        "        return self.run()\n\n\n"
+        "def run():\n    return 0\n\n\n"
+        "def main():\n    return run()\n",
+        encoding="utf-8",
+    )
+    g = CodeGraph.load_or_build(str(tmp_path))
+    assert g.mro("pkg.child.Child") == ["pkg.child.Child", "pkg.mixins.Loud", "pkg.util.Base"]
+    assert sorted(g.calls_of("pkg.child.Child.run")) == [
+        "pkg.mixins.Loud.shout",
+        "pkg.util.Base.run",
+        "super",
+    ]
+    assert g.calls_of("pkg.child.Child.go") == ["pkg.child.Child.run"]
+    # A bare name resolves lexically to the module-level def, not the method
+    assert g.calls_of("pkg.child.main") == ["pkg.child.run"]
+
+    # Overriding in a base module re-resolves inherited calls in subclasses
+    time.sleep(0.01)
+    (pkg / "mixins.py").write_text(
+        "class Louder:\n    def shout(self):\n        return 2\n\n\n"
+        "class Loud(Louder):\n    pass\n",
+        encoding="utf-8",
+    )
+    g2 = CodeGraph.load_or_build(str(tmp_path))
+    assert "pkg.mixins.Louder.shout" in g2.calls_of("pkg.child.Child.run")
+    cold = CodeGraph.load_or_build(str(tmp_path), ignore_cache=True)
+    assert sorted(g2.calls) == sorted(cold.calls)
+
+
+def test_inherited_calls_re_resolve_three_levels_down(tmp_path):
+    p = tmp_path / "p"
+    p.mkdir()
+    (p / "__init__.py").write_text("", encoding="utf-8")
+    (p / "a.py").write_text(
+        "class A:\n    def foo(self):\n        return 1\n", encoding="utf-8"
+    )
+    (p / "b.py").write_text(
+        "from p.a import A\n\n\nclass B(A):\n    pass\n", encoding="utf-8"
+    )
+    (p / "c.py").write_text(
+        "from p.b import B\n\n\nclass C(B):\n"
+        "    def go(self):\n        return self.foo()\n\n"
+        "    def run(self):\n        return super().foo()\n",
+        encoding="utf-8",
+    )
+    g = CodeGraph.load_or_build(str(tmp_path))
+    assert g.calls_of("p.c.C.go") == ["p.a.A.foo"]
+    assert g.calls_of("p.c.C.run") == ["super", "p.a.A.foo"]
+    for source in (
+        "class A:\n    pass\n",
+        "class A:\n    def foo(self):\n        return 2\n",
+    ):
+        time.sleep(0.01)
+        (p / "a.py").write_text(source, encoding="utf-8")
+        assert g.refresh()
+        cold = CodeGraph.load_or_build(str(tmp_path), ignore_cache=True)
+        for fqn in ("p.c.C.go", "p.c.C.run"):
+            assert g.calls_of(fqn) == cold.calls_of(fqn)
+        assert sorted(g.calls) == sorted(cold.calls)
+    assert g.calls_of("p.c.C.go") == ["p.a.A.foo"]
+    reloaded = CodeGraph.load_or_build(str(tmp_path), daemon=False)
+    assert sorted(reloaded.calls) == sorted(g.calls)
+
+
+def test_module_created_after_its_importer(tmp_path):
+    p = tmp_path / "p"
+    p.mkdir()
+    (p / "__init__.py").write_text("", encoding="utf-8")
+    (p / "user.py").write_text(
+        "from p.later import *\n\n\ndef go():\n    return helper()\n\n\n"
+        "class U(Base):\n    def go(self):\n        return self.run()\n",
+        encoding="utf-8",
+    )
+    g = CodeGraph.load_or_build(str(tmp_path))
+    assert g.calls_of("p.user.go") == ["helper"]
+    assert g.impacted(["p"]) == ["p", "p.user"]
+    (p / "later.py").write_text(
+        "def helper():\n    return 1\n\n\nclass Base:\n    def run(self):\n        return 2\n",
+        encoding="utf-8",
+    )
+    assert g.refresh()
+    cold = CodeGraph.load_or_build(str(tmp_path), ignore_cache=True)
+    assert g.calls_of("p.user.go") == cold.calls_of("p.user.go") == ["p.later.helper"]
+    assert g.calls_of("p.user.U.go") == ["p.later.Base.run"]
+    assert g.modules["p.user"].imports == cold.modules["p.user"].imports
+    assert g.impacted(["p.later"]) == ["p.later", "p.user"]
+
+
+def test_refresh_re_resolves_only_affected_modules(tmp_path, monkeypatch):
+    _write_pkg(tmp_path)
+    g = CodeGraph.load_or_build(str(tmp_path))
+    resolve = g._post_resolve_calls
+    seen = []
+
+    def record(modules=None):
+        seen.append(None if modules is None else sorted(modules))
+        resolve(modules)
+
+    monkeypatch.setattr(g, "_post_resolve_calls", record)
+    time.sleep(0.01)
+    (tmp_path / "tests" / "test_core.py").write_text(
+        "from pkg.core import main\n\n\ndef test_main():\n    assert main() == 4\n",
+        encoding="utf-8",
+    )
+    assert g.refresh()
+    # A module without classes only re-resolves its own edges
+    assert seen == [["tests.test_core"]]
+    (tmp_path / "pkg" / "util.py").write_text(
+        "def helper(x):\n    return x\n\n\nclass Base:\n    def run(self):\n        return 0\n",
+        encoding="utf-8",
+    )
+    assert g.refresh()
+    # Classes may be reached from direct importers' calls
+    assert seen[1] == ["pkg.core", "pkg.util"]
+    cold = CodeGraph.load_or_build(str(tmp_path), ignore_cache=True)
+    assert sorted(g.calls) == sorted(cold.calls)
+
+
+def test_bench_suite_reports_and_flags_regressions(tmp_path):
+    from bench.run import compare, run_suite
+    from bench.synth import generate
+
+    generate(str(tmp_path), packages=2, modules=2, funcs=3, fanout=2, nesting=2)
+    results = run_suite(str(tmp_path), repeat=1, queries=4)
+    assert set(results) == {
+        "cold_build_s",
+        "no_change_rebuild_s",
+        "incremental_s",
+        "who_calls_s",
+        "tests_for_module_s",
+        "search_refs_s",
+    }
+    assert all(v >= 0 for v in results.values())
+    g = CodeGraph.load_or_build(str(tmp_path), daemon=False)
+    assert "pkg0.m0.deep0.deep1" in g.symbols_by_fqn
+    assert not any("bench_edit" in f for f in g.symbols_by_fqn)
+
+    base = {"cold_build_s": 1.0, "who_calls_s": 1e-6}
+    assert compare({"cold_build_s": 1.1, "who_calls_s": 5e-6}, base, 0.2, 0.001) == []
+    assert compare({"cold_build_s": 1.5}, base, 0.2, 0.001) == [
+        "cold_build_s: 1.0000s -> 1.5000s (+50%)"
+    ]
+
+
+def test_cli_batch_answers_each_line_from_one_graph(tmp_path):
+    import io
+    import json
+
+    from tools.code_graph import _run_batch
+
+    _write_pkg(tmp_path)
+    g = CodeGraph.load_or_build(str(tmp_path))
+    lines = [
+        '{"who_calls": "pkg.util.helper", "id": 1}',
+        '{"op": "tests_for_module", "arg": "pkg.core"}',
+        '{"dump": true}',
+        "",
+        '{"bogus": 1}',
+        '{"module_deps": "pkg.core"}',
+    ]
+    out = io.StringIO()
+    assert _run_batch(g, g, lines, out) == 5
+    replies = [json.loads(r) for r in out.getvalue().splitlines()]
+    assert replies[0]["id"] == 1
+    assert sorted(replies[0]["result"]) == ["pkg.core.main", "pkg.util.Base.run"]
+    assert replies[1] == {"result": ["tests.test_core"]}
+    assert replies[2]["result"]["modules"] == len(g.modules)
+    assert "error" in replies[3]
+    assert replies[4] == {"result": ["pkg.util"]}
+
+
+def test_streaming_exports_match_in_memory_graph(tmp_path):
+    import io
+    import json
+    import sqlite3
+
+    _write_pkg(tmp_path)
+    g = CodeGraph.load_or_build(str(tmp_path))
+    buf = io.StringIO()
+    g.write_json(buf)
+    assert json.loads(buf.getvalue()) == json.loads(json.dumps(g.export_json()))
+
+    out = tmp_path / "graph.ndjson"
+    n = g.export_ndjson(str(out))
+    records = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert len(records) == n and records[0]["type"] == "meta"
+    by_type = {}
+    for r in records:
+        by_type.setdefault(r["type"], []).append(r)
+    assert len(by_type["symbol"]) == len(g.symbols_by_fqn)
+    assert sorted((r["caller"], r["callee"]) for r in by_type["call"]) == sorted(g.calls)
+    assert {r["module"] for r in by_type["module"]} == set(g.modules)
+
+    db = str(tmp_path / "graph.db")
+    g.export_sqlite(db)
+    g.export_sqlite(db)  # full rewrite drops and rebuilds the indexes
+    conn = sqlite3.connect(db)
+    indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    assert {"ix_calls_short", "ix_symbols_name"} <= indexes
+    assert conn.execute("SELECT COUNT(*) FROM calls").fetchone()[0] == len(g.calls)
+    conn.close()
+
+
+def test_rank_orders_by_centrality_and_follows_edits(tmp_path):
+    from act.patcher import _graph_context
+
+    _write_pkg(tmp_path)
+    g = CodeGraph.load_or_build(str(tmp_path))
+    assert g.rank(["pkg.util.Base.run", "pkg.util.helper", "nope"]) == [
+        "pkg.util.helper",
+        "pkg.util.Base.run",
+        "nope",
+    ]
+    assert g.rank(["pkg.util.Base.run", "pkg.util.helper"], 1) == ["pkg.util.helper"]
+    assert g.centrality("pkg.util.helper") > g.centrality("pkg.util.Base.run") > 0
+    ctx = _graph_context(g, {"objective": "touch pkg.util"})
+    assert "Defs(pkg.util): pkg.util.helper," in ctx
+
+    (tmp_path / "pkg" / "extra.py").write_text(
+        "from pkg.util import Base\n\n\n"
+        + "".join(f"def use{i}(b):\n    return Base.run(b)\n\n\n" for i in range(6)),
+        encoding="utf-8",
+    )
+    before = g.centrality("pkg.util.Base.run")
+    g2 = CodeGraph.load_or_build(str(tmp_path))
+    assert len(g2.who_calls("pkg.util.Base.run")) == 6
+    assert g2.centrality("pkg.util.Base.run") > before
+
+    # An edit that leaves the edges alone keeps the scores without a rerun
+    scored = g2._centrality_scores()
+    with open(tmp_path / "pkg" / "extra.py", "a", encoding="utf-8") as wf:
+        wf.write("# unused\n")
+    assert g2.refresh()
+    assert g2._centrality is None
+    assert g2._centrality_scores() is scored
+
+
+def test_neighborhood_walks_edge_kinds_breadth_first(tmp_path):
+    import io
+    import json
+
+    from tools.code_graph import _run_batch
+
+    _write_pkg(tmp_path)
+    g = CodeGraph.load_or_build(str(tmp_path))
+    calls = g.neighborhood(["pkg.util.helper"], hops=1, edge_kinds=["calls"])
+    assert calls[0] == ("pkg.util.helper", 0)
+    assert sorted(calls[1:]) == [("pkg.core.main", 1), ("pkg.util.Base.run", 1)]
+    near = dict(g.neighborhood(["pkg.core.main"], hops=2))
+    assert near["pkg.core"] == 1 and near["pkg.util.helper"] == 1
+    assert near["tests.test_core.test_main"] == 1 and near["tests.test_core"] == 1
+    assert near["pkg.util"] == 2 and near["pkg.util.Base.run"] == 2
+    assert dict(g.neighborhood(["pkg.util"], edge_kinds=["defs"]))["pkg.util.Base"] == 1
+    assert g.neighborhood(["pkg.util"], hops=5, limit=2) == [("pkg.util", 0), ("pkg.core", 1)]
+    with pytest.raises(ValueError):
+        g.neighborhood(["pkg.util"], edge_kinds=["bogus"])
+
+    out = io.StringIO()
+    _run_batch(g, g, ['{"neighborhood": {"seeds": "pkg.util", "edges": "imports"}}'], out)
+    assert json.loads(out.getvalue())["result"] == [["pkg.util", 0], ["pkg.core", 1]]
+
+
+@pytest.mark.parametrize("name", ["graph.npz", "graph_csr"])
+def test_csr_export_round_trips_memory_mapped(tmp_path, name):
+    from tools.graph_csr import load_csr
+
+    _write_pkg(tmp_path)
+    g = CodeGraph.load_or_build(str(tmp_path))
+    path = g.export_csr(str(tmp_path / "out" / name))
+    c = load_csr(path)
+    assert len(c) >= len(g.symbols_by_fqn) and c.meta["symbols"] == len(g.symbols_by_fqn)
+
+    def edges(kind):
+        ptr, idx = c.indptr(kind), c.indices(kind)
+        return {
+            (c.node(i), c.node(idx[j])) for i in range(len(c)) for j in range(ptr[i], ptr[i + 1])
+        }
+
+    assert edges("calls") == set(g.calls)
+    assert ("pkg.core", "pkg.util") in edges("imports")
+    assert ("pkg.util.Base", "pkg.util.Base.run") in edges("contains")
+    main = c.node_id("pkg.core.main")
+    assert [c.node(i) for i in c.successors("calls", main)] == ["pkg.util.helper"]
+    assert c.is_symbol(main)
+
+
+def test_snapshot_answers_read_only_queries_in_place(tmp_path):
+    from tools.graph_snapshot import GraphSnapshot
+
+    _write_pkg(tmp_path)
+    g = CodeGraph.load_or_build(str(tmp_path))
+    path = g.write_snapshot()
+    assert path.endswith(os.path.join(".codegraph", "snapshot.bin"))
+    with GraphSnapshot(str(tmp_path)) as snap:
+        assert snap.find_symbol("helper") == g.find_symbol("helper")
+        assert snap.find_symbol("missing") == []
+        assert snap.defs_in("pkg.util") == g.defs_in("pkg.util")
+        assert sorted(snap.who_calls("pkg.util.helper")) == sorted(g.who_calls("pkg.util.helper"))
+        assert snap.tests_for_module("pkg.core") == g.tests_for_module("pkg.core")
+        assert snap.module_for_file("pkg/core.py") == "pkg.core"
+        assert snap.module_for_file(str(tmp_path / "pkg" / "util.py")) == "pkg.util"
+        assert snap.file_for_module("pkg.util") == g.file_for_module("pkg.util")
+        assert snap.module_for_file("nope.py") is None
+
+
+def test_module_for_file_index_follows_reindex_and_symlinks(tmp_path):
+    from tools.graph_snapshot import GraphSnapshot
+
+    real = tmp_path / "real"
+    _write_pkg(real)
+    link = tmp_path / "link"
+    link.symlink_to(real, target_is_directory=True)
+    g = CodeGraph.load_or_build(str(link))
+    assert g.module_for_file("pkg/core.py") == "pkg.core"
+    assert g.module_for_file(str(link / "pkg" / "util.py")) == "pkg.util"
+    assert g.module_for_file(str(real / "pkg" / "util.py")) == "pkg.util"
+    assert g.module_for_file(str(link / "pkg" / ".." / "pkg" / "core.py")) == "pkg.core"
+    assert g.module_for_file(str(tmp_path / "elsewhere.py")) is None
+    assert g.file_for_module("pkg.core") == str(link / "pkg" / "core.py")
+    g.write_snapshot()
+    with GraphSnapshot(str(link)) as snap:
+        assert snap.module_for_file(str(real / "pkg" / "util.py")) == "pkg.util"
+
+    (real / "pkg" / "extra.py").write_text("def f():\n    return 1\n", encoding="utf-8")
+    (real / "pkg" / "core.py").unlink()
+    g.refresh()
+    assert g.module_for_file("pkg/extra.py") == "pkg.extra"
+    assert g.module_for_file("pkg/core.py") is None
+    assert CodeGraph.load_or_build(str(link)).module_for_file("pkg/extra.py") == "pkg.extra"
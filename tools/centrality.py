@@ -0,0 +1,99 @@
+"""Importance scores for CodeGraph symbols.
+
+PageRank over a directed graph whose nodes are symbols (modules included) and
+whose edges are resolved call edges (caller -> callee) and import edges
+(importing module -> imported module or symbol). A symbol's score is its
+PageRank scaled so the mean is 1.0, plus a bonus for the number of distinct
+test modules that call or import it:
+
+    score = pagerank * n_nodes + TEST_WEIGHT * log1p(test_refs)
+
+Scores are recomputed lazily, and only when ``signature`` shows the scored
+graph changed; the previous vector then seeds the power iteration, so small
+edits converge in a few sweeps.
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+DAMPING = 0.85
+TOLERANCE = 1e-8
+MAX_ITERS = 100
+TEST_WEIGHT = 0.25
+
+
+def pagerank(
+    nodes: List[str],
+    edges: Iterable[Tuple[int, int]],
+    damping: float = DAMPING,
+    tol: float = TOLERANCE,
+    max_iters: int = MAX_ITERS,
+    start: Optional[Dict[str, float]] = None,
+) -> List[float]:
+    """PageRank of ``nodes`` over ``edges`` given as (src, dst) indexes.
+
+    Duplicate edges count once. Dangling nodes spread their rank uniformly.
+    ``start`` (node -> previous score) warm-starts the iteration.
+    """
+    n = len(nodes)
+    if not n:
+        return []
+    outs: List[Set[int]] = [set() for _ in range(n)]
+    for a, b in edges:
+        if a != b:
+            outs[a].add(b)
+    ins: List[List[int]] = [[] for _ in range(n)]
+    for a, dsts in enumerate(outs):
+        for b in dsts:
+            ins[b].append(a)
+    outdeg = [len(d) for d in outs]
+    dangling = [i for i, d in enumerate(outdeg) if not d]
+    inv = [1.0 / d if d else 0.0 for d in outdeg]
+
+    if start:
+        pr = [start.get(v, 1.0 / n) for v in nodes]
+        total = sum(pr) or 1.0
+        pr = [x / total for x in pr]
+    else:
+        pr = [1.0 / n] * n
+    base = (1.0 - damping) / n
+    for _ in range(max_iters):
+        contrib = [x * w for x, w in zip(pr, inv, strict=True)]
+        leak = damping * sum(pr[i] for i in dangling) / n
+        getc = contrib.__getitem__
+        new = [base + leak + damping * sum(map(getc, src)) for src in ins]
+        delta = sum(abs(x - y) for x, y in zip(new, pr, strict=True))
+        pr = new
+        if delta < tol:
+            break
+    return pr
+
+
+def scores(
+    nodes: List[str],
+    edges: Iterable[Tuple[int, int]],
+    test_refs: Dict[str, int],
+    start: Optional[Dict[str, float]] = None,
+) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """(combined score, raw pagerank) per node."""
+    pr = pagerank(nodes, edges, start=start)
+    n = len(nodes)
+    raw = dict(zip(nodes, pr, strict=True))
+    combined = {
+        v: p * n + TEST_WEIGHT * math.log1p(test_refs.get(v, 0)) for v, p in raw.items()
+    }
+    return combined, raw
+
+
+def signature(
+    nodes: List[str], edges: List[Tuple[int, int]], test_refs: Dict[str, int]
+) -> int:
+    """Order-independent hash of what ``scores`` depends on: the node names,
+    the distinct non-loop edges between them and the test reference counts."""
+    return hash(
+        (
+            frozenset(nodes),
+            frozenset((nodes[a], nodes[b]) for a, b in edges if a != b),
+            frozenset(test_refs.items()),
+        )
+    )
@@ -1,13 +1,24 @@
 import os
+import sys
 import ast
 import re
 import json
+import marshal
+import struct
 import time  # noqa: F401
+from array import array
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Tuple, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Optional
 
+from tools import compact
+from tools.compact import StringTable, pairs
+from tools.file_enum import list_files
 
-@dataclass
+# Edge kinds walked by ``CodeGraph.neighborhood``; each is followed both ways
+EDGE_KINDS = ("calls", "imports", "defs", "tests")
+
+
+@dataclass(slots=True)
 class Symbol:
     fqn: str
     name: str
@@ -21,8 +32,15 @@ class Symbol:
     signature: Optional[str] = None
     returns: Optional[str] = None
 
+    def __post_init__(self) -> None:
+        # Shared by every symbol of a module / kind: keep one string object each
+        self.name = sys.intern(self.name)
+        self.kind = sys.intern(self.kind)
+        self.module = sys.intern(self.module)
+        self.file = sys.intern(self.file)
 
-@dataclass
+
+@dataclass(slots=True)
 class ModuleInfo:
     module: str
     file: str
@@ -32,89 +50,339 @@ class ModuleInfo:
     )  # alias -> target (module or module.symbol)
     defs: List[str] = field(default_factory=list)  # list of symbol FQNs
     exports: List[str] = field(default_factory=list)  # names from __all__
+    # class qualname -> base class expressions as written (``Base``, ``mod.Base``)
+    bases: Dict[str, List[str]] = field(default_factory=dict)
 
 
 class CodeGraph:
-    def __init__(self, root: str) -> None:
+    def __init__(self, root: str, excludes: Optional[List[str]] = None) -> None:
         self.root = os.path.abspath(root)
+        # Extra gitignore-style patterns on top of file_enum.DEFAULT_EXCLUDES
+        self.excludes: List[str] = list(excludes or [])
         self.symbols_by_fqn: Dict[str, Symbol] = {}
         self.symbols_by_name: Dict[str, List[str]] = {}
         self.modules: Dict[str, ModuleInfo] = {}
         self.indexed_files: List[str] = []
-        self.calls: List[Tuple[str, str]] = []  # (caller_fqn, callee_fqn_or_key)
+        # Call edges owned by the module that contains the caller, as arrays of
+        # interleaved (caller, callee) ids into ``_strings``; ``calls`` decodes
+        self._strings = StringTable()
+        # Table size after the last load or compaction, and the edge ids purged
+        # since; together they bound the strings no edge refers to any more
+        self._strings_base = 0
+        self._strings_purged = 0
+        self.calls_by_module: Dict[str, "array[int]"] = {}
+        # module -> {edge number: parsed callee id} for the edges post-resolution
+        # rewrote, so re-resolving always starts from what the parser saw
+        self.raw_callees: Dict[str, Dict[int, int]] = {}
+        # module -> symbol FQNs it owns (set mirror of ModuleInfo.defs)
+        self._module_symbols: Dict[str, set[str]] = {}
+        # Call-graph adjacency (id arrays keyed by interned strings), kept in
+        # step with ``calls_by_module``
+        self.callees_by_caller: Dict[str, "array[int]"] = {}
+        self.callers_by_callee: Dict[str, "array[int]"] = {}
+        self.refs_by_short: Dict[str, "array[int]"] = {}  # short -> edge pairs
         self.module_to_tests: Dict[str, List[str]] = {}
-        self.coverage_files: Dict[str, set[int]] = {}
+        self.coverage_files: Dict[str, "array[int]"] = {}  # file -> sorted hit lines
         self.symbol_coverage: Dict[str, float] = {}
+        # Per-test coverage contexts: node id table and file -> line -> test ids
+        self.test_nodeids: List[str] = []
+        self.tests_by_line: Dict[str, Dict[int, "array[int]"]] = {}
         self.module_imports: Dict[str, List[str]] = {}
         self.module_star_imports: Dict[str, List[str]] = {}
         self.pytest_nodes_by_module: Dict[str, List[str]] = {}
-        self._cached_mtimes: Dict[str, int] = {}
-        self._cached_hashes: Dict[str, str] = {}
+        # Per-file validation state: (st_size, st_mtime_ns, st_ino) and SHA-1
+        self._file_stats: Dict[str, Tuple[int, int, int]] = {}
+        self._file_hashes: Dict[str, str] = {}
+        self._stats_dirty = False
+        # Full-text symbol index, built on the first search_symbols call
+        self._search_index: Optional[Any] = None
+        # File-content trigram index for search_refs, loaded on first use
+        self._trigrams: Optional[Any] = None
+        # Reverse-dependency index for impacted(), built on first use
+        self._impact: Optional[Any] = None
+        # class FQN -> MRO, reset by each post-resolve pass
+        self._mro_memo: Dict[str, List[str]] = {}
+        # Centrality scores for rank(); reset after the graph changes, then
+        # recomputed only if the scored graph's signature differs, warm-started
+        # from the last PageRank vector
+        self._centrality: Optional[Dict[str, float]] = None
+        self._centrality_last: Tuple[Optional[int], Dict[str, float]] = (None, {})
+        self._pagerank_prev: Dict[str, float] = {}
+        # Symbol -> directly nested symbols, built on the first traversal
+        self._def_children: Optional[Dict[str, List[str]]] = None
+        # Normalized file path -> module, built on first lookup and kept in
+        # step with reindexing
+        self._module_by_path: Optional[Dict[str, str]] = None
+        self._real_root: Optional[str] = None
+        # Sharded cache bookkeeping: modules whose record must be rewritten, and
+        # the base pack / overlay shards currently on disk
+        self._dirty_modules: set[str] = set()
+        self._dropped_modules: set[str] = set()
+        self._has_pack = False
+        self._shards: Dict[str, str] = {}
+        self._shards_dropped: set[str] = set()
+
+    @property
+    def calls(self) -> List[Tuple[str, str]]:
+        """All (caller_fqn, callee_fqn_or_key) edges, grouped by owning module.
+
+        Decoded into a new list on each access from the compact per-module edge
+        arrays; stream with ``iter_calls()`` and count with ``num_calls``.
+        """
+        return list(self.iter_calls())
+
+    @property
+    def num_calls(self) -> int:
+        """Number of call edges, without decoding them."""
+        return sum(len(edges) for edges in self.calls_by_module.values()) // 2
+
+    def stats(self) -> Dict[str, int]:
+        """Sizes of the main structures (the CLI's ``--dump``)."""
+        return {
+            "files": len(self.indexed_files),
+            "symbols": len(self.symbols_by_fqn),
+            "modules": len(self.modules),
+            "calls": self.num_calls,
+            "coverage_files": len(self.coverage_files),
+        }
+
+    def iter_calls(self, module: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+        """Stream (caller, callee) edges, of one module or all of them."""
+        s = self._strings.strings
+        if module is not None:
+            groups: Iterable[Any] = (self.calls_by_module.get(module, ()),)
+        else:
+            groups = self.calls_by_module.values()
+        for edges in groups:
+            for a, b in pairs(edges):
+                yield s[a], s[b]
+
+    def _module_edges(self, module: str) -> List[Tuple[str, str]]:
+        return list(self.iter_calls(module))
 
     @classmethod
-    def load_or_build(cls, root: str, *, ignore_cache: bool = False) -> "CodeGraph":
-        g = cls(root=root)
-        g.build(ignore_cache=ignore_cache)
+    def load_or_build(
+        cls,
+        root: str,
+        *,
+        ignore_cache: bool = False,
+        jobs: int = 1,
+        validate: str = "stat",
+        sqlite_path: Optional[str] = None,
+        daemon: bool = True,
+        excludes: Optional[List[str]] = None,
+    ) -> "CodeGraph":
+        if daemon and not ignore_cache and not sqlite_path and not excludes:
+            # A running daemon already holds this graph in memory
+            try:
+                from tools.code_graph_daemon import connect_graph
+
+                remote = connect_graph(root)
+                if remote is not None:
+                    return remote
+            except Exception:
+                pass
+        g = cls(root=root, excludes=excludes)
+        g.build(
+            ignore_cache=ignore_cache,
+            jobs=jobs,
+            validate=validate,
+            sqlite_path=sqlite_path,
+        )
         return g
 
-    def build(self, ignore_cache: bool = False) -> None:
-        cache_path = os.path.join(self.root, ".codegraph.json")
+    def build(
+        self,
+        ignore_cache: bool = False,
+        jobs: int = 1,
+        validate: str = "stat",
+        sqlite_path: Optional[str] = None,
+    ) -> None:
+        """Build the graph, reusing the on-disk cache when possible.
+
+        ``jobs`` > 1 parses files of a cold build in a process pool; ``jobs`` <= 0
+        uses every CPU core. ``validate="stat"`` only hashes files whose
+        (size, mtime_ns, inode) changed since the cache was written;
+        ``validate="hash"`` hashes every file. With ``sqlite_path`` the SQLite
+        backend is kept in step: rows of reindexed modules are replaced, and the
+        database is written in full on cold builds or when it is missing.
+        """
+        cache_path = os.path.join(self.root, _CACHE_DIR)
         if (not ignore_cache) and self._load_cache_relaxed(cache_path):
-            # Incremental: reindex changed and dependents
-            changed, removed = self._detect_changed_files(
-                self._cached_mtimes, self._cached_hashes
-            )
-            if not changed and not removed:
-                return
-            self._incremental_reindex(changed, removed)
-            self._expand_star_imports()
-            self._post_resolve_calls()
-            self._save_cache(cache_path)
+            self.refresh(validate=validate, sqlite_path=sqlite_path)
             return
-        for dirpath, _, filenames in os.walk(self.root):
-            for fn in filenames:
-                if not fn.endswith(".py"):
-                    continue
-                fpath = os.path.join(dirpath, fn)
-                try:
-                    src = open(fpath, "r", encoding="utf-8").read()
-                except Exception:
-                    continue
-                try:
-                    tree = ast.parse(src)
-                except Exception:
-                    continue
-                self.indexed_files.append(fpath)
-                self._index_module(fpath, tree)
+        files = self._list_files()
+        for summary in self._summarize_files(files, jobs):
+            if summary is None:
+                continue
+            self.indexed_files.append(summary.path)
+            self._apply_summary(summary)
         # Build test mapping from imports in test modules
         self._build_test_mapping()
         # Expand star imports and post-resolve call targets
         self._expand_star_imports()
         self._post_resolve_calls()
+        if sqlite_path:
+            self.export_sqlite(sqlite_path)
         self._save_cache(cache_path)
 
+    def refresh(
+        self, validate: str = "stat", sqlite_path: Optional[str] = None
+    ) -> bool:
+        """Bring an already loaded graph up to date with the tree.
+
+        Reindexes changed files and their reverse-import dependents in memory,
+        then persists the cache (and SQLite rows when ``sqlite_path`` is given).
+        The database only gets the reindexed modules' rows if it was written
+        for the files the graph held before this refresh; a missing database,
+        or one left behind by runs without ``sqlite_path``, is rewritten in
+        full. Returns True if any file changed.
+        """
+        cache_path = os.path.join(self.root, _CACHE_DIR)
+        in_step = bool(sqlite_path) and self._sqlite_in_step(str(sqlite_path))
+        changed, removed = self._detect_changed_files(
+            self._file_stats, self._file_hashes, validate=validate
+        )
+        if not changed and not removed:
+            if sqlite_path and not in_step:
+                self.export_sqlite(sqlite_path)
+            elif sqlite_path and self._stats_dirty:
+                # No rows change, but the recorded file stats must
+                self.export_sqlite(sqlite_path, ())
+            if self._stats_dirty:
+                # Touched but unchanged files: persist new stats only
+                self._save_cache(cache_path)
+            return False
+        scope = self._incremental_reindex(changed, removed)
+        self._rebuild_test_mapping()
+        self._post_resolve_calls(scope)
+        if sqlite_path:
+            self.export_sqlite(
+                sqlite_path,
+                self._dirty_modules | self._dropped_modules if in_step else None,
+            )
+        self._save_cache(cache_path)
+        return True
+
+    def _sqlite_in_step(self, db_path: str) -> bool:
+        """Whether ``db_path`` was last written for the files as the graph
+        currently holds them (compares the recorded stat digest)."""
+        from tools.code_graph_sqlite import _files_digest, recorded_files
+
+        recorded = recorded_files(db_path, self.root)
+        return recorded is not None and recorded == _files_digest(self.root, self._file_state()[0].items())
+
+    def _list_files(self) -> List[str]:
+        """Python files to index: git's file list inside a work tree, otherwise a
+        pruned walk; ``.gitignore``, ``.codegraphignore`` and ``excludes``
+        apply either way."""
+        return list_files(self.root, self.excludes)
+
+    def _summarize_files(
+        self, files: List[str], jobs: int = 1
+    ) -> List[Optional["_ModuleSummary"]]:
+        """Parse and visit ``files``, in a process pool when ``jobs`` != 1.
+
+        Results keep the order of ``files``; unreadable or unparsable files yield
+        ``None``. Falls back to serial parsing if the pool cannot be used.
+        """
+        tasks = [
+            (
+                f,
+                self._module_name_for_path(f),
+                self._is_test_path(f),
+                os.path.relpath(f, self.root),
+            )
+            for f in files
+        ]
+        n = jobs if jobs > 0 else (os.cpu_count() or 1)
+        n = min(n, len(tasks))
+        if n > 1:
+            try:
+                from concurrent.futures import ProcessPoolExecutor
+
+                chunk = max(1, len(tasks) // (n * 4))
+                with ProcessPoolExecutor(max_workers=n) as ex:
+                    return list(ex.map(_summarize_task, tasks, chunksize=chunk))
+            except Exception:
+                pass
+        return [_summarize_task(t) for t in tasks]
+
     def _add_symbol(self, sym: Symbol) -> None:
         self.symbols_by_fqn[sym.fqn] = sym
         self.symbols_by_name.setdefault(sym.name, []).append(sym.fqn)
         mi = self.modules.setdefault(
             sym.module, ModuleInfo(module=sym.module, file=sym.file)
         )
-        if sym.fqn not in mi.defs:
+        owned = self._module_symbols.setdefault(sym.module, set())
+        if sym.fqn not in owned:
+            owned.add(sym.fqn)
             mi.defs.append(sym.fqn)
+        if self._search_index is not None:
+            from tools.symbol_search import symbol_fields
+
+            self._search_index.add(sym.fqn, symbol_fields(sym))
+
+    def _purge_module(self, module: str) -> None:
+        """Drop the symbols and call edges owned by ``module``.
+
+        Uses the per-module ownership indexes, so the cost is proportional to the
+        module's own size rather than to the whole graph.
+        """
+        by_name: Dict[str, set[str]] = {}
+        for fqn in self._module_symbols.pop(module, set()):
+            s = self.symbols_by_fqn.get(fqn)
+            if s is None or s.module != module:
+                continue
+            del self.symbols_by_fqn[fqn]
+            by_name.setdefault(s.name, set()).add(fqn)
+            if self._search_index is not None:
+                from tools.symbol_search import symbol_fields
+
+                self._search_index.remove(fqn, symbol_fields(s))
+        for name, fqns in by_name.items():
+            kept = [x for x in self.symbols_by_name.get(name, []) if x not in fqns]
+            if kept:
+                self.symbols_by_name[name] = kept
+            else:
+                self.symbols_by_name.pop(name, None)
+        mi = self.modules.get(module)
+        if mi:
+            mi.defs = []
+        edges = self.calls_by_module.pop(module, None)
+        self.raw_callees.pop(module, None)
+        if edges:
+            self._strings_purged += len(edges)
+            self._unindex_callers(set(edges[0::2]))
+
+    def _is_test_path(self, path: str) -> bool:
+        return ("/tests/" in path) or (os.path.basename(path).startswith("test_"))
 
     def _index_module(self, path: str, tree: ast.AST) -> None:
         module = self._module_name_for_path(path)
-        is_test = ("/tests/" in path) or (os.path.basename(path).startswith("test_"))
+        rel = os.path.relpath(path, self.root)
+        self._apply_summary(
+            _summarize_tree(path, module, self._is_test_path(path), rel, tree)
+        )
+
+    def _apply_summary(self, summary: "_ModuleSummary") -> None:
+        """Merge one module's parse results into the graph."""
+        module, path = summary.module, summary.path
+        self._dirty_modules.add(module)
+        self._dropped_modules.discard(module)
         self.modules.setdefault(
-            module, ModuleInfo(module=module, file=path, is_test=is_test)
+            module, ModuleInfo(module=module, file=path, is_test=summary.is_test)
         )
+        self._index_path(module, path)
+        if summary.sha1:
+            self._file_hashes[path] = summary.sha1
+        if summary.stat is not None:
+            self._file_stats[path] = summary.stat
         # Add module symbol
-        mod_fqn = module
-        mod_name = module.split(".")[-1]
         self._add_symbol(
             Symbol(
-                fqn=mod_fqn,
-                name=mod_name,
+                fqn=module,
+                name=module.split(".")[-1],
                 qualname="",
                 kind="module",
                 module=module,
@@ -123,28 +391,30 @@ class CodeGraph:
                 end_line=1,
             )
         )
-        # Visit
-        visitor = _ModuleVisitor(module, path)
-        visitor.visit(tree)
         # Register imports
-        self.modules[module].imports.update(visitor.imports)
+        self.modules[module].imports.update(summary.imports)
         # Module dependency edges
-        self.module_imports[module] = sorted(visitor.import_modules)
+        self.module_imports[module] = sorted(set(summary.import_modules))
         # Record star imports for later expansion
-        self.module_star_imports[module] = list(getattr(visitor, "star_imports", []))
-        # Record __all__ exports
-        self.modules[module].exports = list(getattr(visitor, "exports", []))
+        self.module_star_imports[module] = list(summary.star_imports)
+        # Record __all__ exports and class bases
+        self.modules[module].exports = list(summary.exports)
+        self.modules[module].bases = dict(summary.class_bases)
         # Register defs
-        for sym in visitor.symbols:
+        for sym in summary.iter_symbols():
             self._add_symbol(sym)
-        # Register calls
-        for caller, callee_key in visitor.calls:
-            callee_fqn = self._resolve_callee(module, callee_key, visitor)
-            self.calls.append((caller, callee_fqn or callee_key))
+        # Register calls; call sites sharing a (scope, key) resolve once
+        table: Dict[Tuple[str, str], Optional[str]] = {}
+        for caller, callee_key in summary.calls:
+            tk = (caller, callee_key)
+            if tk not in table:
+                table[tk] = self._resolve_callee(
+                    module, callee_key, summary.imports, caller
+                )
+            self._add_call(module, caller, table[tk] or callee_key)
         # Collect pytest nodes if test module
-        if is_test:
-            rel = os.path.relpath(path, self.root)
-            self.pytest_nodes_by_module[module] = self._collect_pytest_nodes(tree, rel)
+        if summary.is_test:
+            self.pytest_nodes_by_module[module] = list(summary.pytest_nodes)
 
     def owners_of(self, symbol: str) -> List[str]:
         fqns = self.symbols_by_name.get(symbol, [])
@@ -160,15 +430,26 @@ class CodeGraph:
         return list(mi.defs) if mi else []
 
     def calls_of(self, fqn: str) -> List[str]:
-        return [c for (caller, c) in self.calls if caller == fqn]
+        s = self._strings.strings
+        return [s[b] for b in self.callees_by_caller.get(fqn, ())]
 
     def who_calls(self, fqn: str) -> List[str]:
+        # Any edge whose callee equals fqn also shares its short name
         target_short = fqn.split(".")[-1]
-        out: List[str] = []
-        for caller, callee in self.calls:
-            if callee == fqn or callee.split(".")[-1] == target_short:
-                out.append(caller)
-        return out
+        s = self._strings.strings
+        return [s[a] for a in self.refs_by_short.get(target_short, ())[0::2]]
+
+    def search_symbols(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """BM25-ranked (fqn, score) matches of ``query`` against symbol names,
+        qualnames, docstrings and signatures."""
+        from tools.symbol_search import SymbolSearchIndex, symbol_fields
+
+        if self._search_index is None:
+            idx = SymbolSearchIndex()
+            for fqn, sym in self.symbols_by_fqn.items():
+                idx.add(fqn, symbol_fields(sym))
+            self._search_index = idx
+        return self._search_index.search(query, k)
 
     def search_refs(self, pattern: str) -> List[Tuple[str, int, str]]:
         """Ripgrep-based raw reference search (file, line_no, text)."""
@@ -185,14 +466,23 @@ class CodeGraph:
                     continue
             return rows
         except Exception:
-            # Fallback: simple Python regex over indexed .py files
+            # Fallback: Python regex over the indexed .py files that the trigram
+            # index cannot rule out
             rows: List[Tuple[str, int, str]] = []
             try:
                 rx = re.compile(pattern)
             except Exception:
                 # If pattern is not a valid regex, escape it
-                rx = re.compile(re.escape(pattern))
+                pattern = re.escape(pattern)
+                rx = re.compile(pattern)
+            cands = None
+            try:
+                cands = self._trigram_index().candidates(pattern)
+            except Exception:
+                pass
             for fpath in self.indexed_files:
+                if cands is not None and fpath not in cands:
+                    continue
                 rel = os.path.relpath(fpath, self.root)
                 try:
                     with open(fpath, "r", encoding="utf-8", errors="ignore") as rf:
@@ -203,21 +493,64 @@ class CodeGraph:
                     continue
             return rows
 
+    def _trigram_index(self) -> Any:
+        """Trigram index synced to the current file hashes; only files whose
+        content changed since it was last saved are re-read."""
+        from tools.trigram_index import TrigramIndex
+
+        path = os.path.join(self.root, _CACHE_DIR, _CACHE_TRIGRAMS)
+        if self._trigrams is None:
+            self._trigrams = TrigramIndex.load(path)
+        idx = self._trigrams
+        idx.sync(self._file_state()[1])
+        if idx.dirty and os.path.isdir(self.root):
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                idx.save(path)
+            except Exception:
+                pass
+        return idx
+
     # --- Helpers --- #
 
     def module_for_file(self, path: str) -> Optional[str]:
-        p = path
-        if not os.path.isabs(p):
-            p = os.path.abspath(os.path.join(self.root, path))
-        for mod, mi in self.modules.items():
-            if os.path.abspath(mi.file) == p:
-                return mod
-        return None
+        """Module indexed from ``path`` (absolute, or relative to the root).
+        Paths through symlinks resolve when they lead back under the root."""
+        p = path if os.path.isabs(path) else os.path.join(self.root, path)
+        index = self._path_index()
+        mod = index.get(_path_key(p))
+        if mod is None:
+            # e.g. a real path for a symlinked root, or a path via a symlink
+            real = os.path.realpath(p)
+            if self._real_root is None:
+                self._real_root = os.path.realpath(self.root)
+            rel = os.path.relpath(real, self._real_root)
+            if rel != os.pardir and not rel.startswith(os.pardir + os.sep):
+                mod = index.get(_path_key(os.path.join(self.root, rel)))
+        return mod
 
     def file_for_module(self, module: str) -> Optional[str]:
         mi = self.modules.get(module)
         return mi.file if mi else None
 
+    def _path_index(self) -> Dict[str, str]:
+        if self._module_by_path is None:
+            self._module_by_path = {
+                _path_key(mi.file): m for m, mi in self.modules.items() if mi.file
+            }
+        return self._module_by_path
+
+    def _index_path(self, module: str, path: str) -> None:
+        if self._module_by_path is not None and path:
+            self._module_by_path[_path_key(path)] = module
+
+    def _unindex_path(self, module: str) -> None:
+        mi = self.modules.get(module)
+        if self._module_by_path is not None and mi and mi.file:
+            key = _path_key(mi.file)
+            if self._module_by_path.get(key) == module:
+                del self._module_by_path[key]
+
     def tests_for_module(self, module: str) -> List[str]:
         base = module.split(".")[0]
         out = set(self.module_to_tests.get(base, []))
@@ -232,12 +565,287 @@ class CodeGraph:
     def refs_of(self, fqn: str) -> List[Tuple[str, str]]:
         """Return (caller_fqn, callee_match) entries that reference fqn or its short name."""
         target_short = fqn.split(".")[-1]
-        out: List[Tuple[str, str]] = []
-        for caller, callee in self.calls:
-            if callee == fqn or callee.split(".")[-1] == target_short:
-                out.append((caller, callee))
+        s = self._strings.strings
+        return [(s[a], s[b]) for a, b in pairs(self.refs_by_short.get(target_short, ()))]
+
+    def impacted(self, modules: Iterable[str], depth: Optional[int] = None) -> List[str]:
+        """``modules`` plus the modules importing them, transitively (or up to
+        ``depth`` hops). Dotted names below a module (``pkg.mod.func``) count
+        as that module."""
+        seeds = [self._resolve_module(m) or m for m in modules]
+        return self._impact_index().impacted(seeds, depth)
+
+    # --- Traversal --- #
+
+    def neighborhood(
+        self,
+        seeds: Iterable[str],
+        hops: int = 1,
+        edge_kinds: Optional[Iterable[str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[str, int]]:
+        """(node, hop) pairs within ``hops`` edges of ``seeds``, breadth first,
+        seeds first at hop 0, at most ``limit`` of them.
+
+        ``edge_kinds`` picks from ``EDGE_KINDS`` (default all): ``calls``
+        (callees and callers), ``imports`` (imported and importing modules),
+        ``defs`` (enclosing and nested symbols) and ``tests`` (the test modules
+        of a module or symbol, as in ``tests_for_module``).
+        """
+        out: List[Tuple[str, int]] = []
+        if limit is not None and limit <= 0:
+            return out
+        for item in self.iter_neighborhood(seeds, hops, edge_kinds):
+            out.append(item)
+            if limit is not None and len(out) >= limit:
+                break
         return out
 
+    def iter_neighborhood(
+        self,
+        seeds: Iterable[str],
+        hops: int = 1,
+        edge_kinds: Optional[Iterable[str]] = None,
+    ) -> Iterator[Tuple[str, int]]:
+        """Lazy ``neighborhood``: each node's edges are expanded only when the
+        consumer reaches it."""
+        kinds = EDGE_KINDS if edge_kinds is None else tuple(edge_kinds)
+        unknown = set(kinds) - set(EDGE_KINDS)
+        if unknown:
+            raise ValueError(f"unknown edge kinds: {sorted(unknown)}")
+        seen = set()
+        frontier: List[str] = []
+        for s in seeds:
+            if s not in seen:
+                seen.add(s)
+                frontier.append(s)
+                yield s, 0
+        for hop in range(1, max(0, hops) + 1):
+            nxt: List[str] = []
+            for node in frontier:
+                for n in self._neighbors(node, kinds):
+                    if n not in seen:
+                        seen.add(n)
+                        nxt.append(n)
+                        yield n, hop
+            if not nxt:
+                return
+            frontier = nxt
+
+    def _neighbors(self, node: str, kinds: Tuple[str, ...]) -> Iterator[str]:
+        s = self._strings.strings
+        is_module = node in self.modules
+        for kind in kinds:
+            if kind == "calls":
+                # Unresolved callees (builtins, dynamic attributes) are not nodes
+                syms = self.symbols_by_fqn
+                for i in self.callees_by_caller.get(node, ()):
+                    if s[i] in syms:
+                        yield s[i]
+                for i in self.callers_by_callee.get(node, ()):
+                    yield s[i]
+            elif kind == "imports" and is_module:
+                idx = self._impact_index()
+                yield from sorted(idx.deps.get(node, ()))
+                yield from idx.importers(node)
+            elif kind == "defs":
+                sym = self.symbols_by_fqn.get(node)
+                if sym is not None and not is_module:
+                    parent = node.rpartition(".")[0]
+                    yield parent if parent in self.symbols_by_fqn else sym.module
+                yield from self._children_index().get(node, ())
+            elif kind == "tests" and node in self.symbols_by_fqn:
+                if is_module:
+                    yield from self.tests_for_module(node)
+                else:
+                    yield from self.tests_for_symbol(node)
+
+    def _children_index(self) -> Dict[str, List[str]]:
+        if self._def_children is None:
+            children: Dict[str, List[str]] = {}
+            syms = self.symbols_by_fqn
+            for mod, mi in self.modules.items():
+                for fqn in mi.defs:
+                    if fqn == mod:
+                        continue
+                    parent = fqn.rpartition(".")[0]
+                    if parent not in syms:
+                        parent = mod
+                    children.setdefault(parent, []).append(fqn)
+            self._def_children = children
+        return self._def_children
+
+    # --- Centrality --- #
+
+    def centrality(self, fqn: str) -> float:
+        """Importance of a symbol or module (see ``tools.centrality``); 0.0
+        when unknown."""
+        return self._centrality_scores().get(fqn, 0.0)
+
+    def rank(self, fqns: Iterable[str], limit: Optional[int] = None) -> List[str]:
+        """``fqns`` ordered by decreasing centrality (ties keep input order),
+        cut to ``limit`` items."""
+        sc = self._centrality_scores()
+        items = list(dict.fromkeys(fqns))
+        items.sort(key=lambda f: -sc.get(f, 0.0))
+        return items if limit is None else items[:limit]
+
+    def _centrality_scores(self) -> Dict[str, float]:
+        if self._centrality is None:
+            from tools.centrality import scores, signature
+
+            nodes, edges, test_refs = self._centrality_graph()
+            sig = signature(nodes, edges, test_refs)
+            if sig != self._centrality_last[0]:
+                combined, self._pagerank_prev = scores(
+                    nodes, edges, test_refs, start=self._pagerank_prev
+                )
+                self._centrality_last = (sig, combined)
+            self._centrality = self._centrality_last[1]
+        return self._centrality
+
+    def _centrality_graph(self) -> Tuple[List[str], List[Tuple[int, int]], Dict[str, int]]:
+        syms = self.symbols_by_fqn
+        nodes = list(syms)
+        idx = {f: i for i, f in enumerate(nodes)}
+        s = self._strings.strings
+        edges: List[Tuple[int, int]] = []
+        test_refs: Dict[str, int] = {}
+        for mod, raw in self.calls_by_module.items():
+            mi = self.modules.get(mod)
+            seen: set[str] = set()
+            for a, b in pairs(raw):
+                ia, ib = idx.get(s[a]), idx.get(s[b])
+                if ia is not None and ib is not None:
+                    edges.append((ia, ib))
+                    seen.add(s[b])
+            if mi and mi.is_test:
+                for f in seen:
+                    test_refs[f] = test_refs.get(f, 0) + 1
+        for mod, mi in self.modules.items():
+            src = idx.get(mod)
+            if src is None:
+                continue
+            targets = {t for t in self._module_deps(mod) if t in idx}
+            targets.update(t for t in mi.imports.values() if t in idx)
+            for t in targets:
+                edges.append((src, idx[t]))
+            if mi.is_test:
+                for t in targets:
+                    tmi = self.modules.get(t)
+                    if not (tmi and tmi.is_test):
+                        test_refs[t] = test_refs.get(t, 0) + 1
+        return nodes, edges, test_refs
+
+    # --- Impact index --- #
+
+    def _resolve_module(self, target: str) -> Optional[str]:
+        """Longest indexed module that is ``target`` or a prefix of it."""
+        t = target
+        while t:
+            if t in self.modules:
+                return t
+            t = t.rpartition(".")[0]
+        return None
+
+    def _import_targets(self, module: str) -> List[str]:
+        """Dotted names ``module`` imports, as written (before resolution)."""
+        targets = list(self.module_imports.get(module, []))
+        targets.extend(self.module_star_imports.get(module, []))
+        mi = self.modules.get(module)
+        if mi:
+            targets.extend(mi.imports.values())
+        return targets
+
+    def _module_deps(self, module: str) -> set[str]:
+        deps = {self._resolve_module(t) for t in self._import_targets(module)}
+        deps.discard(None)
+        deps.discard(module)
+        return deps  # type: ignore[return-value]
+
+    def _impact_index(self) -> Any:
+        if self._impact is None:
+            from tools.impact_index import ImpactIndex
+
+            idx = ImpactIndex()
+            for m in self.modules:
+                idx.set_deps(m, self._module_deps(m))
+                idx.set_names(m, self._import_targets(m))
+            self._impact = idx
+        return self._impact
+
+    # --- Call index --- #
+
+    def _add_call(self, module: str, caller: str, callee: str) -> None:
+        sid = self._strings.id
+        a, b = sid(caller), sid(callee)
+        compact.append(self.calls_by_module, module, a, b)
+        self._index_call(a, b)
+
+    def _index_call(self, a: int, b: int) -> None:
+        s = self._strings.strings
+        compact.append(self.callees_by_caller, s[a], b)
+        compact.append(self.callers_by_callee, s[b], a)
+        compact.append(self.refs_by_short, sys.intern(s[b].split(".")[-1]), a, b)
+
+    def _unindex_call(self, a: int, b: int) -> None:
+        """Remove one occurrence of an edge from the adjacency maps."""
+        s = self._strings.strings
+        compact.remove_one(self.callees_by_caller, s[a], b)
+        compact.remove_one(self.callers_by_callee, s[b], a)
+        compact.remove_pair(self.refs_by_short, s[b].split(".")[-1], a, b)
+
+    def _compact_strings(self, growth: float = 0.0) -> bool:
+        """Rebuild ``_strings`` from the ids still referenced and remap every id
+        array, so strings of removed edges do not pile up.
+
+        Skipped (returning False) unless the strings added and edge ids purged
+        since the table was last loaded or compacted exceed ``growth`` (a
+        fraction) of its size then.
+        """
+        churn = len(self._strings) - self._strings_base + self._strings_purged
+        if churn <= self._strings_base * growth:
+            return False
+        old = self._strings.strings
+        table = StringTable()
+        remap, sid = compact.remap, table.id
+        self.calls_by_module = {
+            m: remap(v, old, table) for m, v in self.calls_by_module.items()
+        }
+        self.raw_callees = {
+            m: {k: sid(old[v]) for k, v in raw.items()}
+            for m, raw in self.raw_callees.items()
+        }
+        for index in (self.callees_by_caller, self.callers_by_callee, self.refs_by_short):
+            for k, v in index.items():
+                index[k] = remap(v, old, table)
+        self._strings = table
+        self._strings_base, self._strings_purged = len(table), 0
+        return True
+
+    def _unindex_callers(self, callers: set[int]) -> None:
+        """Drop every indexed edge whose caller id is in ``callers``.
+
+        Each affected adjacency array is filtered once, so the cost is bounded by
+        the edges touching the dropped callers rather than by ``len(calls)``.
+        """
+        s = self._strings.strings
+        callees: set[int] = set()
+        for c in callers:
+            callees.update(self.callees_by_caller.pop(s[c], ()))
+        for b in callees:
+            compact.filter_ids(self.callers_by_callee, s[b], callers)
+        for short in {s[b].split(".")[-1] for b in callees}:
+            compact.filter_pairs(self.refs_by_short, short, callers)
+
+    def _rebuild_call_index(self) -> None:
+        self.callees_by_caller = {}
+        self.callers_by_callee = {}
+        self.refs_by_short = {}
+        for edges in self.calls_by_module.values():
+            for a, b in pairs(edges):
+                self._index_call(a, b)
+
     def export_json(self) -> Dict[str, Any]:
         return {
             "root": self.root,
@@ -247,89 +855,55 @@ class CodeGraph:
             "calls": self.calls,
             "module_to_tests": self.module_to_tests,
             "coverage_files": {
-                os.path.relpath(k, self.root): sorted(list(v))
+                os.path.relpath(k, self.root): list(v)
                 for k, v in self.coverage_files.items()
             },
             "symbol_coverage": self.symbol_coverage,
             "module_imports": self.module_imports,
         }
 
-    def export_sqlite(self, db_path: str) -> None:
-        import sqlite3
-
-        conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-        cur.executescript(
-            """
-            PRAGMA journal_mode=WAL;
-            CREATE TABLE IF NOT EXISTS files(path TEXT PRIMARY KEY);
-            CREATE TABLE IF NOT EXISTS modules(module TEXT PRIMARY KEY, file TEXT, is_test INT);
-            CREATE TABLE IF NOT EXISTS symbols(
-              fqn TEXT PRIMARY KEY, name TEXT, qualname TEXT, kind TEXT, module TEXT,
-              file TEXT, line INT, end_line INT, doc TEXT, signature TEXT, returns TEXT
-            );
-            CREATE TABLE IF NOT EXISTS calls(caller TEXT, callee TEXT);
-            CREATE TABLE IF NOT EXISTS tests_map(module TEXT, test_module TEXT);
-            CREATE TABLE IF NOT EXISTS coverage(file TEXT, line INT);
-            CREATE TABLE IF NOT EXISTS mod_deps(module TEXT, dep TEXT);
-            """
-        )
-        cur.executemany(
-            "INSERT OR IGNORE INTO files(path) VALUES(?)",
-            [(os.path.relpath(f, self.root),) for f in self.indexed_files],
-        )
-        cur.executemany(
-            "INSERT OR REPLACE INTO modules(module,file,is_test) VALUES(?,?,?)",
-            [
-                (m, os.path.relpath(mi.file, self.root), 1 if mi.is_test else 0)
-                for m, mi in self.modules.items()
-            ],
-        )
-        cur.executemany(
-            "INSERT OR REPLACE INTO symbols VALUES(?,?,?,?,?,?,?,?,?,?,?)",
-            [
-                (
-                    s.fqn,
-                    s.name,
-                    s.qualname,
-                    s.kind,
-                    s.module,
-                    os.path.relpath(s.file, self.root),
-                    int(s.line),
-                    int(s.end_line),
-                    s.doc or "",
-                    s.signature or "",
-                    s.returns or "",
-                )
-                for s in self.symbols_by_fqn.values()
-            ],
-        )
-        if self.calls:
-            cur.executemany(
-                "INSERT INTO calls(caller,callee) VALUES(?,?)", list(self.calls)
-            )
-        rows = []
-        for mod, tests in self.module_to_tests.items():
-            for t in tests:
-                rows.append((mod, t))
-        if rows:
-            cur.executemany(
-                "INSERT INTO tests_map(module,test_module) VALUES(?,?)", rows
-            )
-        cov_rows = []
-        for f, lines in self.coverage_files.items():
-            rel = os.path.relpath(f, self.root)
-            cov_rows.extend([(rel, int(n)) for n in lines])
-        if cov_rows:
-            cur.executemany("INSERT INTO coverage(file,line) VALUES(?,?)", cov_rows)
-        dep_rows = []
-        for m, deps in self.module_imports.items():
-            for d in deps:
-                dep_rows.append((m, d))
-        if dep_rows:
-            cur.executemany("INSERT INTO mod_deps(module,dep) VALUES(?,?)", dep_rows)
-        conn.commit()
-        conn.close()
+    def write_json(self, fp: Any) -> None:
+        """Stream ``export_json``'s document to a text file object."""
+        from tools.code_graph_export import write_json
+
+        write_json(self, fp)
+
+    def export_ndjson(self, path: str) -> int:
+        """Write one JSON record per line (file, module, symbol, call, ...);
+        see ``tools.code_graph_export``. Returns the number of records."""
+        from tools.code_graph_export import write_ndjson
+
+        with open(path, "w", encoding="utf-8") as wf:
+            return write_ndjson(self, wf)
+
+    def export_sqlite(
+        self, db_path: str, modules: Optional[Iterable[str]] = None
+    ) -> None:
+        """Write the graph to an indexed SQLite database.
+
+        With ``modules``, only those modules' rows are replaced (see
+        ``tools.code_graph_sqlite.write_graph``); query it with
+        ``SqliteCodeGraph``.
+        """
+        from tools.code_graph_sqlite import write_graph
+
+        write_graph(self, db_path, modules)
+
+    def export_csr(self, path: str) -> str:
+        """Write the call, import and containment graphs as CSR ``.npy``
+        arrays (a directory, or one ``.npz``); read them back memory-mapped
+        with ``tools.graph_csr.load_csr``."""
+        from tools.graph_csr import save_csr
+
+        return save_csr(self, path)
+
+    def write_snapshot(self, path: Optional[str] = None) -> str:
+        """Write an immutable snapshot of the read-only query subset (default
+        ``.codegraph/snapshot.bin``). Workers map it with
+        ``tools.graph_snapshot.GraphSnapshot`` and share its pages."""
+        from tools.graph_snapshot import SNAPSHOT_FILE, write_snapshot
+
+        return write_snapshot(self, path or os.path.join(self.root, _CACHE_DIR, SNAPSHOT_FILE))
 
     def _module_name_for_path(self, path: str) -> str:
         rel = os.path.relpath(path, self.root)
@@ -340,29 +914,135 @@ class CodeGraph:
         return ".".join(p for p in parts if p)
 
     def _resolve_callee(
-        self, module: str, callee_key: str, visitor: "_ModuleVisitor"
+        self, module: str, callee_key: str, imports: Dict[str, str], caller: str = ""
     ) -> Optional[str]:
         if "." in callee_key and ":" not in callee_key:
             return callee_key
 
         if ":" in callee_key:
             mod_alias, name = callee_key.split(":", 1)
-            target = visitor.imports.get(mod_alias)
+            target = imports.get(mod_alias)
             if target:
                 return f"{target}.{name}" if not target.endswith(f".{name}") else target
+            return None
+
+        local = self._resolve_local(module, callee_key, caller)
+        if local:
+            return local
+        return imports.get(callee_key)
+
+    def _resolve_local(self, module: str, name: str, scope: str) -> Optional[str]:
+        """Def named ``name`` visible from ``scope`` by Python's scoping rules:
+        enclosing functions innermost first (class bodies are skipped), then
+        the module's top level."""
+        syms = self.symbols_by_fqn
+        while scope and scope != module and scope.startswith(module + "."):
+            s = syms.get(scope)
+            if s is None or s.kind != "class":
+                hit = syms.get(f"{scope}.{name}")
+                if hit is not None and hit.module == module:
+                    return hit.fqn
+            scope = scope.rpartition(".")[0]
+        hit = syms.get(f"{module}.{name}")
+        if hit is not None and hit.module == module:
+            return hit.fqn
+        return None
 
-        mi = self.modules.get(module)
-        if mi:
-            # Prefer any def with same suffix name (matches within class or function)
-            for f in mi.defs:
-                if f.split(".")[-1] == callee_key:
-                    return f
-
-        tgt = visitor.imports.get(callee_key)
-        if tgt:
-            return tgt
+    # --- Class hierarchy --- #
+
+    def _follow_alias(self, fqn: str) -> str:
+        """Chase re-exports (``pkg.Base`` imported into ``pkg/__init__``) to the
+        defining symbol; returns ``fqn`` unchanged when it cannot."""
+        for _ in range(8):
+            if fqn in self.symbols_by_fqn:
+                break
+            mod, _, name = fqn.rpartition(".")
+            mi = self.modules.get(mod)
+            if not mi or name not in mi.imports or mi.imports[name] == fqn:
+                break
+            fqn = mi.imports[name]
+        return fqn
+
+    def _class_bases(self, cls: str) -> List[str]:
+        s = self.symbols_by_fqn.get(cls)
+        if s is None or s.kind != "class":
+            return []
+        mi = self.modules.get(s.module)
+        if not mi:
+            return []
+        qual = cls[len(s.module) + 1 :]
+        out = []
+        for expr in mi.bases.get(qual, ()):
+            head, dot, rest = expr.partition(".")
+            if not dot:
+                tgt = self._resolve_local(s.module, expr, s.qualname and f"{s.module}.{s.qualname}")
+                tgt = tgt or mi.imports.get(expr)
+            elif head in mi.imports:
+                tgt = f"{mi.imports[head]}.{rest}"
+            else:
+                tgt = expr
+            if tgt:
+                out.append(self._follow_alias(tgt))
+        return out
+
+    def mro(self, cls: str) -> List[str]:
+        """Indexed classes in ``cls``'s method resolution order (C3 where the
+        hierarchy is consistent, depth-first left-to-right otherwise)."""
+        return self._mro(cls, set())[0]
+
+    def _mro(self, cls: str, active: set[str]) -> Tuple[List[str], bool]:
+        # (order, whether a base cycle was cut below ``cls``). Orders that cut
+        # a cycle depend on where it was entered, so they are not memoized.
+        memo = self._mro_memo
+        if cls in memo:
+            return memo[cls], False
+        active.add(cls)
+        bases = [b for b in self._class_bases(cls) if b in self.symbols_by_fqn]
+        cut = any(b in active for b in bases)
+        bases = [b for b in bases if b not in active]
+        seqs: List[List[str]] = []
+        for b in bases:
+            order, below = self._mro(b, active)
+            seqs.append(list(order))
+            cut = cut or below
+        active.discard(cls)
+        seqs.append(bases)
+        out = [cls]
+        while True:
+            seqs = [q for q in seqs if q]
+            if not seqs:
+                break
+            for q in seqs:
+                head = q[0]
+                if not any(head in t[1:] for t in seqs):
+                    break  # C3: first head not in the tail of another sequence
+            else:
+                # Inconsistent hierarchy: fall back to depth-first order
+                for q in seqs:
+                    out.extend(c for c in q if c not in out)
+                break
+            out.append(head)
+            for t in seqs:
+                if t[0] == head:
+                    del t[0]
+        if not cut:
+            memo[cls] = out
+        return out, cut
+
+    def resolve_method(self, cls: str, name: str, skip_self: bool = False) -> Optional[str]:
+        """FQN of the ``name`` attribute ``cls`` inherits, following its MRO."""
+        order = self.mro(cls)
+        for c in order[1:] if skip_self else order:
+            if f"{c}.{name}" in self.symbols_by_fqn:
+                return f"{c}.{name}"
         return None
 
+    def _rebuild_test_mapping(self) -> None:
+        # Keys are top-level packages, so any test module change can move rows.
+        # Cleared in place: reading it first loads a lazily cached section.
+        self.module_to_tests.clear()
+        self._build_test_mapping()
+
     def _build_test_mapping(self) -> None:
         for mod, mi in self.modules.items():
             if not mi.is_test:
@@ -372,8 +1052,10 @@ class CodeGraph:
                 m = target.split(".")[0]
                 self.module_to_tests.setdefault(m, []).append(mod)
 
-    def _expand_star_imports(self) -> None:
-        for mod, stars in self.module_star_imports.items():
+    def _expand_star_imports(self, modules: Optional[Iterable[str]] = None) -> None:
+        star = self.module_star_imports
+        for mod in list(star if modules is None else modules):
+            stars = star.get(mod, ())
             mi = self.modules.get(mod)
             if not mi:
                 continue
@@ -399,49 +1081,82 @@ class CodeGraph:
                         continue
                     if name not in mi.imports:
                         mi.imports[name] = f"{star_mod}.{name}"
-
-    def _post_resolve_calls(self) -> None:
-        # After imports expanded, try to resolve unresolved simple names
-        new_calls: List[Tuple[str, str]] = []
-        for caller, callee in self.calls:
-            if "." in callee:
-                new_calls.append((caller, callee))
+                        self._dirty_modules.add(mod)
+
+    def _post_resolve_calls(self, modules: Optional[Iterable[str]] = None) -> None:
+        """Resolve call edges of ``modules`` (default: all) from their parsed keys.
+
+        After imports are expanded, simple names resolve through the module's
+        imports and attribute accesses on classes (``self.x()``, ``super().x()``)
+        through the MRO, now that every base class is indexed. The parsed key
+        of each rewritten edge is kept in ``raw_callees``, so running this again
+        after other modules changed gives what a cold build would.
+        """
+        s = self._strings.strings
+        sid = self._strings.id
+        syms = self.symbols_by_fqn
+        self._mro_memo = {}
+        for mod in list(self.calls_by_module if modules is None else modules):
+            edges = self.calls_by_module.get(mod)
+            if not edges:
                 continue
-            # Find caller module
-            caller_mod = caller.rsplit(".", 1)[0] if "." in caller else caller
-            imports = self.modules.get(
-                caller_mod, ModuleInfo(module=caller_mod, file="")
-            ).imports
-            tgt = imports.get(callee)
-            if tgt:
-                new_calls.append((caller, tgt))
-            else:
-                # leave as-is
-                new_calls.append((caller, callee))
-        self.calls = new_calls
+            raw = self.raw_callees.pop(mod, {})
+            imports = self.modules.get(mod, ModuleInfo(module=mod, file="")).imports
+            for k in range(len(edges) // 2):
+                i = 2 * k + 1
+                rid = raw.get(k, edges[i])
+                callee = s[rid]
+                tgt = None
+                if callee.startswith("super:"):
+                    cls, _, name = callee[6:].rpartition(".")
+                    tgt = self.resolve_method(cls, name, skip_self=True) or callee[6:]
+                elif "." in callee:
+                    cls, _, name = callee.rpartition(".")
+                    s_cls = syms.get(cls)
+                    if callee not in syms and s_cls is not None and s_cls.kind == "class":
+                        tgt = self.resolve_method(cls, name)
+                else:
+                    tgt = imports.get(callee)
+                b = sid(tgt) if tgt else rid
+                if b != rid:
+                    raw[k] = rid
+                else:
+                    raw.pop(k, None)
+                if b != edges[i]:
+                    a = edges[i - 1]
+                    self._unindex_call(a, edges[i])
+                    edges[i] = b
+                    self._index_call(a, b)
+                    self._dirty_modules.add(mod)
+            if raw:
+                self.raw_callees[mod] = raw
+        self._centrality = None
+        self._def_children = None
 
     def unresolved_calls(self) -> List[Tuple[str, str]]:
         return [
             (a, c)
-            for (a, c) in self.calls
+            for (a, c) in self.iter_calls()
             if "." not in c and not self._is_builtin_name(c)
         ]
 
-    def _collect_pytest_nodes(self, tree: ast.AST, rel_path: str) -> List[str]:
+    @staticmethod
+    def _collect_pytest_nodes(tree: ast.AST, rel_path: str) -> List[str]:
         nodes: List[str] = []
         # top-level test_* functions
         for n in getattr(tree, "body", []) or []:
             if isinstance(n, ast.FunctionDef) and n.name.startswith("test_"):
-                nodes.extend(self._expand_parametrize(rel_path, None, n))
+                nodes.extend(CodeGraph._expand_parametrize(rel_path, None, n))
             if isinstance(n, ast.ClassDef) and n.name.startswith("Test"):
                 cls = n.name
                 for m in getattr(n, "body", []) or []:
                     if isinstance(m, ast.FunctionDef) and m.name.startswith("test_"):
-                        nodes.extend(self._expand_parametrize(rel_path, cls, m))
+                        nodes.extend(CodeGraph._expand_parametrize(rel_path, cls, m))
         return nodes
 
+    @staticmethod
     def _expand_parametrize(
-        self, rel_path: str, cls: Optional[str], fn: ast.FunctionDef
+        rel_path: str, cls: Optional[str], fn: ast.FunctionDef
     ) -> List[str]:
         base = f"{rel_path}::" + (f"{cls}::" if cls else "") + fn.name
         # Look for @pytest.mark.parametrize("arg", [vals])
@@ -478,187 +1193,521 @@ class CodeGraph:
 
     def _try_load_cache(self, cache_path: str) -> bool:
         try:
-            if not os.path.exists(cache_path):
+            manifest = _read_manifest(cache_path)
+            if manifest is None:
                 return False
-            data = json.loads(open(cache_path, "r", encoding="utf-8").read())
-            if str(data.get("version", "")) != "3":
-                return False
-            # Verify mtimes and hashes
-            files = data.get("indexed_files", [])
-            mt = data.get("mtimes", {})
-            hh = data.get("hashes", {})
-            for f in files:
-                if not os.path.exists(f):
-                    return False
-                if int(os.path.getmtime(f)) != int(mt.get(f, 0)):
+            # Verify stats, hashing only files whose stat tuple moved
+            files = manifest["files"]
+            st = files.get("stats", {}) or {}
+            hh = files.get("hashes", {}) or {}
+            for f in files.get("indexed_files", []):
+                cur = _stat_key(f)
+                if cur is None:
                     return False
+                if tuple(st.get(f) or ()) == cur:
+                    continue
                 if self._file_hash(f) != str(hh.get(f, "")):
                     return False
-            # Load
-            self.indexed_files = files
-            for s in data.get("symbols", []):
-                sym = Symbol(**s)
-                self._add_symbol(sym)
-            for mod, mi in data.get("modules", {}).items():
-                self.modules[mod] = ModuleInfo(**mi)
-            self.calls = [tuple(x) for x in data.get("calls", [])]
-            self.module_to_tests = data.get("module_to_tests", {})
-            self.module_imports = data.get("module_imports", {})
-            self._cached_mtimes = {k: int(v) for k, v in (mt or {}).items()}
-            self._cached_hashes = {k: str(v) for k, v in (hh or {}).items()}
+            self._install_cache(cache_path, manifest)
             return True
         except Exception:
             return False
 
     def _load_cache_relaxed(self, cache_path: str) -> bool:
         try:
-            if not os.path.exists(cache_path):
-                return False
-            data = json.loads(open(cache_path, "r", encoding="utf-8").read())
-            if str(data.get("version", "")) != "3":
+            manifest = _read_manifest(cache_path)
+            if manifest is None:
                 return False
-            self.indexed_files = data.get("indexed_files", [])
-            for s in data.get("symbols", []):
-                sym = Symbol(**s)
-                self._add_symbol(sym)
-            for mod, mi in data.get("modules", {}).items():
-                self.modules[mod] = ModuleInfo(**mi)
-            self.calls = [tuple(x) for x in data.get("calls", [])]
-            self.module_to_tests = data.get("module_to_tests", {})
-            self.module_imports = data.get("module_imports", {})
-            self._cached_mtimes = {
-                k: int(v) for k, v in (data.get("mtimes", {}) or {}).items()
-            }
-            self._cached_hashes = {
-                k: str(v) for k, v in (data.get("hashes", {}) or {}).items()
-            }
+            self._install_cache(cache_path, manifest)
             return True
         except Exception:
             return False
 
+    def _install_cache(self, cache_dir: str, manifest: Dict[str, Any]) -> None:
+        """Adopt the manifest; leave the pack and shards unread.
+
+        Attributes of every section are removed from the instance so the first
+        access goes through ``__getattr__`` and decodes just what is needed.
+        """
+        files = manifest["files"]
+        self.indexed_files = list(files.get("indexed_files", []))
+        self._file_stats = {
+            k: (int(v[0]), int(v[1]), int(v[2]))
+            for k, v in (files.get("stats", {}) or {}).items()
+        }
+        self._file_hashes = dict(files.get("hashes", {}) or {})
+        self._shards = dict(manifest.get("shards", {}) or {})
+        self._shards_dropped = set(manifest.get("dropped", []) or [])
+        self._has_pack = True
+        self._search_index = None
+        self._impact = None
+        self._centrality = None
+        self._def_children = None
+        self._module_by_path = None
+        for attrs in _CACHE_SECTIONS.values():
+            for attr in attrs:
+                self.__dict__.pop(attr, None)
+        self._cache_dir = cache_dir
+        self._pack_raw: Optional[Dict[str, memoryview]] = None
+        self._lazy_sections = set(_CACHE_SECTIONS)
+        self._overlay_pending = bool(self._shards or self._shards_dropped)
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for missing attributes, i.e. lazily cached sections
+        lazy = self.__dict__.get("_lazy_sections")
+        section = _ATTR_SECTION.get(name)
+        if lazy and section in lazy:
+            self._materialize(section)
+            return self.__dict__[name]
+        raise AttributeError(name)
+
+    def _materialize(self, section: str) -> None:
+        group: Tuple[str, ...] = (section,)
+        if self._overlay_pending and section in _OVERLAY_SECTIONS:
+            # Shards replace whole module records, spanning these sections
+            group = _OVERLAY_SECTIONS
+        raw = self._pack_sections()
+        for sec in group:
+            if sec in self._lazy_sections:
+                self._lazy_sections.discard(sec)
+                self._load_section(sec, raw.get(sec))
+        if group is _OVERLAY_SECTIONS:
+            self._overlay_pending = False
+            self._apply_overlay()
+
+    def _pack_sections(self) -> Dict[str, memoryview]:
+        if self._pack_raw is None:
+            self._pack_raw = (
+                _read_pack(os.path.join(self._cache_dir, _CACHE_PACK)) or {}
+            )
+        return self._pack_raw
+
+    def _load_section(self, section: str, raw: Optional[memoryview]) -> None:
+        try:
+            data = marshal.loads(raw) if raw is not None else None
+        except Exception:
+            data = None
+        if section == "symbols":
+            rows, by_name = data or ([], {})
+            self.symbols_by_fqn = {r[0]: Symbol(*r) for r in rows}
+            self.symbols_by_name = {k: list(v) for k, v in by_name.items()}
+        elif section == "modules":
+            self._module_by_path = None
+            self.modules = {
+                m: ModuleInfo(m, f, bool(t), dict(imp), list(defs), list(exp), dict(b))
+                for m, (f, t, imp, defs, exp, b) in (data or {}).items()
+            }
+            self._module_symbols = {m: set(mi.defs) for m, mi in self.modules.items()}
+        elif section == "calls":
+            strings, by_mod, raw, callees, callers, refs = data or (
+                [], {}, {}, {}, {}, {}
+            )
+            table = StringTable(strings)
+            s = table.strings
+            unpack = compact.unpack
+            self._strings = table
+            self._strings_base, self._strings_purged = len(table), 0
+            self.calls_by_module = {sys.intern(m): unpack(v) for m, v in by_mod.items()}
+            self.raw_callees = {sys.intern(m): dict(v) for m, v in raw.items()}
+            # Adjacency keys are stored as ids so they share the table's strings
+            self.callees_by_caller = {s[k]: unpack(v) for k, v in callees.items()}
+            self.callers_by_callee = {s[k]: unpack(v) for k, v in callers.items()}
+            self.refs_by_short = {sys.intern(k): unpack(v) for k, v in refs.items()}
+        elif section == "imports":
+            imports, stars = data or ({}, {})
+            self.module_imports = {k: list(v) for k, v in imports.items()}
+            self.module_star_imports = {k: list(v) for k, v in stars.items()}
+        elif section == "tests":
+            to_tests, nodes = data or ({}, {})
+            self.module_to_tests = {k: list(v) for k, v in to_tests.items()}
+            self.pytest_nodes_by_module = {k: list(v) for k, v in nodes.items()}
+        elif section == "coverage":
+            files, sym_cov, nodeids, by_line = data or ({}, {}, [], {})
+            self.coverage_files = {k: compact.unpack(raw) for k, raw in files.items()}
+            self.test_nodeids = list(nodeids)
+            self.tests_by_line = {
+                f: {n: compact.unpack(raw) for n, raw in per_line.items()}
+                for f, per_line in by_line.items()
+            }
+            self.symbol_coverage = dict(sym_cov)
+
+    def _apply_overlay(self) -> None:
+        """Replay dropped modules and per-module shards over the base pack."""
+        for m in self._shards_dropped:
+            self._purge_module(m)
+            self.modules.pop(m, None)
+            self.module_imports.pop(m, None)
+            self.module_star_imports.pop(m, None)
+            self.pytest_nodes_by_module.pop(m, None)
+        shard_dir = os.path.join(self._cache_dir, _CACHE_SHARDS)
+        for m, fname in self._shards.items():
+            try:
+                with open(os.path.join(shard_dir, fname), "rb") as rf:
+                    rec = marshal.loads(rf.read())
+            except Exception:
+                continue
+            self._purge_module(m)
+            self._decode_module_record(m, rec)
+        # The packed test map predates the shards
+        self._rebuild_test_mapping()
+
+    def _encode_module_record(self, module: str) -> bytes:
+        mi = self.modules[module]
+        s = self._strings.strings
+        rows = []
+        for fqn in mi.defs:
+            s = self.symbols_by_fqn.get(fqn)
+            if s is not None and s.module == module:
+                rows.append(_symbol_row(s))
+        return marshal.dumps(
+            (
+                mi.file,
+                mi.is_test,
+                mi.imports,
+                mi.exports,
+                rows,
+                self._module_edges(module),
+                self.module_imports.get(module, []),
+                self.module_star_imports.get(module, []),
+                self.pytest_nodes_by_module.get(module),
+                mi.bases,
+                {k: s[v] for k, v in self.raw_callees.get(module, {}).items()},
+            )
+        )
+
+    def _decode_module_record(self, module: str, rec: Tuple[Any, ...]) -> None:
+        file, is_test, imports, exports, rows, edges, deps, stars, nodes, bases, raw = rec
+        self.modules[module] = ModuleInfo(
+            module, file, bool(is_test), dict(imports), [], list(exports), dict(bases)
+        )
+        for row in rows:
+            self._add_symbol(Symbol(*row))
+        for a, b in edges:
+            self._add_call(module, a, b)
+        if raw:
+            self.raw_callees[module] = {k: self._strings.id(v) for k, v in raw.items()}
+        self.module_imports[module] = list(deps)
+        self.module_star_imports[module] = list(stars)
+        if nodes is not None:
+            self.pytest_nodes_by_module[module] = list(nodes)
+        else:
+            self.pytest_nodes_by_module.pop(module, None)
+
     def _detect_changed_files(
-        self, old_mt: Dict[str, int], old_hh: Dict[str, str]
+        self,
+        old_st: Dict[str, Tuple[int, int, int]],
+        old_hh: Dict[str, str],
+        validate: str = "stat",
     ) -> Tuple[List[str], List[str]]:
-        curr_files: List[str] = []
-        for dirpath, _, filenames in os.walk(self.root):
-            for fn in filenames:
-                if fn.endswith(".py"):
-                    curr_files.append(os.path.join(dirpath, fn))
-        curr = set(curr_files)
+        """Return (changed, removed) files relative to the cached state.
+
+        A file whose stat tuple matches the cache is taken as unchanged without
+        being read (unless ``validate="hash"``); otherwise it is hashed and only
+        reported when the content differs. New stats and hashes are recorded so
+        ``_save_cache`` does not have to read files again.
+        """
+        curr = set(self._list_files())
         prev = set(self.indexed_files or [])
         removed = list(prev - curr)
         added = list(curr - prev)
         changed: List[str] = list(added)
         for f in curr & prev:
-            try:
-                mt = int(os.path.getmtime(f))
-                hh = self._file_hash(f)
-            except Exception:
+            st = _stat_key(f)
+            if st is None:
                 changed.append(f)
                 continue
-            if old_mt.get(f) != mt or old_hh.get(f) != hh:
+            if validate != "hash" and old_st.get(f) == st:
+                continue
+            hh = self._file_hash(f)
+            if old_hh.get(f) != hh or not hh:
                 changed.append(f)
+            if old_st.get(f) != st:
+                self._stats_dirty = True
+            self._file_stats[f] = st
+            self._file_hashes[f] = hh
+        for f in removed:
+            self._file_stats.pop(f, None)
+            self._file_hashes.pop(f, None)
         self.indexed_files = sorted(list(curr))
         return sorted(set(changed)), sorted(removed)
 
     def _incremental_reindex(
         self, changed_files: List[str], removed_files: List[str]
-    ) -> None:
+    ) -> set[str]:
+        """Reparse ``changed_files``, drop ``removed_files`` and expand the
+        reindexed modules' star imports; returns the modules whose call edges
+        must be re-resolved."""
+        # Importers are looked up against the dependency index as it was before
+        # this change, so importers of removed modules are reindexed too
+        rev = self._impact_index()
+        # Class hierarchies through the old versions of the touched modules
+        names = {self._module_name_for_path(f) for f in changed_files + removed_files}
+        scope = self._class_scope({m for m in names if m in self.modules})
+        gone = set()
         # purge removed modules
         for f in removed_files:
             m = self._module_name_for_path(f)
             if m in self.modules:
-                to_remove = [
-                    fqn for fqn, s in list(self.symbols_by_fqn.items()) if s.module == m
-                ]
-                for fqn in to_remove:
-                    s = self.symbols_by_fqn.pop(fqn, None)
-                    if s:
-                        self.symbols_by_name[s.name] = [
-                            x for x in self.symbols_by_name.get(s.name, []) if x != fqn
-                        ]
-                self.calls = [
-                    (a, b) for (a, b) in self.calls if not a.startswith(m + ".")
-                ]
+                gone.add(m)
+                self._purge_module(m)
+                self._unindex_path(m)
                 self.modules.pop(m, None)
                 self.module_imports.pop(m, None)
                 self.module_star_imports.pop(m, None)
-        mods = {self._module_name_for_path(f) for f in changed_files}
-        # include dependents via reverse import graph
-        rev = self._reverse_imports()
-        queue = list(mods)
-        seen = set(mods)
-        while queue:
-            m = queue.pop(0)
-            for dep in rev.get(m, []):
-                if dep not in seen:
-                    seen.add(dep)
-                    queue.append(dep)
-        for m in seen:
+                self.pytest_nodes_by_module.pop(m, None)
+                self._dirty_modules.discard(m)
+                self._dropped_modules.add(m)
+        mods = set()
+        added = set()
+        for f in changed_files:
+            m = self._module_name_for_path(f)
+            if m not in self.modules:
+                # newly added file
+                self.modules[m] = ModuleInfo(
+                    module=m, file=f, is_test=self._is_test_path(f)
+                )
+                self._index_path(m, f)
+                added.add(m)
+            mods.add(m)
+        # A summary depends only on its own source, except for names pulled in
+        # from modules it star-imports: reindex those direct importers too.
+        # Importers naming a module that did not exist yet were indexed against
+        # its parent package, so they are found through their raw targets.
+        touched = mods | gone
+        impacted = set(mods)
+        for m in rev.impacted(touched, depth=1):
+            if m in gone or m in impacted:
+                continue
+            if touched.intersection(self.module_star_imports.get(m, ())):
+                impacted.add(m)
+        for m in added:
+            impacted.update(x for x in rev.naming(m) if x in self.modules)
+        renamed = {x for m in added | gone for x in rev.naming(m)} - gone
+        for m in sorted(impacted):
             self._reindex_module(m)
+        # Import targets of the modules naming an added or removed module now
+        # resolve differently
+        for m in gone:
+            rev.remove(m)
+        for m in impacted | renamed:
+            if m in self.modules:
+                rev.set_deps(m, self._module_deps(m))
+                rev.set_names(m, self._import_targets(m))
+        # Star targets read only their own defs, and every module whose star
+        # target changed was reindexed
+        self._expand_star_imports(impacted)
+        # Methods are resolved through the MRO: re-resolve subclasses (at any
+        # depth) of classes in the reindexed modules, before and after the edit
+        return (scope | impacted | self._class_scope(impacted)) - gone
+
+    def _class_scope(self, modules: set[str]) -> set[str]:
+        """``modules`` plus the modules whose calls may resolve through their
+        classes: modules subclassing them, transitively across importers, and
+        direct importers of each of those that defines classes."""
+        rev = self._impact_index()
+        self._mro_memo = {}
+        hier = set(modules)
+        frontier = set(modules)
+        while frontier:
+            nxt = {
+                m
+                for m in rev.impacted(frontier, depth=1)
+                if m not in hier and self._inherits_from(m, hier)
+            }
+            hier |= nxt
+            frontier = nxt
+        with_classes = [m for m in hier if self._has_classes(m)]
+        return hier | set(rev.impacted(with_classes, depth=1))
+
+    def _has_classes(self, module: str) -> bool:
+        syms = self.symbols_by_fqn
+        return any(
+            f in syms and syms[f].kind == "class"
+            for f in self._module_symbols.get(module, ())
+        )
 
-    def _reverse_imports(self) -> Dict[str, List[str]]:
-        rev: Dict[str, List[str]] = {}
-        for m, deps in self.module_imports.items():
-            for d in deps:
-                rev.setdefault(d, []).append(m)
-        return rev
+    def _inherits_from(self, module: str, modules: set[str]) -> bool:
+        """Whether a class in ``module`` has a base imported from ``modules`` or
+        an indexed class of ``modules`` in its MRO."""
+        if self._subclasses_from(module, modules):
+            return True
+        mi = self.modules.get(module)
+        syms = self.symbols_by_fqn
+        for qual in mi.bases if mi else ():
+            for c in self.mro(f"{module}.{qual}")[1:]:
+                if c in syms and syms[c].module in modules:
+                    return True
+        return False
+
+    def _subclasses_from(self, module: str, modules: set) -> bool:
+        """Whether a class in ``module`` has a base imported from ``modules``."""
+        mi = self.modules.get(module)
+        if not mi or not mi.bases:
+            return False
+        for exprs in mi.bases.values():
+            for expr in exprs:
+                head = expr.split(".")[0]
+                tgt = mi.imports.get(head, expr)
+                parts = tgt.split(".")
+                if any(".".join(parts[:k]) in modules for k in range(1, len(parts) + 1)):
+                    return True
+        return False
 
     def _reindex_module(self, module: str) -> None:
         mi = self.modules.get(module)
         if not mi:
             return
         # remove existing symbols and calls for this module
-        to_remove = [
-            fqn for fqn, s in self.symbols_by_fqn.items() if s.module == module
-        ]
-        for fqn in to_remove:
-            s = self.symbols_by_fqn.pop(fqn, None)
-            if s:
-                lst = self.symbols_by_name.get(s.name, [])
-                self.symbols_by_name[s.name] = [x for x in lst if x != fqn]
-        self.calls = [(a, b) for (a, b) in self.calls if not a.startswith(module + ".")]
+        self._purge_module(module)
+        self._dirty_modules.add(module)
         # reset import maps for this module
         self.modules[module].imports = {}
+        self.modules[module].bases = {}
         self.module_imports[module] = []
         self.module_star_imports[module] = []
         # re-parse
-        try:
-            src = open(mi.file, "r", encoding="utf-8").read()
-            tree = ast.parse(src)
-        except Exception:
+        summary = _summarize_task(
+            (
+                mi.file,
+                module,
+                mi.is_test,
+                os.path.relpath(mi.file, self.root),
+            )
+        )
+        if summary is None:
             return
-        visitor = _ModuleVisitor(module, mi.file)
-        visitor.visit(tree)
-        self.modules[module].imports.update(visitor.imports)
-        self.module_imports[module] = sorted(visitor.import_modules)
-        self.module_star_imports[module] = list(getattr(visitor, "star_imports", []))
-        self.modules[module].exports = list(getattr(visitor, "exports", []))
-        for sym in visitor.symbols:
-            self._add_symbol(sym)
-        for caller, callee_key in visitor.calls:
-            callee_fqn = self._resolve_callee(module, callee_key, visitor)
-            self.calls.append((caller, callee_fqn or callee_key))
+        self._apply_summary(summary)
 
     def _save_cache(self, cache_path: str) -> None:
+        """Persist the graph under the ``cache_path`` directory.
+
+        Incremental saves rewrite only the shards of modules that changed plus
+        the manifest. A cold build, or too many accumulated shards, rewrites the
+        base pack instead (compacting the string table) and clears the shards. Every file is replaced
+        atomically via rename, the manifest last.
+        """
+        if not os.path.isdir(self.root):
+            return
         try:
-            mt = {f: int(os.path.getmtime(f)) for f in self.indexed_files}
-            hh = {f: self._file_hash(f) for f in self.indexed_files}
-            data = {
-                "version": "3",
-                "indexed_files": self.indexed_files,
-                "mtimes": mt,
-                "hashes": hh,
-                "symbols": [self._sym_to_dict(s) for s in self.symbols_by_fqn.values()],
-                "modules": {k: self._mi_to_dict(v) for k, v in self.modules.items()},
-                "calls": self.calls,
-                "module_to_tests": self.module_to_tests,
-                "module_imports": self.module_imports,
+            st, hh = self._file_state()
+            shard_dir = os.path.join(cache_path, _CACHE_SHARDS)
+            os.makedirs(shard_dir, exist_ok=True)
+            shards = dict(self._shards)
+            dropped = set(self._shards_dropped)
+            n_shards = len(set(shards) | self._dirty_modules)
+            full = (not self._has_pack) or n_shards > max(
+                _SHARD_COMPACT_MIN, len(self.indexed_files) // 8
+            )
+            if full:
+                sections = {name: self._encode_section(name) for name in _CACHE_SECTIONS}
+                _write_pack(os.path.join(cache_path, _CACHE_PACK), sections)
+                shards, dropped = {}, set()
+            else:
+                for m in self._dropped_modules:
+                    fname = shards.pop(m, None)
+                    if fname:
+                        _remove_quietly(os.path.join(shard_dir, fname))
+                    dropped.add(m)
+                for m in self._dirty_modules:
+                    if m not in self.modules:
+                        continue
+                    fname = _shard_name(m)
+                    _atomic_write(
+                        os.path.join(shard_dir, fname), self._encode_module_record(m)
+                    )
+                    shards[m] = fname
+                    dropped.discard(m)
+            manifest = {
+                "files": {"indexed_files": self.indexed_files, "stats": st, "hashes": hh},
+                "shards": shards,
+                "dropped": sorted(dropped),
             }
-            open(cache_path, "w", encoding="utf-8").write(json.dumps(data))
+            _atomic_write(
+                os.path.join(cache_path, _CACHE_MANIFEST),
+                _CACHE_HEADER.pack(_CACHE_MAGIC, _CACHE_VERSION, marshal.version, 0)
+                + marshal.dumps(manifest),
+            )
+            if full:
+                keep = set(shards.values())
+                for fname in os.listdir(shard_dir):
+                    if fname not in keep:
+                        _remove_quietly(os.path.join(shard_dir, fname))
+            self._has_pack = True
+            self._shards, self._shards_dropped = shards, dropped
+            self._dirty_modules.clear()
+            self._dropped_modules.clear()
+            self._stats_dirty = False
         except Exception:
             pass
 
+    def _encode_section(self, section: str) -> bytes:
+        lazy = self.__dict__.get("_lazy_sections") or set()
+        if section in lazy and not (
+            self._overlay_pending and section in _OVERLAY_SECTIONS
+        ):
+            # Never decoded, hence unchanged: write the packed bytes back as-is
+            raw = self._pack_sections().get(section)
+            if raw is not None:
+                return bytes(raw)
+        if section == "symbols":
+            data: Any = (
+                [_symbol_row(s) for s in self.symbols_by_fqn.values()],
+                self.symbols_by_name,
+            )
+        elif section == "modules":
+            data = {
+                m: (mi.file, mi.is_test, mi.imports, mi.defs, mi.exports, mi.bases)
+                for m, mi in self.modules.items()
+            }
+        elif section == "calls":
+            self._compact_strings()
+            ids = self._strings.ids
+            data = (
+                self._strings.strings,
+                {m: v.tobytes() for m, v in self.calls_by_module.items()},
+                self.raw_callees,
+                {ids[k]: v.tobytes() for k, v in self.callees_by_caller.items()},
+                {ids[k]: v.tobytes() for k, v in self.callers_by_callee.items()},
+                {k: v.tobytes() for k, v in self.refs_by_short.items()},
+            )
+        elif section == "imports":
+            data = (self.module_imports, self.module_star_imports)
+        elif section == "tests":
+            data = (self.module_to_tests, self.pytest_nodes_by_module)
+        else:
+            data = (
+                {k: v.tobytes() for k, v in self.coverage_files.items()},
+                self.symbol_coverage,
+                self.test_nodeids,
+                {
+                    f: {n: ids.tobytes() for n, ids in per_line.items()}
+                    for f, per_line in self.tests_by_line.items()
+                },
+            )
+        return marshal.dumps(data)
+
+    def _file_state(
+        self,
+    ) -> Tuple[Dict[str, Tuple[int, int, int]], Dict[str, str]]:
+        """Stats and hashes for ``indexed_files``, reusing ones already known.
+
+        Only files never seen by detection or indexing (e.g. unparsable ones) are
+        stat'ed and hashed here.
+        """
+        st: Dict[str, Tuple[int, int, int]] = {}
+        hh: Dict[str, str] = {}
+        for f in self.indexed_files:
+            s = self._file_stats.get(f)
+            h = self._file_hashes.get(f)
+            if s is None or h is None:
+                s = _stat_key(f) or (0, 0, 0)
+                h = self._file_hash(f)
+                self._file_stats[f] = s
+                self._file_hashes[f] = h
+            st[f] = s
+            hh[f] = h
+        return st, hh
+
     def _sym_to_dict(self, s: Symbol) -> Dict[str, Any]:
         return {
             "fqn": s.fqn,
@@ -738,79 +1787,76 @@ class CodeGraph:
 
     # --- Coverage --- #
 
-    def attach_coverage_from_xml(self, xml_path: str) -> None:
+    def attach_coverage(self, path: str, paths: Optional[Dict[str, str]] = None) -> None:
+        """Attach line coverage from a coverage.py XML report or ``.coverage``
+        data file, streamed into per-file sorted hit arrays. Per-symbol coverage
+        is the fraction of a symbol's line span that was hit. Data files with
+        per-test contexts also feed the index behind ``tests_covering``.
+        ``paths`` maps recorded path prefixes to local ones, for coverage
+        measured elsewhere (e.g. ``{"/work": checkout}`` for a container)."""
+        from tools.coverage_data import (
+            index_data_rows,
+            is_data_file,
+            iter_data_rows,
+            iter_xml_hits,
+            merge_hits,
+            span_hits,
+        )
+
         try:
-            import xml.etree.ElementTree as ET
-
-            tree = ET.parse(xml_path)
-            root = tree.getroot()
-            files_hits: Dict[str, set[int]] = {}
-            # coverage.py XML: <class filename="path"> ... <lines><line number="N" hits="H"/></lines>
-            for cls in root.findall(".//class"):
-                fn = cls.attrib.get("filename", "")
-                if not fn:
-                    continue
-                # Normalize to absolute path
-                f_abs = (
-                    fn
-                    if os.path.isabs(fn)
-                    else os.path.abspath(os.path.join(self.root, fn))
+            if is_data_file(path):
+                files_hits, self.test_nodeids, self.tests_by_line = index_data_rows(
+                    iter_data_rows(path, self.root, paths)
                 )
-                hits = files_hits.setdefault(f_abs, set())
-                for ln in cls.findall(".//line"):
-                    try:
-                        num = int(ln.attrib.get("number", "0"))
-                        h = int(ln.attrib.get("hits", "0"))
-                        if h > 0:
-                            hits.add(num)
-                    except Exception:
-                        continue
-            # Some coverage.xml variants place <file> nodes
-            if not files_hits:
-                for fnode in root.findall(".//file"):
-                    fn = fnode.attrib.get("filename", "")
-                    if not fn:
-                        continue
-                    f_abs = (
-                        fn
-                        if os.path.isabs(fn)
-                        else os.path.abspath(os.path.join(self.root, fn))
-                    )
-                    hits = files_hits.setdefault(f_abs, set())
-                    for ln in fnode.findall(".//line"):
-                        try:
-                            num = int(ln.attrib.get("number", "0"))
-                            h = int(ln.attrib.get("hits", "0"))
-                            if h > 0:
-                                hits.add(num)
-                        except Exception:
-                            continue
+            else:
+                files_hits = merge_hits(iter_xml_hits(path, self.root, paths))
+                self.test_nodeids, self.tests_by_line = [], {}
             self.coverage_files = files_hits
-            # Compute per-symbol coverage
             sym_cov: Dict[str, float] = {}
+            empty = array("I")
+            by_file: Dict[str, "array[int]"] = {}
             for fqn, sym in self.symbols_by_fqn.items():
-                covered = files_hits.get(sym.file, set())
                 a = int(sym.line)
                 b = int(sym.end_line) if int(sym.end_line) >= a else a
-                span = list(range(a, b + 1))
-                if not span:
-                    sym_cov[fqn] = 0.0
-                    continue
-                hits = sum(1 for x in span if x in covered)
-                sym_cov[fqn] = hits / float(len(span))
+                hits_arr = by_file.get(sym.file)
+                if hits_arr is None:
+                    # Reports use absolute paths; symbols keep the walk's form
+                    hits_arr = files_hits.get(os.path.abspath(sym.file), empty)
+                    by_file[sym.file] = hits_arr
+                hits = span_hits(hits_arr, a, b)
+                sym_cov[fqn] = hits / float(b - a + 1)
             self.symbol_coverage = sym_cov
         except Exception:
             # Leave coverage empty on error
             self.coverage_files = {}
             self.symbol_coverage = {}
+            self.test_nodeids, self.tests_by_line = [], {}
+
+    def attach_coverage_from_xml(self, xml_path: str) -> None:
+        self.attach_coverage(xml_path)
+
+    def tests_covering(self, file: str, lines: Iterable[int]) -> List[str]:
+        """pytest node ids whose recorded coverage context executed any of
+        ``lines`` in ``file`` (needs a data file from ``--cov-context=test``)."""
+        p = file if os.path.isabs(file) else os.path.join(self.root, file)
+        per_line = self.tests_by_line.get(os.path.abspath(p))
+        if not per_line:
+            return []
+        ids: set[int] = set()
+        for n in lines:
+            ids.update(per_line.get(int(n), ()))
+        return sorted(self.test_nodeids[i] for i in ids)
 
     def coverage_of(self, fqn: str) -> Optional[float]:
         return self.symbol_coverage.get(fqn)
 
 
+def _path_key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
 def _cli() -> None:
     import argparse
-    import json
 
     p = argparse.ArgumentParser()
     p.add_argument("root", nargs="?", default="./repo")
@@ -821,95 +1867,557 @@ def _cli() -> None:
     p.add_argument("--who-calls", dest="who_calls", default=None)
     p.add_argument("--dump", dest="dump", action="store_true")
     p.add_argument("--coverage-xml", dest="coverage_xml", default=None)
+    p.add_argument(
+        "--coverage", dest="coverage", default=None, help="coverage XML or .coverage file"
+    )
     p.add_argument("--coverage-of", dest="coverage_of", default=None)
     p.add_argument("--refs-of", dest="refs_of", default=None)
     p.add_argument("--tests-for", dest="tests_for", default=None)
     p.add_argument("--tests-for-module", dest="tests_for_module", default=None)
     p.add_argument("--export", dest="export", default=None)
+    p.add_argument(
+        "--export-ndjson",
+        dest="export_ndjson",
+        default=None,
+        help="one JSON record per line (file/module/symbol/call/...); - for stdout",
+    )
     p.add_argument("--no-cache", dest="no_cache", action="store_true")
     p.add_argument("--export-sqlite", dest="export_sqlite", default=None)
+    p.add_argument(
+        "--write-snapshot",
+        dest="write_snapshot",
+        nargs="?",
+        const=True,
+        default=None,
+        help="write the mmap snapshot (default .codegraph/snapshot.bin)",
+    )
+    p.add_argument(
+        "--export-csr",
+        dest="export_csr",
+        default=None,
+        help="CSR arrays as .npy files in a directory, or one .npz",
+    )
     p.add_argument("--pytest-nodes", dest="pytest_nodes", default=None)
     p.add_argument("--module-deps", dest="module_deps", default=None)
     p.add_argument("--unresolved", dest="unresolved", action="store_true")
+    p.add_argument("--jobs", dest="jobs", type=int, default=1)
+    p.add_argument(
+        "--exclude",
+        dest="exclude",
+        action="append",
+        default=None,
+        help="gitignore-style pattern to skip (repeatable)",
+    )
+    p.add_argument(
+        "--validate", dest="validate", choices=["stat", "hash"], default="stat"
+    )
+    p.add_argument("--sqlite", dest="sqlite", default=None)
+    p.add_argument("--module-for-file", dest="module_for_file", default=None)
+    p.add_argument("--search-symbols", dest="search_symbols", default=None)
+    p.add_argument("-k", dest="k", type=int, default=10)
+    p.add_argument(
+        "--neighborhood",
+        dest="neighborhood",
+        default=None,
+        help="comma-separated seed FQNs/modules; see --hops, --edges, --limit",
+    )
+    p.add_argument("--hops", dest="hops", type=int, default=1)
+    p.add_argument(
+        "--edges",
+        dest="edges",
+        default=None,
+        help=f"comma-separated subset of {','.join(EDGE_KINDS)} (default all)",
+    )
+    p.add_argument("--limit", dest="limit", type=int, default=None)
+    p.add_argument(
+        "--batch",
+        dest="batch",
+        nargs="?",
+        const="-",
+        default=None,
+        help="answer NDJSON queries from FILE (default stdin), one JSON line each",
+    )
     args = p.parse_args()
-    g = CodeGraph.load_or_build(args.root, ignore_cache=bool(args.no_cache))
-    if args.coverage_xml:
-        g.attach_coverage_from_xml(args.coverage_xml)
-        # fall through to other queries if provided
-    if args.owners_of:
-        print(json.dumps(g.owners_of(args.owners_of)))
-        return
-    if args.search:
-        print(json.dumps(g.search_refs(args.search)))
-        return
-    if args.defs_in:
-        print(json.dumps(g.defs_in(args.defs_in)))
-        return
-    if args.calls_of:
-        print(json.dumps(g.calls_of(args.calls_of)))
-        return
-    if args.who_calls:
-        print(json.dumps(g.who_calls(args.who_calls)))
+    if args.sqlite and _cli_sqlite_only(args):
         return
-    if args.coverage_of:
-        print(json.dumps(g.coverage_of(args.coverage_of)))
-        return
-    if args.refs_of:
-        print(json.dumps(g.refs_of(args.refs_of)))
-        return
-    if args.tests_for:
-        print(json.dumps(g.tests_for_symbol(args.tests_for)))
-        return
-    if args.tests_for_module:
-        print(json.dumps(g.tests_for_module(args.tests_for_module)))
-        return
-    if args.export:
-        obj = g.export_json()
-        if args.export == "-":
-            print(json.dumps(obj))
+    g = CodeGraph.load_or_build(
+        args.root,
+        ignore_cache=bool(args.no_cache),
+        jobs=int(args.jobs),
+        validate=args.validate,
+        sqlite_path=args.sqlite,
+        # Coverage and file exports need the graph's data in this process
+        daemon=not (
+            args.coverage_xml or args.coverage or any(getattr(args, w) for w in _CLI_WRITERS)
+        ),
+        excludes=args.exclude,
+    )
+    # With --sqlite, symbol/call/test queries are answered by the database
+    q: Any = g
+    if args.sqlite:
+        from tools.code_graph_sqlite import SqliteCodeGraph
+
+        q = SqliteCodeGraph(args.sqlite)
+    if args.coverage_xml or args.coverage:
+        g.attach_coverage(args.coverage or args.coverage_xml)
+        # fall through to other queries if provided
+    if args.batch:
+        if args.batch == "-":
+            _run_batch(g, q, sys.stdin, sys.stdout, args.k)
         else:
-            open(args.export, "w", encoding="utf-8").write(json.dumps(obj))
-            print(args.export)
-        return
-    if args.export_sqlite:
-        g.export_sqlite(args.export_sqlite)
-        print(args.export_sqlite)
-        return
-    if args.pytest_nodes:
-        mod = args.pytest_nodes
-        print(json.dumps(g.pytest_nodes_by_module.get(mod, [])))
-        return
-    if args.module_deps:
-        print(json.dumps(g.module_imports.get(args.module_deps, [])))
+            with open(args.batch, "r", encoding="utf-8") as rf:
+                _run_batch(g, q, rf, sys.stdout, args.k)
         return
-    if args.unresolved:
-        print(json.dumps(g.unresolved_calls()))
-        return
-    if args.dump:
-        print(
-            json.dumps(
-                {
-                    "files": len(g.indexed_files),
-                    "symbols": len(g.symbols_by_fqn),
-                    "modules": len(g.modules),
-                    "calls": len(g.calls),
-                    "coverage_files": len(g.coverage_files),
-                }
-            )
-        )
+    if args.neighborhood:
+        args.neighborhood = {
+            "seeds": args.neighborhood,
+            "hops": args.hops,
+            "edges": args.edges,
+            "limit": args.limit,
+        }
+    for op in _CLI_QUERIES:
+        arg = None if op in _CLI_SETUP else getattr(args, op)
+        if not arg:
+            continue
+        if op == "export" and arg == "-":
+            # Stream straight to stdout rather than building one huge string
+            g.write_json(sys.stdout)
+            sys.stdout.write("\n")
+        elif op == "export_ndjson" and arg == "-":
+            from tools.code_graph_export import write_ndjson
+
+            write_ndjson(g, sys.stdout)
+        elif op in _CLI_WRITERS:
+            print(_answer(g, q, op, arg, args.k))
+        else:
+            print(json.dumps(_answer(g, q, op, arg, args.k)))
         return
     # Dump summary
-    print(json.dumps({"files": len(g.indexed_files), "symbols": len(g.symbols_by_fqn)}))
+    stats = g.stats()
+    print(json.dumps({"files": stats["files"], "symbols": stats["symbols"]}))
+
+
+# --- CLI queries --- #
+#
+# Each entry answers one CLI flag (named by its argparse dest) given the loaded
+# graph ``g``, the query backend ``q`` (``g`` or the SQLite reader) and the
+# flag's argument; single-query runs try them in this order.
+_CLI_QUERIES: Dict[str, Any] = {
+    "owners_of": lambda g, q, a, k: q.owners_of(a),
+    "search": lambda g, q, a, k: g.search_refs(a),
+    "search_symbols": lambda g, q, a, k: q.search_symbols(a, k),
+    "defs_in": lambda g, q, a, k: q.defs_in(a),
+    "calls_of": lambda g, q, a, k: q.calls_of(a),
+    "who_calls": lambda g, q, a, k: q.who_calls(a),
+    "coverage_of": lambda g, q, a, k: g.coverage_of(a),
+    "refs_of": lambda g, q, a, k: q.refs_of(a),
+    "tests_for": lambda g, q, a, k: q.tests_for_symbol(a),
+    "tests_for_module": lambda g, q, a, k: q.tests_for_module(a),
+    "module_for_file": lambda g, q, a, k: q.module_for_file(a),
+    "neighborhood": lambda g, q, a, k: _cli_neighborhood(g, a),
+    "export": lambda g, q, a, k: _cli_export(g, a),
+    "export_ndjson": lambda g, q, a, k: _cli_export_ndjson(g, a),
+    "export_sqlite": lambda g, q, a, k: _cli_export_sqlite(g, a),
+    "export_csr": lambda g, q, a, k: g.export_csr(a),
+    "write_snapshot": lambda g, q, a, k: g.write_snapshot(a if isinstance(a, str) else None),
+    "pytest_nodes": lambda g, q, a, k: g.pytest_nodes_by_module.get(a, []),
+    "module_deps": lambda g, q, a, k: g.module_imports.get(a, []),
+    "unresolved": lambda g, q, a, k: g.unresolved_calls(),
+    "dump": lambda g, q, a, k: g.stats(),
+    # Batch only: attach coverage mid-session
+    "coverage": lambda g, q, a, k: _cli_attach_coverage(g, a),
+}
+_CLI_QUERIES["coverage_xml"] = _CLI_QUERIES["coverage"]
+# Flags whose query attaches data rather than answering; skipped in single-query runs
+_CLI_SETUP = ("coverage", "coverage_xml")
+# Flags that write a file; single-query runs print the path unquoted
+_CLI_WRITERS = ("export", "export_ndjson", "export_sqlite", "export_csr", "write_snapshot")
+# Flags the SQLite reader answers alone; with a current database they run
+# without loading the graph
+_CLI_SQLITE = (
+    "owners_of",
+    "search_symbols",
+    "defs_in",
+    "calls_of",
+    "who_calls",
+    "refs_of",
+    "tests_for",
+    "tests_for_module",
+    "module_for_file",
+)
+
+
+def _cli_sqlite_only(args: Any) -> bool:
+    """Answer a single ``--sqlite`` query straight from the database when it
+    still matches the tree; returns False when the graph is needed."""
+    if args.no_cache or args.batch or args.coverage_xml or args.coverage:
+        return False
+    op = next(
+        (o for o in _CLI_QUERIES if o not in _CLI_SETUP and getattr(args, o)), None
+    )
+    if op not in _CLI_SQLITE:
+        return False
+    from tools.code_graph_sqlite import SqliteCodeGraph, is_current
+
+    if not is_current(args.sqlite, args.root, args.exclude):
+        return False
+    with SqliteCodeGraph(args.sqlite) as q:
+        print(json.dumps(_CLI_QUERIES[op](None, q, getattr(args, op), args.k)))
+    return True
+
+
+def _split(value: Any) -> Optional[List[str]]:
+    if value is None or isinstance(value, list):
+        return value
+    return [v.strip() for v in str(value).split(",") if v.strip()]
+
+
+def _cli_neighborhood(g: "CodeGraph", arg: Any) -> Any:
+    # "seed,seed" or {"seeds": [...] | "seed,seed", "hops": n, "edges": [...], "limit": n}
+    spec = arg if isinstance(arg, dict) else {"seeds": arg}
+    limit = spec.get("limit")
+    return g.neighborhood(
+        _split(spec.get("seeds")) or [],
+        int(spec.get("hops", 1)),
+        _split(spec.get("edges")),
+        None if limit is None else int(limit),
+    )
+
+
+def _cli_export(g: "CodeGraph", path: str) -> Any:
+    if path == "-":
+        return g.export_json()
+    with open(path, "w", encoding="utf-8") as wf:
+        g.write_json(wf)
+    return path
+
+
+def _cli_export_ndjson(g: "CodeGraph", path: str) -> Any:
+    if path == "-":
+        from tools.code_graph_export import iter_records
+
+        return list(iter_records(g))
+    g.export_ndjson(path)
+    return path
+
+
+def _cli_export_sqlite(g: "CodeGraph", path: str) -> str:
+    g.export_sqlite(path)
+    return path
+
+
+def _cli_attach_coverage(g: "CodeGraph", path: str) -> Dict[str, int]:
+    g.attach_coverage(path)
+    return {"coverage_files": len(g.coverage_files)}
+
+
+def _answer(g: "CodeGraph", q: Any, op: str, arg: Any, k: int = 10) -> Any:
+    return _CLI_QUERIES[op](g, q, arg, k)
+
+
+def _run_batch(g: "CodeGraph", q: Any, lines: Iterable[str], out: Any, k: int = 10) -> int:
+    """Answer newline-delimited JSON queries against one loaded graph.
+
+    Each line is an object naming one query by its flag's dest, e.g.
+    ``{"who_calls": "pkg.mod.func"}``, ``{"search_symbols": "parse", "k": 5}``
+    or ``{"dump": true}`` (``{"op": ..., "arg": ...}`` also works). One line
+    is written per query: ``{"result": ...}`` or ``{"error": "..."}``, echoing
+    ``"id"`` when given. Returns the number of queries answered.
+    """
+    n = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        reply: Dict[str, Any] = {}
+        try:
+            req = json.loads(line)
+            if not isinstance(req, dict):
+                raise ValueError("query must be a JSON object")
+            if "id" in req:
+                reply["id"] = req["id"]
+            if "op" in req:
+                op, arg = req["op"], req.get("arg", True)
+            else:
+                ops = [key for key in req if key in _CLI_QUERIES]
+                if len(ops) != 1:
+                    raise ValueError(f"expected exactly one query key, got {sorted(req)}")
+                op, arg = ops[0], req[ops[0]]
+            if op not in _CLI_QUERIES:
+                raise ValueError(f"unknown query: {op}")
+            reply["result"] = _answer(g, q, op, arg, int(req.get("k", k)))
+        except Exception as exc:
+            reply["error"] = f"{type(exc).__name__}: {exc}"
+        out.write(json.dumps(reply) + "\n")
+        out.flush()
+        n += 1
+    return n
+
+
+@dataclass
+class _ModuleSummary:
+    """Picklable per-module parse result produced by (pool) workers.
+
+    Symbols are kept as field tuples without the repeated module/file strings:
+    (name, qualname, kind, line, end_line, doc, signature, returns).
+    """
+
+    path: str
+    module: str
+    is_test: bool
+    symbols: List[Tuple[Any, ...]] = field(default_factory=list)
+    calls: List[Tuple[str, str]] = field(default_factory=list)
+    imports: Dict[str, str] = field(default_factory=dict)
+    import_modules: List[str] = field(default_factory=list)
+    star_imports: List[str] = field(default_factory=list)
+    exports: List[str] = field(default_factory=list)
+    class_bases: Dict[str, List[str]] = field(default_factory=dict)
+    pytest_nodes: List[str] = field(default_factory=list)
+    sha1: str = ""
+    stat: Optional[Tuple[int, int, int]] = None
+
+    def iter_symbols(self) -> Iterator[Symbol]:
+        for name, qualname, kind, line, end_line, doc, sig, ret in self.symbols:
+            prefix = f"{qualname}." if qualname else ""
+            yield Symbol(
+                fqn=f"{self.module}.{prefix}{name}",
+                name=name,
+                qualname=qualname,
+                kind=kind,
+                module=self.module,
+                file=self.path,
+                line=line,
+                end_line=end_line,
+                doc=doc,
+                signature=sig,
+                returns=ret,
+            )
+
+
+def _summarize_tree(
+    path: str, module: str, is_test: bool, rel: str, tree: ast.AST
+) -> _ModuleSummary:
+    visitor = _ModuleVisitor(module, path)
+    visitor.visit(tree)
+    return _ModuleSummary(
+        path=path,
+        module=module,
+        is_test=is_test,
+        symbols=[
+            (
+                s.name,
+                s.qualname,
+                s.kind,
+                s.line,
+                s.end_line,
+                s.doc,
+                s.signature,
+                s.returns,
+            )
+            for s in visitor.symbols
+        ],
+        calls=visitor.calls,
+        imports=visitor.imports,
+        import_modules=visitor.import_modules,
+        star_imports=visitor.star_imports,
+        exports=visitor.exports,
+        class_bases=visitor.class_bases,
+        pytest_nodes=CodeGraph._collect_pytest_nodes(tree, rel) if is_test else [],
+    )
+
+
+# --- Binary cache format --- #
+#
+# The cache is a directory:
+#
+#   manifest.bin      header | marshal({files, shards, dropped})
+#   pack.bin          header | toc | marshalled sections
+#   shards/<mod>.bin  marshalled record of one module
+#
+# header = magic | u32 version | u32 marshal version | u32 toc length. The pack's
+# table of contents is a marshalled {section: (offset, length)} mapping with
+# offsets relative to the end of the toc. The manifest (indexed files, stats,
+# hashes) is decoded on load; pack sections are read and decoded on first use.
+# Shards hold modules reindexed since the pack was written and replace the
+# pack's records for those modules; "dropped" lists modules removed since.
+
+_CACHE_DIR = ".codegraph"
+_CACHE_MANIFEST = "manifest.bin"
+_CACHE_PACK = "pack.bin"
+_CACHE_SHARDS = "shards"
+_CACHE_TRIGRAMS = "trigrams.bin"
+_CACHE_MAGIC = b"CGB\x00"
+_CACHE_VERSION = 14
+_CACHE_HEADER = struct.Struct("<4sIII")
+_CACHE_SECTIONS: Dict[str, Tuple[str, ...]] = {
+    "symbols": ("symbols_by_fqn", "symbols_by_name"),
+    "modules": ("modules", "_module_symbols"),
+    "calls": (
+        "_strings",
+        "calls_by_module",
+        "raw_callees",
+        "callees_by_caller",
+        "callers_by_callee",
+        "refs_by_short",
+    ),
+    "imports": ("module_imports", "module_star_imports"),
+    "tests": ("module_to_tests", "pytest_nodes_by_module"),
+    "coverage": ("coverage_files", "symbol_coverage", "test_nodeids", "tests_by_line"),
+}
+_ATTR_SECTION = {a: sec for sec, attrs in _CACHE_SECTIONS.items() for a in attrs}
+# Sections covered by a per-module shard record
+_OVERLAY_SECTIONS = ("symbols", "modules", "calls", "imports", "tests")
+# Rewrite the pack once shards exceed max(this, indexed files / 8)
+_SHARD_COMPACT_MIN = 64
+
+
+def _symbol_row(s: Symbol) -> Tuple[Any, ...]:
+    return (
+        s.fqn,
+        s.name,
+        s.qualname,
+        s.kind,
+        s.module,
+        s.file,
+        s.line,
+        s.end_line,
+        s.doc,
+        s.signature,
+        s.returns,
+    )
+
+
+def _shard_name(module: str) -> str:
+    return f"{module or '__root__'}.bin"
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as wf:
+        wf.write(data)
+    os.replace(tmp, path)
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _write_pack(path: str, sections: Dict[str, bytes]) -> None:
+    toc: Dict[str, Tuple[int, int]] = {}
+    off = 0
+    for name, blob in sections.items():
+        toc[name] = (off, len(blob))
+        off += len(blob)
+    toc_b = marshal.dumps(toc)
+    header = _CACHE_HEADER.pack(
+        _CACHE_MAGIC, _CACHE_VERSION, marshal.version, len(toc_b)
+    )
+    _atomic_write(path, b"".join([header, toc_b, *sections.values()]))
+
+
+def _read_header(buf: bytes) -> Optional[int]:
+    """Return the toc length of a cache file, or None if it is not ours."""
+    if len(buf) < _CACHE_HEADER.size:
+        return None
+    magic, version, mver, toc_len = _CACHE_HEADER.unpack_from(buf)
+    if magic != _CACHE_MAGIC or version != _CACHE_VERSION or mver != marshal.version:
+        return None
+    return int(toc_len)
+
+
+def _read_pack(path: str) -> Optional[Dict[str, memoryview]]:
+    """Return the raw (undecoded) sections of a pack file."""
+    try:
+        with open(path, "rb") as rf:
+            buf = rf.read()
+    except OSError:
+        return None
+    toc_len = _read_header(buf)
+    if toc_len is None:
+        return None
+    view = memoryview(buf)
+    start = _CACHE_HEADER.size + toc_len
+    toc = marshal.loads(view[_CACHE_HEADER.size : start])
+    return {name: view[start + off : start + off + n] for name, (off, n) in toc.items()}
+
+
+def _read_manifest(cache_dir: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(cache_dir, _CACHE_MANIFEST), "rb") as rf:
+            buf = rf.read()
+    except OSError:
+        return None
+    if _read_header(buf) is None:
+        return None
+    manifest = marshal.loads(buf[_CACHE_HEADER.size :])
+    if "files" not in manifest:
+        return None
+    if not os.path.exists(os.path.join(cache_dir, _CACHE_PACK)):
+        return None
+    return manifest
+
+
+def _stat_key(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (int(st.st_size), int(st.st_mtime_ns), int(st.st_ino))
+
+
+def _summarize_task(task: Tuple[str, str, bool, str]) -> Optional[_ModuleSummary]:
+    """Worker entry point: read, parse and visit one file.
+
+    The file is read once; its stat tuple (taken before the read) and SHA-1 ride
+    along in the summary for cache validation.
+    """
+    import hashlib
+
+    path, module, is_test, rel = task
+    try:
+        st = _stat_key(path)
+        with open(path, "rb") as rf:
+            raw = rf.read()
+        tree = ast.parse(raw.decode("utf-8"))
+    except Exception:
+        return None
+    summary = _summarize_tree(path, module, is_test, rel, tree)
+    summary.sha1 = hashlib.sha1(raw).hexdigest()
+    summary.stat = st
+    return summary
+
+
+def _dotted_name(node: ast.AST) -> Optional[str]:
+    parts: List[str] = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
 
 
 class _ModuleVisitor(ast.NodeVisitor):
+    """Single pass over a module: every node is visited once.
+
+    Defs at any depth (including functions and classes nested in functions)
+    become symbols, and each ``ast.Call`` is attributed to its innermost
+    enclosing function, so indexing stays linear in the size of the tree.
+    """
+
     def __init__(self, module: str, path: str) -> None:
         self.module = module
         self.path = path
         self.symbols: List[Symbol] = []
         self.calls: List[Tuple[str, str]] = []  # (caller_fqn, callee_key)
         self.stack: List[str] = []  # qualname stack
-        self.class_stack: List[str] = []
+        self.class_stack: List[str] = []  # qualnames of enclosing classes
+        self.class_bases: Dict[str, List[str]] = {}
+        self.func_stack: List[str] = []  # FQNs of enclosing functions
         self.imports: Dict[str, str] = {}
         self.import_modules: List[str] = []
         self.star_imports: List[str] = []
@@ -929,7 +2437,7 @@ class _ModuleVisitor(ast.NodeVisitor):
         for alias in node.names:
             asname = alias.asname or alias.name.split(".")[-1]
             self.imports[asname] = alias.name
-            self.import_modules.append(alias.name.split(".")[0])
+            self.import_modules.append(alias.name)
         self.generic_visit(node)
 
     def visit_ImportFrom(self, node: ast.ImportFrom) -> Any:  # type: ignore[override]
@@ -954,7 +2462,7 @@ class _ModuleVisitor(ast.NodeVisitor):
             asname = alias.asname or alias.name
             self.imports[asname] = f"{mod}.{alias.name}" if mod else alias.name
         if mod:
-            self.import_modules.append(mod.split(".")[0])
+            self.import_modules.append(mod)
         self.generic_visit(node)
 
     def visit_ClassDef(self, node: ast.ClassDef) -> Any:  # type: ignore[override]
@@ -976,7 +2484,11 @@ class _ModuleVisitor(ast.NodeVisitor):
         )
         self.symbols.append(sym)
         self.stack.append(node.name)
-        self.class_stack.append(node.name)
+        qual = self._cur_qualname()
+        self.class_stack.append(qual)
+        self.class_bases[qual] = [
+            b for b in (_dotted_name(x) for x in node.bases) if b and b != "object"
+        ]
         self.generic_visit(node)
         self.class_stack.pop()
         self.stack.pop()
@@ -1021,20 +2533,30 @@ class _ModuleVisitor(ast.NodeVisitor):
         )
         self.symbols.append(sym)
         self.stack.append(node.name)
-        # Traverse body to collect calls
-        for sub in ast.walk(node):
-            if isinstance(sub, ast.Call):
-                callee_key = self._extract_callee_key(sub.func)
-                if callee_key:
-                    self.calls.append((fqn, callee_key))
+        self.func_stack.append(fqn)
+        # Calls in the signature, decorators and body (nested defs excepted) are
+        # collected by visit_Call as the traversal reaches them
+        self.generic_visit(node)
         # Decorators as calls
         for dec in getattr(node, "decorator_list", []) or []:
             callee_key = self._extract_callee_key(dec)
             if callee_key:
                 self.calls.append((fqn, callee_key))
+        self.func_stack.pop()
         self.stack.pop()
 
+    def visit_Call(self, node: ast.Call) -> Any:  # type: ignore[override]
+        if self.func_stack:
+            callee_key = self._extract_callee_key(node.func)
+            if callee_key:
+                self.calls.append((self.func_stack[-1], callee_key))
+        self.generic_visit(node)
+
     def visit_Assign(self, node: ast.Assign) -> Any:  # type: ignore[override]
+        if self.func_stack:
+            # Locals are not symbols; only look for calls in the value
+            self.generic_visit(node)
+            return
         for t in getattr(node, "targets", []) or []:
             if isinstance(t, ast.Name):
                 fqn = self._fqn(t.id)
@@ -1080,7 +2602,8 @@ class _ModuleVisitor(ast.NodeVisitor):
             meth = fn.attr
             cur_cls = self._cur_class()
             if cur_cls:
-                return f"{self.module}.{cur_cls}.{meth}"
+                # Resolved against the bases once every module is indexed
+                return f"super:{self.module}.{cur_cls}.{meth}"
             return meth
 
         # obj.attr chain
@@ -0,0 +1,573 @@
+"""Long-lived CodeGraph daemon serving queries over a Unix socket.
+
+The daemon builds (or loads) the graph once, keeps it in memory and watches the
+tree with inotify (polling ``CodeGraph.refresh`` where inotify is unavailable).
+Requests are newline-delimited JSON-RPC 2.0 objects (or batches)::
+
+    {"jsonrpc": "2.0", "id": 1, "method": "who_calls", "params": ["pkg.mod.f"]}
+
+Besides the CodeGraph queries in ``QUERY_METHODS`` it answers ``ping``,
+``refresh``, ``attr`` (plain-data graph attributes, with the graph generation
+so clients can cache them) and ``shutdown``.
+``CodeGraph.load_or_build`` returns a ``RemoteCodeGraph`` bound to the daemon
+whenever one is serving the requested root.
+"""
+
+import hashlib
+import json
+import os
+import select
+import socket
+import socketserver
+import struct
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from tools.code_graph import _CACHE_DIR, CodeGraph
+from tools.file_enum import PRUNE_DIRS
+
+SOCKET_NAME = "daemon.sock"
+
+QUERY_METHODS = (
+    "owners_of",
+    "defs_in",
+    "calls_of",
+    "who_calls",
+    "refs_of",
+    "mro",
+    "rank",
+    "centrality",
+    "neighborhood",
+    "search_symbols",
+    "search_refs",
+    "module_for_file",
+    "file_for_module",
+    "tests_for_module",
+    "tests_for_symbol",
+    "unresolved_calls",
+    "coverage_of",
+    "impacted",
+    "stats",
+    "tests_covering",
+    "attach_coverage",
+)
+# JSON-safe graph attributes a client may fetch whole
+REMOTE_ATTRS = (
+    "indexed_files",
+    "module_imports",
+    "module_star_imports",
+    "module_to_tests",
+    "pytest_nodes_by_module",
+    "symbol_coverage",
+)
+# Directories never watched: our own cache writes would retrigger rebuilds
+_SKIP_DIRS = {_CACHE_DIR} | PRUNE_DIRS
+# Rebuild the graph's string table after a resync once the strings added and
+# edge ids purged since the last rebuild exceed this fraction of its size
+_STRINGS_GROWTH = 0.25
+
+
+class UnknownMethodError(LookupError):
+    """A request named a method or attribute the daemon does not serve."""
+
+
+# JSON-RPC error codes
+_PARSE_ERROR = -32700
+_INVALID_REQUEST = -32600
+_METHOD_NOT_FOUND = -32601
+_INVALID_PARAMS = -32602
+_INTERNAL_ERROR = -32603
+
+
+def socket_path_for(root: str) -> str:
+    """Default socket path for ``root`` (under its cache dir when short enough
+    for AF_UNIX, otherwise in the temp dir keyed by the root's path)."""
+    root = os.path.realpath(root)
+    path = os.path.join(root, _CACHE_DIR, SOCKET_NAME)
+    if len(path.encode()) < 100:
+        return path
+    digest = hashlib.sha1(root.encode()).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"codegraph-{digest}.sock")
+
+
+# --- Watchers --- #
+
+
+class _PollWatcher:
+    """Fallback without change events: the daemon re-runs ``refresh``'s stat
+    walk every interval and on explicit ``refresh`` requests."""
+
+    exact = False
+
+    def __init__(self, root: str, interval: float = 1.0) -> None:
+        self.interval = interval
+
+    def wait(self, timeout: float) -> bool:
+        time.sleep(min(timeout, self.interval))
+        return True
+
+    def drain(self) -> bool:
+        return False
+
+    def close(self) -> None:
+        pass
+
+
+class _InotifyWatcher:
+    """Recursive inotify watch (Linux, via libc) over the tree's directories."""
+
+    _MASK = (
+        0x00000008  # IN_CLOSE_WRITE
+        | 0x00000040  # IN_MOVED_FROM
+        | 0x00000080  # IN_MOVED_TO
+        | 0x00000100  # IN_CREATE
+        | 0x00000200  # IN_DELETE
+        | 0x00000400  # IN_DELETE_SELF
+        | 0x00000800  # IN_MOVE_SELF
+    )
+    _IN_ISDIR = 0x40000000
+    _IN_Q_OVERFLOW = 0x00004000
+    _EVENT = struct.Struct("iIII")
+    exact = True
+
+    def __init__(self, root: str) -> None:
+        import ctypes
+
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.fd = fd
+        self._dirs: Dict[int, str] = {}
+        self._watched: set[str] = set()
+        self.add_tree(root)
+
+    def add_tree(self, top: str) -> None:
+        for dirpath, dirnames, _ in os.walk(top):
+            dirnames[:] = [d for d in dirnames if d not in _SKIP_DIRS]
+            if dirpath in self._watched:
+                continue
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dirpath), self._MASK)
+            if wd < 0:
+                raise OSError("inotify_add_watch failed for " + dirpath)
+            self._dirs[wd] = dirpath
+            self._watched.add(dirpath)
+
+    def wait(self, timeout: float) -> bool:
+        return bool(select.select([self.fd], [], [], timeout)[0])
+
+    def drain(self) -> bool:
+        """Consume queued events; True if any could affect the graph."""
+        relevant = False
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return relevant
+            off = 0
+            while off + self._EVENT.size <= len(buf):
+                wd, mask, _, n = self._EVENT.unpack_from(buf, off)
+                off += self._EVENT.size
+                name = os.fsdecode(buf[off : off + n].rstrip(b"\0"))
+                off += n
+                if mask & self._IN_Q_OVERFLOW:
+                    relevant = True
+                    continue
+                parent = self._dirs.get(wd)
+                if mask & self._IN_ISDIR:
+                    if name in _SKIP_DIRS:
+                        continue
+                    relevant = True
+                    if parent and name and mask & 0x00000180:  # created/moved in
+                        try:
+                            self.add_tree(os.path.join(parent, name))
+                        except OSError:
+                            pass
+                    elif parent and name:
+                        self._watched.discard(os.path.join(parent, name))
+                elif name.endswith(".py") or not name:
+                    relevant = True
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+def _make_watcher(root: str, poll: Optional[float]) -> Any:
+    if poll is None and sys.platform.startswith("linux"):
+        try:
+            return _InotifyWatcher(root)
+        except Exception:
+            pass
+    return _PollWatcher(root, poll or 1.0)
+
+
+# --- Server --- #
+
+
+class CodeGraphDaemon:
+    def __init__(
+        self,
+        root: str,
+        *,
+        socket_path: Optional[str] = None,
+        poll: Optional[float] = None,
+        debounce: float = 0.1,
+        sqlite_path: Optional[str] = None,
+        jobs: int = 1,
+        excludes: Optional[List[str]] = None,
+    ) -> None:
+        self.root = root
+        self.socket_path = socket_path or socket_path_for(root)
+        self.sqlite_path = sqlite_path
+        self.debounce = debounce
+        self.generation = 0
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self.graph = CodeGraph(root=root, excludes=excludes)
+        self.graph.build(jobs=jobs, sqlite_path=sqlite_path)
+        self.watcher = _make_watcher(root, poll)
+        self._server: Optional[socketserver.ThreadingUnixStreamServer] = None
+
+    # Freshness: drain pending watch events synchronously before answering, so
+    # a query issued right after a write sees it. Without exact events only
+    # forced syncs (watch ticks, ``refresh`` requests) walk the tree.
+    def sync(self, force: bool = False) -> int:
+        with self._lock:
+            if self.watcher.drain() or (force and not self.watcher.exact):
+                if self.graph.refresh(sqlite_path=self.sqlite_path):
+                    self.generation += 1
+                    # Release strings of removed edges once they add up
+                    self.graph._compact_strings(_STRINGS_GROWTH)
+            return self.generation
+
+    def _watch_loop(self) -> None:
+        while not self._stop.is_set():
+            if not self.watcher.wait(0.5) or self._stop.is_set():
+                continue
+            time.sleep(self.debounce)  # coalesce bursts of writes
+            try:
+                self.sync(force=True)
+            except Exception:
+                pass
+
+    def dispatch(self, method: str, params: Any) -> Any:
+        if method == "ping":
+            return {
+                "root": os.path.realpath(self.root),
+                "pid": os.getpid(),
+                "generation": self.generation,
+                "watcher": type(self.watcher).__name__,
+            }
+        if method == "refresh":
+            return self.sync(force=True)
+        if method == "shutdown":
+            threading.Thread(target=self.stop, daemon=True).start()
+            return True
+        if method == "attr":
+            # [name] or [name, generation]; the value is omitted when the
+            # client's copy from ``generation`` is still current
+            if isinstance(params, dict):
+                name, known = params.get("name"), params.get("generation")
+            else:
+                name, known = (list(params) + [None, None])[:2]
+            if name not in REMOTE_ATTRS:
+                raise UnknownMethodError(f"attr {name}")
+            with self._lock:
+                gen = self.sync()
+                if known == gen:
+                    return {"generation": gen}
+                return {"generation": gen, "value": getattr(self.graph, name)}
+        if method not in QUERY_METHODS:
+            raise UnknownMethodError(method)
+        with self._lock:
+            self.sync()
+            fn = getattr(self.graph, method)
+            if isinstance(params, dict):
+                return fn(**params)
+            return fn(*(params or []))
+
+    def handle(self, req: Any) -> Optional[Dict[str, Any]]:
+        if not isinstance(req, dict) or not isinstance(req.get("method"), str):
+            return _error(None, _INVALID_REQUEST, "invalid request")
+        rid = req.get("id")
+        try:
+            result = self.dispatch(req["method"], req.get("params", []))
+        except UnknownMethodError as e:
+            return _error(rid, _METHOD_NOT_FOUND, f"unknown method or attr: {e}")
+        except TypeError as e:
+            return _error(rid, _INVALID_PARAMS, str(e))
+        except Exception as e:
+            return _error(rid, _INTERNAL_ERROR, str(e))
+        if "id" not in req:
+            return None  # notification
+        return {"jsonrpc": "2.0", "id": rid, "result": result}
+
+    def serve_forever(self) -> None:
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self) -> None:
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        req = json.loads(line)
+                    except Exception:
+                        resp: Any = _error(None, _PARSE_ERROR, "parse error")
+                    else:
+                        if isinstance(req, list):
+                            resp = [r for r in map(daemon.handle, req) if r is not None]
+                        else:
+                            resp = daemon.handle(req)
+                    if resp is not None and resp != []:
+                        self.wfile.write(json.dumps(resp).encode() + b"\n")
+                        self.wfile.flush()
+
+        os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+        if os.path.exists(self.socket_path):
+            if _client_for(self.socket_path) is not None:
+                raise RuntimeError(f"daemon already running on {self.socket_path}")
+            os.unlink(self.socket_path)
+        self._server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        self._server.daemon_threads = True
+        watch = threading.Thread(target=self._watch_loop, daemon=True)
+        watch.start()
+        try:
+            self._server.serve_forever(poll_interval=0.2)
+        finally:
+            self._stop.set()
+            self._server.server_close()
+            self.watcher.close()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+
+
+def _error(rid: Any, code: int, message: str) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": rid, "error": {"code": code, "message": message}}
+
+
+# --- Client --- #
+
+
+class DaemonError(RuntimeError):
+    pass
+
+
+class DaemonClient:
+    def __init__(self, socket_path: str, timeout: float = 30.0) -> None:
+        self.socket_path = socket_path
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(socket_path)
+        self._rfile = self._sock.makefile("rb")
+        self._ids = 0
+        self._lock = threading.Lock()
+
+    def call(self, method: str, *params: Any) -> Any:
+        with self._lock:
+            self._ids += 1
+            req = {"jsonrpc": "2.0", "id": self._ids, "method": method, "params": list(params)}
+            self._sock.sendall(json.dumps(req).encode() + b"\n")
+            line = self._rfile.readline()
+        if not line:
+            raise DaemonError("daemon closed the connection")
+        resp = json.loads(line)
+        if "error" in resp:
+            raise DaemonError(resp["error"].get("message", "error"))
+        return resp.get("result")
+
+    def close(self) -> None:
+        try:
+            self._rfile.close()
+            self._sock.close()
+        except OSError:
+            pass
+
+
+def _client_for(socket_path: str) -> Optional[DaemonClient]:
+    if not os.path.exists(socket_path):
+        return None
+    try:
+        client = DaemonClient(socket_path, timeout=2.0)
+        client.call("ping")
+        client._sock.settimeout(30.0)
+        return client
+    except Exception:
+        return None
+
+
+def connect(root: str, socket_path: Optional[str] = None) -> Optional[DaemonClient]:
+    """Client for the daemon serving ``root``, or None if none is running."""
+    client = _client_for(socket_path or socket_path_for(root))
+    if client is None:
+        return None
+    try:
+        info = client.call("ping")
+        if info.get("root") == os.path.realpath(root):
+            return client
+    except Exception:
+        pass
+    client.close()
+    return None
+
+
+class RemoteCodeGraph(CodeGraph):
+    """CodeGraph whose queries are answered by a running daemon.
+
+    Plain-data attributes in ``REMOTE_ATTRS`` are fetched over the socket and
+    reused while the daemon's graph generation is unchanged. Other graph
+    internals are not available remotely and raise ``AttributeError``; load
+    with ``daemon=False`` for code that needs them.
+    """
+
+    def __init__(self, root: str, client: DaemonClient) -> None:
+        # attr name -> (generation, value)
+        self.__dict__.update(root=root, _client=client, _attrs={})
+
+    def __getattr__(self, name: str) -> Any:
+        if name not in REMOTE_ATTRS:
+            raise AttributeError(f"{name!r} is not available from the CodeGraph daemon")
+        cached = self._attrs.get(name)
+        reply = self._client.call("attr", name, cached[0] if cached else None)
+        if "value" in reply:
+            cached = self._attrs[name] = (reply["generation"], reply["value"])
+        return cached[1]
+
+    def stats(self) -> Dict[str, int]:
+        return self._client.call("stats")
+
+    def owners_of(self, symbol: str) -> List[str]:
+        return self._client.call("owners_of", symbol)
+
+    def defs_in(self, module: str) -> List[str]:
+        return self._client.call("defs_in", module)
+
+    def calls_of(self, fqn: str) -> List[str]:
+        return self._client.call("calls_of", fqn)
+
+    def who_calls(self, fqn: str) -> List[str]:
+        return self._client.call("who_calls", fqn)
+
+    def refs_of(self, fqn: str) -> List[Tuple[str, str]]:
+        return [tuple(r) for r in self._client.call("refs_of", fqn)]
+
+    def mro(self, cls: str) -> List[str]:
+        return self._client.call("mro", cls)
+
+    def rank(self, fqns: Iterable[str], limit: Optional[int] = None) -> List[str]:
+        return self._client.call("rank", list(fqns), limit)
+
+    def centrality(self, fqn: str) -> float:
+        return self._client.call("centrality", fqn)
+
+    def neighborhood(
+        self,
+        seeds: Iterable[str],
+        hops: int = 1,
+        edge_kinds: Optional[Iterable[str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[str, int]]:
+        kinds = None if edge_kinds is None else list(edge_kinds)
+        rows = self._client.call("neighborhood", list(seeds), hops, kinds, limit)
+        return [tuple(r) for r in rows]
+
+    def search_symbols(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        return [tuple(r) for r in self._client.call("search_symbols", query, k)]
+
+    def search_refs(self, pattern: str) -> List[Tuple[str, int, str]]:
+        return [tuple(r) for r in self._client.call("search_refs", pattern)]
+
+    def module_for_file(self, path: str) -> Optional[str]:
+        if not os.path.isabs(path):
+            path = os.path.abspath(os.path.join(self.root, path))
+        return self._client.call("module_for_file", path)
+
+    def file_for_module(self, module: str) -> Optional[str]:
+        return self._client.call("file_for_module", module)
+
+    def tests_for_module(self, module: str) -> List[str]:
+        return self._client.call("tests_for_module", module)
+
+    def tests_for_symbol(self, fqn: str) -> List[str]:
+        return self._client.call("tests_for_symbol", fqn)
+
+    def unresolved_calls(self) -> List[Tuple[str, str]]:
+        return [tuple(r) for r in self._client.call("unresolved_calls")]
+
+    def coverage_of(self, fqn: str) -> Optional[float]:
+        return self._client.call("coverage_of", fqn)
+
+    def tests_covering(self, file: str, lines: Iterable[int]) -> List[str]:
+        if not os.path.isabs(file):
+            file = os.path.abspath(os.path.join(self.root, file))
+        return self._client.call("tests_covering", file, [int(n) for n in lines])
+
+    def attach_coverage(self, path: str, paths: Optional[Dict[str, str]] = None) -> None:
+        self._client.call("attach_coverage", os.path.abspath(path), paths)
+
+    def impacted(self, modules: Iterable[str], depth: Optional[int] = None) -> List[str]:
+        return self._client.call("impacted", list(modules), depth)
+
+
+def connect_graph(root: str) -> Optional[RemoteCodeGraph]:
+    """RemoteCodeGraph for ``root`` synced to the tree, or None without a daemon."""
+    client = connect(root)
+    if client is None:
+        return None
+    client.call("refresh")
+    return RemoteCodeGraph(root, client)
+
+
+def _cli() -> None:
+    import argparse
+
+    p = argparse.ArgumentParser(description="Serve a CodeGraph over a Unix socket")
+    p.add_argument("root", nargs="?", default="./repo")
+    p.add_argument("--socket", dest="socket", default=None)
+    p.add_argument(
+        "--poll", dest="poll", type=float, default=None, help="poll interval (no inotify)"
+    )
+    p.add_argument("--sqlite", dest="sqlite", default=None)
+    p.add_argument("--jobs", dest="jobs", type=int, default=1)
+    p.add_argument("--exclude", dest="exclude", action="append", default=None)
+    p.add_argument("--status", dest="status", action="store_true")
+    p.add_argument("--stop", dest="stop", action="store_true")
+    args = p.parse_args()
+    if args.status or args.stop:
+        client = connect(args.root, args.socket)
+        if client is None:
+            print(json.dumps({"running": False}))
+            return
+        info = client.call("ping")
+        if args.stop:
+            client.call("shutdown")
+        print(json.dumps({"running": not args.stop, **info}))
+        return
+    d = CodeGraphDaemon(
+        args.root,
+        socket_path=args.socket,
+        poll=args.poll,
+        sqlite_path=args.sqlite,
+        jobs=args.jobs,
+        excludes=args.exclude,
+    )
+    print(json.dumps({"socket": d.socket_path, "watcher": type(d.watcher).__name__}))
+    sys.stdout.flush()
+    d.serve_forever()
+
+
+if __name__ == "__main__":
+    _cli()
@@ -0,0 +1,117 @@
+"""Streaming JSON / NDJSON exports of a CodeGraph.
+
+``write_json`` emits the same document as ``CodeGraph.export_json`` but writes it
+piece by piece, so no full dict or string of the graph is ever built.
+``write_ndjson`` emits one self-describing record per line, keyed by ``type``:
+
+    {"type": "meta", "root": ..., "files": n, "symbols": n, "modules": n}
+    {"type": "file", "path": "pkg/mod.py", "module": "pkg.mod"}
+    {"type": "module", "module": ..., "file": ..., "is_test": ..., "imports": ...,
+     "defs": [...], "exports": [...], "deps": [...]}
+    {"type": "symbol", "fqn": ..., "name": ..., ...}
+    {"type": "call", "module": ..., "caller": ..., "callee": ...}
+    {"type": "tests", "module": ..., "tests": [...]}
+    {"type": "coverage", "file": ..., "lines": [...]}
+    {"type": "symbol_coverage", "fqn": ..., "ratio": ...}
+
+Either way memory beyond the graph itself stays bounded by the largest record.
+"""
+
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+_dumps = json.JSONEncoder().encode
+
+
+def iter_records(graph: Any) -> Iterator[Dict[str, Any]]:
+    root = graph.root
+    yield {
+        "type": "meta",
+        "root": root,
+        "files": len(graph.indexed_files),
+        "symbols": len(graph.symbols_by_fqn),
+        "modules": len(graph.modules),
+    }
+    for f in graph.indexed_files:
+        yield {
+            "type": "file",
+            "path": os.path.relpath(f, root),
+            "module": graph._module_name_for_path(f),
+        }
+    for m, mi in graph.modules.items():
+        rec = graph._mi_to_dict(mi)
+        rec["type"] = "module"
+        rec["deps"] = graph.module_imports.get(m, [])
+        yield rec
+    for s in graph.symbols_by_fqn.values():
+        rec = graph._sym_to_dict(s)
+        rec["type"] = "symbol"
+        yield rec
+    for m in graph.calls_by_module:
+        for a, b in graph.iter_calls(m):
+            yield {"type": "call", "module": m, "caller": a, "callee": b}
+    for m, tests in graph.module_to_tests.items():
+        yield {"type": "tests", "module": m, "tests": tests}
+    for f, lines in graph.coverage_files.items():
+        yield {"type": "coverage", "file": os.path.relpath(f, root), "lines": list(lines)}
+    for fqn, ratio in graph.symbol_coverage.items():
+        yield {"type": "symbol_coverage", "fqn": fqn, "ratio": ratio}
+
+
+def write_ndjson(graph: Any, fp: Any) -> int:
+    n = 0
+    for rec in iter_records(graph):
+        fp.write(_dumps(rec))
+        fp.write("\n")
+        n += 1
+    return n
+
+
+def _write_list(fp: Any, items: Iterable[Any]) -> None:
+    fp.write("[")
+    sep = ""
+    for item in items:
+        fp.write(sep)
+        fp.write(_dumps(item))
+        sep = ", "
+    fp.write("]")
+
+
+def _write_map(fp: Any, pairs: Iterable[Tuple[str, Any]]) -> None:
+    fp.write("{")
+    sep = ""
+    for k, v in pairs:
+        fp.write(sep)
+        fp.write(_dumps(k))
+        fp.write(": ")
+        fp.write(_dumps(v))
+        sep = ", "
+    fp.write("}")
+
+
+def write_json(graph: Any, fp: Any) -> None:
+    """Write ``graph.export_json()``'s document to ``fp`` incrementally."""
+    root = graph.root
+    fp.write('{"root": ')
+    fp.write(_dumps(root))
+    fp.write(', "files": ')
+    _write_list(fp, (os.path.relpath(p, root) for p in graph.indexed_files))
+    fp.write(', "symbols": ')
+    _write_list(fp, (graph._sym_to_dict(s) for s in graph.symbols_by_fqn.values()))
+    fp.write(', "modules": ')
+    _write_map(fp, ((k, graph._mi_to_dict(v)) for k, v in graph.modules.items()))
+    fp.write(', "calls": ')
+    _write_list(fp, graph.iter_calls())
+    fp.write(', "module_to_tests": ')
+    _write_map(fp, graph.module_to_tests.items())
+    fp.write(', "coverage_files": ')
+    _write_map(
+        fp,
+        ((os.path.relpath(k, root), list(v)) for k, v in graph.coverage_files.items()),
+    )
+    fp.write(', "symbol_coverage": ')
+    _write_map(fp, graph.symbol_coverage.items())
+    fp.write(', "module_imports": ')
+    _write_map(fp, graph.module_imports.items())
+    fp.write("}")
@@ -0,0 +1,451 @@
+"""SQLite storage and query backend for CodeGraph.
+
+``write_graph`` mirrors a ``CodeGraph`` into an indexed SQLite database, either in
+full or for a set of modules only (their rows are deleted and re-inserted).
+``SqliteCodeGraph`` answers the common read-only queries straight from that
+database, so callers do not need the whole graph in Python memory;
+``is_current`` tells whether that database still matches the tree and
+``recorded_files`` returns the file digest it was written for.
+"""
+
+import hashlib
+import os
+import sqlite3
+from typing import Any, Iterable, Iterator, List, Optional, Set, Tuple
+
+from tools.code_graph import Symbol, _stat_key
+from tools.file_enum import list_files
+from tools.symbol_search import FIELD_WEIGHTS, search_terms
+
+# Bumped whenever the table layout changes; older databases are recreated
+SCHEMA_VERSION = 3
+
+_TABLES = (
+    "meta",
+    "files",
+    "modules",
+    "symbols",
+    "calls",
+    "tests_map",
+    "coverage",
+    "mod_deps",
+    "symbols_fts",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta(key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS files(path TEXT PRIMARY KEY, module TEXT);
+CREATE TABLE IF NOT EXISTS modules(module TEXT PRIMARY KEY, file TEXT, is_test INT);
+CREATE TABLE IF NOT EXISTS symbols(
+  fqn TEXT PRIMARY KEY, name TEXT, qualname TEXT, kind TEXT, module TEXT,
+  file TEXT, line INT, end_line INT, doc TEXT, signature TEXT, returns TEXT,
+  ord INT
+);
+CREATE TABLE IF NOT EXISTS calls(module TEXT, caller TEXT, callee TEXT, callee_short TEXT);
+CREATE TABLE IF NOT EXISTS tests_map(
+  module TEXT, test_module TEXT, PRIMARY KEY(module, test_module)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage(
+  file TEXT, line INT, PRIMARY KEY(file, line)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS mod_deps(
+  module TEXT, dep TEXT, PRIMARY KEY(module, dep)
+) WITHOUT ROWID;
+"""
+
+# Secondary indexes: dropped before a full load and rebuilt once afterwards,
+# which is much cheaper than maintaining them row by row
+_INDEXES = (
+    ("ix_files_module", "files(module)"),
+    ("ix_modules_file", "modules(file)"),
+    ("ix_symbols_name", "symbols(name)"),
+    ("ix_symbols_module", "symbols(module, ord)"),
+    ("ix_calls_module", "calls(module)"),
+    ("ix_calls_caller", "calls(caller)"),
+    ("ix_calls_callee", "calls(callee)"),
+    ("ix_calls_short", "calls(callee_short)"),
+    ("ix_mod_deps_dep", "mod_deps(dep)"),
+)
+
+# Bulk-load tuning: WAL + synchronous=NORMAL stays consistent on a crash, and a
+# larger page cache / in-memory temp store keep index builds off the disk
+_LOAD_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Full-text index over symbols; rowid follows symbols.rowid. Column text is the
+# identifier-part terms produced by tools.symbol_search.search_terms.
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS symbols_fts USING fts5(
+  name, qualname, doc, signature, tokenize='unicode61'
+);
+"""
+
+_FTS_INSERT = (
+    "INSERT INTO symbols_fts(rowid, name, qualname, doc, signature)"
+    " SELECT rowid, cg_terms(name), cg_terms(qualname), cg_terms(doc),"
+    " cg_terms(signature) FROM symbols"
+)
+
+
+def _create_indexes(conn: sqlite3.Connection) -> None:
+    for name, target in _INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.create_function(
+        "cg_terms", 1, lambda s: " ".join(search_terms(s or "")), deterministic=True
+    )
+    return conn
+
+
+def _has_fts(conn: sqlite3.Connection) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='symbols_fts'"
+    ).fetchone()
+    return row is not None
+
+
+def _prepare(conn: sqlite3.Connection, root: str) -> bool:
+    """Create the schema; return False if existing rows cannot be trusted.
+
+    A database written with another schema version or for another root is
+    wiped so the caller falls back to a full export.
+    """
+    version = int(conn.execute("PRAGMA user_version").fetchone()[0])
+    ok = version == SCHEMA_VERSION
+    if not ok:
+        for t in _TABLES:
+            conn.execute(f"DROP TABLE IF EXISTS {t}")
+    conn.executescript(_SCHEMA)
+    _create_indexes(conn)
+    try:
+        conn.executescript(_FTS_SCHEMA)
+    except sqlite3.OperationalError:
+        pass  # SQLite built without FTS5: search_symbols falls back to names
+    conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    row = conn.execute("SELECT value FROM meta WHERE key='root'").fetchone()
+    if ok and (row is None or row[0] != root):
+        ok = False
+    conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES('root', ?)", (root,))
+    return ok
+
+
+def _files_digest(
+    root: str, stats: Iterable[Tuple[str, Optional[Tuple[int, int, int]]]]
+) -> str:
+    """Digest of (relative path, stat tuple) over the indexed files."""
+    h = hashlib.sha1()
+    for path, st in sorted((os.path.relpath(f, root), s or (0, 0, 0)) for f, s in stats):
+        h.update(f"{path}\0{st[0]}:{st[1]}:{st[2]}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def is_current(db_path: str, root: str, excludes: Optional[List[str]] = None) -> bool:
+    """Whether ``db_path`` was written for exactly the files now under ``root``.
+
+    Compares the file list and stat tuples recorded by ``write_graph`` with the
+    tree, without loading the graph; any difference (or an older database)
+    reads as stale.
+    """
+    root = os.path.abspath(root)
+    recorded = recorded_files(db_path, root)
+    if recorded is None:
+        return False
+    files = list_files(root, excludes)
+    return recorded == _files_digest(root, ((f, _stat_key(f)) for f in files))
+
+
+def recorded_files(db_path: str, root: str) -> Optional[str]:
+    """Digest of the files ``db_path`` was last written for, or None when it is
+    missing, unreadable, of another schema version or for another root."""
+    if not os.path.exists(db_path):
+        return None
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            if int(conn.execute("PRAGMA user_version").fetchone()[0]) != SCHEMA_VERSION:
+                return None
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    if meta.get("root") != os.path.abspath(root):
+        return None
+    return meta.get("files")
+
+
+def write_graph(graph: Any, db_path: str, modules: Optional[Iterable[str]] = None) -> None:
+    """Write ``graph`` into ``db_path``.
+
+    With ``modules`` given, only those modules' rows (files, modules, symbols,
+    calls, mod_deps and the coverage of their files) are deleted and
+    re-inserted; modules no longer in the graph are just deleted. The small
+    ``tests_map`` table is rewritten as a whole, since an edited test module
+    changes rows keyed by the modules it imports. Otherwise every table is
+    refreshed: secondary indexes are dropped, rows are streamed in from
+    generators and the indexes rebuilt at the end. Either way the work happens
+    in one transaction, which also records the files' stat digest for
+    ``is_current``.
+    """
+
+    def rel(p: str) -> str:
+        return os.path.relpath(p, graph.root)
+
+    conn = _connect(db_path)
+    try:
+        for pragma in _LOAD_PRAGMAS:
+            conn.execute(pragma)
+        with conn:
+            full = not _prepare(conn, graph.root) or modules is None
+            fts = _has_fts(conn)
+            if full:
+                for name, _ in _INDEXES:
+                    conn.execute(f"DROP INDEX IF EXISTS {name}")
+                for t in _TABLES[1:]:
+                    if t != "symbols_fts" or fts:
+                        conn.execute(f"DELETE FROM {t}")
+                targets: Set[str] = set(graph.modules)
+            else:
+                targets = set(modules or ())
+                # Coverage rows are keyed by file: drop those of the files the
+                # targets had (a module may have moved) and have now
+                stale = {
+                    row[0]
+                    for m in targets
+                    for row in conn.execute(
+                        "SELECT file FROM modules WHERE module=?", (m,)
+                    )
+                }
+                stale.update(
+                    rel(graph.modules[m].file) for m in targets if m in graph.modules
+                )
+                conn.executemany(
+                    "DELETE FROM coverage WHERE file=?", ((f,) for f in stale)
+                )
+                conn.execute("DELETE FROM tests_map")
+                if fts:
+                    conn.executemany(
+                        "DELETE FROM symbols_fts WHERE rowid IN"
+                        " (SELECT rowid FROM symbols WHERE module=?)",
+                        ((m,) for m in targets),
+                    )
+                conn.executemany(
+                    "DELETE FROM files WHERE module=?", ((m,) for m in targets)
+                )
+                for t in ("modules", "symbols", "calls", "mod_deps"):
+                    conn.executemany(
+                        f"DELETE FROM {t} WHERE module=?", ((m,) for m in targets)
+                    )
+            live = [m for m in targets if m in graph.modules]
+            files = (
+                graph.indexed_files
+                if full
+                else [graph.modules[m].file for m in live]
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO files(path, module) VALUES(?,?)",
+                ((rel(f), graph._module_name_for_path(f)) for f in files),
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO modules(module, file, is_test) VALUES(?,?,?)",
+                (
+                    (m, rel(graph.modules[m].file), 1 if graph.modules[m].is_test else 0)
+                    for m in live
+                ),
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO symbols VALUES(?,?,?,?,?,?,?,?,?,?,?,?)",
+                _symbol_rows(graph, live),
+            )
+            if fts and full:
+                conn.execute(_FTS_INSERT)
+            elif fts:
+                conn.executemany(
+                    _FTS_INSERT + " WHERE module=?", ((m,) for m in live)
+                )
+            conn.executemany(
+                "INSERT INTO calls(module, caller, callee, callee_short) VALUES(?,?,?,?)",
+                (
+                    (m, a, b, b.split(".")[-1])
+                    for m in live
+                    for a, b in graph.iter_calls(m)
+                ),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO mod_deps(module, dep) VALUES(?,?)",
+                ((m, d) for m in live for d in graph.module_imports.get(m, [])),
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO tests_map(module, test_module) VALUES(?,?)",
+                ((m, t) for m, tests in graph.module_to_tests.items() for t in tests),
+            )
+            cov = graph.coverage_files
+            hits = (
+                cov.items()
+                if full
+                else ((f, cov.get(os.path.abspath(f), ())) for f in files)
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO coverage(file, line) VALUES(?,?)",
+                ((rel(f), int(n)) for f, lines in hits for n in lines),
+            )
+            st, _ = graph._file_state()
+            conn.execute(
+                "INSERT OR REPLACE INTO meta(key, value) VALUES('files', ?)",
+                (_files_digest(graph.root, st.items()),),
+            )
+            if full:
+                _create_indexes(conn)
+    finally:
+        conn.close()
+
+
+def _symbol_rows(graph: Any, modules: List[str]) -> Iterator[Tuple[Any, ...]]:
+    for m in modules:
+        for i, fqn in enumerate(graph.modules[m].defs):
+            s = graph.symbols_by_fqn.get(fqn)
+            if s is None or s.module != m:
+                continue
+            yield (
+                s.fqn,
+                s.name,
+                s.qualname,
+                s.kind,
+                s.module,
+                os.path.relpath(s.file, graph.root),
+                int(s.line),
+                int(s.end_line),
+                s.doc or "",
+                s.signature or "",
+                s.returns or "",
+                i,
+            )
+
+
+class SqliteCodeGraph:
+    """Read-only CodeGraph queries served from a database written by
+    ``write_graph``. Results match the in-memory ``CodeGraph`` methods."""
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self.conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        row = self.conn.execute("SELECT value FROM meta WHERE key='root'").fetchone()
+        self.root = str(row[0]) if row else os.path.abspath(".")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "SqliteCodeGraph":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _col(self, sql: str, args: Tuple[Any, ...]) -> List[Any]:
+        return [r[0] for r in self.conn.execute(sql, args)]
+
+    def owners_of(self, symbol: str) -> List[str]:
+        return sorted(set(self._col("SELECT file FROM symbols WHERE name=?", (symbol,))))
+
+    def find_symbol(self, name: str) -> List[Symbol]:
+        rows = self.conn.execute(
+            "SELECT fqn, name, qualname, kind, module, file, line, end_line, doc,"
+            " signature, returns FROM symbols WHERE name=?",
+            (name,),
+        )
+        return [
+            Symbol(
+                fqn=r[0],
+                name=r[1],
+                qualname=r[2],
+                kind=r[3],
+                module=r[4],
+                file=os.path.join(self.root, r[5]),
+                line=int(r[6]),
+                end_line=int(r[7]),
+                doc=r[8] or None,
+                signature=r[9] or None,
+                returns=r[10] or None,
+            )
+            for r in rows
+        ]
+
+    def defs_in(self, module: str) -> List[str]:
+        return self._col(
+            "SELECT fqn FROM symbols WHERE module=? ORDER BY ord", (module,)
+        )
+
+    def calls_of(self, fqn: str) -> List[str]:
+        return self._col(
+            "SELECT callee FROM calls WHERE caller=? ORDER BY rowid", (fqn,)
+        )
+
+    def who_calls(self, fqn: str) -> List[str]:
+        return self._col(
+            "SELECT caller FROM calls WHERE callee_short=? ORDER BY rowid",
+            (fqn.split(".")[-1],),
+        )
+
+    def refs_of(self, fqn: str) -> List[Tuple[str, str]]:
+        rows = self.conn.execute(
+            "SELECT caller, callee FROM calls WHERE callee_short=? ORDER BY rowid",
+            (fqn.split(".")[-1],),
+        )
+        return [(str(a), str(b)) for a, b in rows]
+
+    def tests_for_module(self, module: str) -> List[str]:
+        return self._col(
+            "SELECT DISTINCT test_module FROM tests_map WHERE module IN (?, ?)"
+            " ORDER BY test_module",
+            (module.split(".")[0], module),
+        )
+
+    def tests_for_symbol(self, fqn: str) -> List[str]:
+        mod = fqn.rsplit(".", 1)[0] if "." in fqn else fqn
+        return self.tests_for_module(mod)
+
+    def module_for_file(self, path: str) -> Optional[str]:
+        p = path if os.path.isabs(path) else os.path.join(self.root, path)
+        row = self.conn.execute(
+            "SELECT module FROM modules WHERE file=?",
+            (os.path.relpath(os.path.abspath(p), self.root),),
+        ).fetchone()
+        return str(row[0]) if row else None
+
+    def file_for_module(self, module: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT file FROM modules WHERE module=?", (module,)
+        ).fetchone()
+        return os.path.join(self.root, row[0]) if row else None
+
+    def search_symbols(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """BM25-ranked (fqn, score) symbol matches, best first."""
+        terms = sorted(set(search_terms(query)))
+        if not terms:
+            return []
+        if not _has_fts(self.conn):
+            rows = self.conn.execute(
+                "SELECT fqn FROM symbols WHERE name LIKE ? ORDER BY fqn LIMIT ?",
+                (f"%{terms[0]}%", k),
+            )
+            return [(str(r[0]), 0.0) for r in rows]
+        w = ", ".join(str(x) for x in FIELD_WEIGHTS)
+        rows = self.conn.execute(
+            f"SELECT s.fqn, -bm25(symbols_fts, {w}) AS score FROM symbols_fts"
+            " JOIN symbols s ON s.rowid = symbols_fts.rowid"
+            " WHERE symbols_fts MATCH ? ORDER BY score DESC, s.fqn LIMIT ?",
+            (" OR ".join(f'"{t}"' for t in terms), k),
+        )
+        return [(str(a), float(b)) for a, b in rows]
+
+    def module_deps(self, module: str) -> List[str]:
+        return self._col(
+            "SELECT dep FROM mod_deps WHERE module=? ORDER BY dep", (module,)
+        )
@@ -0,0 +1,113 @@
+"""Compact storage helpers for CodeGraph's call edges.
+
+Edges are kept as ``array("I")`` of ids into a ``StringTable`` instead of lists
+of string tuples: a pair costs 8 bytes instead of a 64-byte tuple plus per-edge
+string objects. Adjacency maps keep their (interned) string keys so lookups by
+FQN stay plain dict hits. The table only grows; its owner rebuilds it from the
+live ids with ``remap`` to drop strings no edge refers to any more.
+"""
+
+import sys
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class StringTable:
+    """Append-only interned string table with dense integer ids."""
+
+    __slots__ = ("strings", "ids")
+
+    def __init__(self, strings: Optional[List[str]] = None) -> None:
+        self.strings: List[str] = []
+        self.ids: Dict[str, int] = {}
+        for s in strings or ():
+            self.id(s)
+
+    def id(self, s: str) -> int:
+        i = self.ids.get(s)
+        if i is None:
+            s = sys.intern(s)
+            i = self.ids[s] = len(self.strings)
+            self.strings.append(s)
+        return i
+
+    def __getitem__(self, i: int) -> str:
+        return self.strings[i]
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+
+def pairs(edges: "array[int]") -> Iterator[Tuple[int, int]]:
+    """(a, b) pairs of an interleaved edge array."""
+    it = iter(edges)
+    return zip(it, it)
+
+
+def append(index: Dict[str, "array[int]"], key: str, *ids: int) -> None:
+    arr = index.get(key)
+    if arr is None:
+        arr = index[key] = array("I")
+    arr.extend(ids)
+
+
+def remove_one(index: Dict[str, "array[int]"], key: str, value: int) -> None:
+    arr = index.get(key)
+    if arr is None:
+        return
+    try:
+        arr.remove(value)
+    except ValueError:
+        return
+    if not arr:
+        del index[key]
+
+
+def remove_pair(index: Dict[str, "array[int]"], key: str, a: int, b: int) -> None:
+    arr = index.get(key)
+    if arr is None:
+        return
+    for i in range(0, len(arr) - 1, 2):
+        if arr[i] == a and arr[i + 1] == b:
+            del arr[i : i + 2]
+            break
+    if not arr:
+        del index[key]
+
+
+def filter_ids(index: Dict[str, "array[int]"], key: str, drop: set) -> None:
+    arr = index.get(key)
+    if arr is None:
+        return
+    kept = array("I", (x for x in arr if x not in drop))
+    if kept:
+        index[key] = kept
+    else:
+        del index[key]
+
+
+def filter_pairs(index: Dict[str, "array[int]"], key: str, drop_first: set) -> None:
+    arr = index.get(key)
+    if arr is None:
+        return
+    kept = array("I")
+    for a, b in pairs(arr):
+        if a not in drop_first:
+            kept.append(a)
+            kept.append(b)
+    if kept:
+        index[key] = kept
+    else:
+        del index[key]
+
+
+def remap(edges: "array[int]", old: List[str], table: StringTable) -> "array[int]":
+    """``edges`` with each id into ``old`` replaced by its string's id in ``table``."""
+    sid = table.id
+    return array("I", [sid(old[x]) for x in edges])
+
+
+def unpack(raw: bytes) -> "array[int]":
+    out = array("I")
+    out.frombytes(raw)
+    return out
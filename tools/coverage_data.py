@@ -0,0 +1,211 @@
+"""Streaming readers for coverage.py results.
+
+Two sources are understood:
+
+- the Cobertura-style XML report (``coverage xml`` / ``--cov-report=xml``),
+  read element by element with ``iterparse`` so memory stays bounded;
+- coverage.py's own ``.coverage`` SQLite data file (schema 5+), read directly
+  without the XML detour. Both line (``line_bits``) and branch (``arc``)
+  measurements are supported.
+
+Readers yield ``(absolute_path, lines)`` per measured file, with recorded path
+prefixes rewritten through an optional ``paths`` map (like coverage.py's
+``[paths]`` setting, e.g. a container's mount point to the local checkout);
+``merge_hits`` folds
+them into compact per-file sorted ``array("I")`` hit arrays, on which
+``span_hits`` counts covered lines in a span with two bisects. Data files
+recorded with per-test contexts (``pytest --cov-context=test``) also yield the
+test node id behind each measurement (``iter_data_rows``); ``index_data_rows``
+folds those rows into hit arrays and the line -> tests index in one pass.
+"""
+
+import os
+import sqlite3
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def numbits_to_lines(numbits: bytes) -> List[int]:
+    """Decode coverage.py's numbits blob (bit ``n`` set -> line ``n`` ran)."""
+    out: List[int] = []
+    for i, byte in enumerate(numbits):
+        if not byte:
+            continue
+        base = i * 8
+        for bit in range(8):
+            if byte & (1 << bit):
+                out.append(base + bit)
+    return out
+
+
+def _resolve(
+    fn: str, sources: List[str], root: str, paths: Optional[Dict[str, str]] = None
+) -> str:
+    for recorded, local in (paths or {}).items():
+        recorded = recorded.rstrip("/")
+        if fn == recorded or fn.startswith(recorded + "/"):
+            return os.path.abspath(local + fn[len(recorded) :])
+    if os.path.isabs(fn):
+        return fn
+    for src in sources:
+        cand = os.path.join(src, fn)
+        if os.path.exists(cand):
+            return os.path.abspath(cand)
+    return os.path.abspath(os.path.join(root, fn))
+
+
+def iter_xml_hits(
+    xml_path: str, root: str, paths: Optional[Dict[str, str]] = None
+) -> Iterator[Tuple[str, List[int]]]:
+    """Hit lines per ``<class>`` (or ``<file>``) element of a coverage XML."""
+    import xml.etree.ElementTree as ET
+
+    sources: List[str] = []
+    current: List[int] = []
+    for event, elem in ET.iterparse(xml_path, events=("start", "end")):
+        if event == "start":
+            if elem.tag in ("class", "file"):
+                current = []
+            continue
+        tag = elem.tag
+        if tag == "source":
+            if elem.text and elem.text.strip():
+                sources.append(elem.text.strip())
+        elif tag == "line":
+            try:
+                if int(elem.attrib.get("hits", "0")) > 0:
+                    current.append(int(elem.attrib.get("number", "0")))
+            except ValueError:
+                pass
+        elif tag in ("class", "file"):
+            fn = elem.attrib.get("filename", "")
+            if fn:
+                yield _resolve(fn, sources, root, paths), current
+            current = []
+            # Drop the parsed subtree so memory does not grow with the report
+            elem.clear()
+
+
+def _connect_data(data_path: str) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{data_path}?mode=ro", uri=True)
+
+
+def test_nodeid(context: str) -> Optional[str]:
+    """pytest node id of a pytest-cov test context (``path::test|run``)."""
+    if not context:
+        return None
+    base, sep, phase = context.rpartition("|")
+    if sep and phase in ("setup", "run", "teardown"):
+        return base or None
+    return context
+
+
+def iter_data_rows(
+    data_path: str, root: str, paths: Optional[Dict[str, str]] = None
+) -> Iterator[Tuple[str, str, List[int]]]:
+    """(file, context, executed lines) rows of a coverage.py ``.coverage``
+    database; the context is "" unless dynamic contexts were recorded."""
+    conn = _connect_data(data_path)
+    try:
+        files = {
+            fid: _resolve(p, [], root, paths)
+            for fid, p in conn.execute("SELECT id, path FROM file")
+        }
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master")}
+        contexts: Dict[int, str] = {}
+        if "context" in tables:
+            contexts = dict(conn.execute("SELECT id, context FROM context"))
+        if "line_bits" in tables:
+            cur = conn.execute("SELECT file_id, context_id, numbits FROM line_bits")
+            for fid, cid, numbits in cur:
+                if fid in files:
+                    yield files[fid], contexts.get(cid, ""), numbits_to_lines(numbits)
+        if "arc" in tables:
+            # Branch measurement: both ends of a positive arc are executed lines
+            cur = conn.execute(
+                "SELECT file_id, context_id, fromno, tono FROM arc"
+                " ORDER BY file_id, context_id"
+            )
+            last, acc = None, []  # type: ignore[var-annotated]
+            for fid, cid, a, b in cur:
+                if (fid, cid) != last:
+                    if last is not None and last[0] in files and acc:
+                        yield files[last[0]], contexts.get(last[1], ""), acc
+                    last, acc = (fid, cid), []
+                if a > 0:
+                    acc.append(a)
+                if b > 0:
+                    acc.append(b)
+            if last is not None and last[0] in files and acc:
+                yield files[last[0]], contexts.get(last[1], ""), acc
+    finally:
+        conn.close()
+
+
+def iter_data_hits(
+    data_path: str, root: str, paths: Optional[Dict[str, str]] = None
+) -> Iterator[Tuple[str, List[int]]]:
+    """Executed lines per file, over all measurement contexts."""
+    for f, _, lines in iter_data_rows(data_path, root, paths):
+        yield f, lines
+
+
+def is_data_file(path: str) -> bool:
+    """True for a coverage.py SQLite data file, False for an XML report."""
+    with open(path, "rb") as rf:
+        return rf.read(16).startswith(b"SQLite format 3")
+
+
+def iter_hits(
+    path: str, root: str, paths: Optional[Dict[str, str]] = None
+) -> Iterator[Tuple[str, List[int]]]:
+    if is_data_file(path):
+        return iter_data_hits(path, root, paths)
+    return iter_xml_hits(path, root, paths)
+
+
+def merge_hits(rows: Iterable[Tuple[str, Iterable[int]]]) -> Dict[str, array]:
+    acc: Dict[str, set] = {}
+    for f, lines in rows:
+        acc.setdefault(f, set()).update(lines)
+    return {f: array("I", sorted(s)) for f, s in acc.items()}
+
+
+def index_data_rows(
+    rows: Iterable[Tuple[str, str, Iterable[int]]]
+) -> Tuple[Dict[str, array], List[str], Dict[str, Dict[int, array]]]:
+    """Hit arrays and the line -> covering tests index from ``iter_data_rows``
+    rows, consumed as they stream in.
+
+    Returns what ``merge_hits`` would, the node id table and, per file, a map
+    from line to the sorted ids (indexes into the table) of tests that
+    executed it.
+    """
+    hits: Dict[str, set] = {}
+    nodeids: List[str] = []
+    ids: Dict[str, int] = {}
+    acc: Dict[str, Dict[int, set]] = {}
+    for f, ctx, lines in rows:
+        hits.setdefault(f, set()).update(lines)
+        nodeid = test_nodeid(ctx)
+        if nodeid is None:
+            continue
+        tid = ids.get(nodeid)
+        if tid is None:
+            tid = ids[nodeid] = len(nodeids)
+            nodeids.append(nodeid)
+        per_line = acc.setdefault(f, {})
+        for n in lines:
+            per_line.setdefault(n, set()).add(tid)
+    index = {
+        f: {n: array("I", sorted(t)) for n, t in per_line.items()}
+        for f, per_line in acc.items()
+    }
+    files = {f: array("I", sorted(s)) for f, s in hits.items()}
+    return files, nodeids, index
+
+
+def span_hits(hits: "array[int]", a: int, b: int) -> int:
+    """Number of hit lines within ``a..b`` (inclusive)."""
+    return bisect_right(hits, b) - bisect_left(hits, a)
@@ -0,0 +1,251 @@
+"""Ignore-aware enumeration of the Python files CodeGraph indexes.
+
+Inside a git work tree the file list comes from git itself: ``git ls-files``
+for tracked plus untracked-but-not-ignored files, and ``git status
+--porcelain`` for tracked files deleted from the work tree. Elsewhere (or when
+git is unavailable) the tree is walked with ``os.walk``, pruning excluded and
+``.gitignore``d directories before descending into them.
+
+Exclude patterns use ``.gitignore`` syntax and apply on both paths: the
+built-in ``DEFAULT_EXCLUDES``, patterns from a ``.codegraphignore`` file at the
+root and any passed by the caller.
+"""
+
+import os
+import re
+import subprocess
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Directory names pruned anywhere in the tree
+PRUNE_DIRS = frozenset(
+    {
+        ".git",
+        ".hg",
+        ".svn",
+        ".codegraph",
+        "__pycache__",
+        "node_modules",
+        ".venv",
+        "venv",
+        ".tox",
+        ".nox",
+        ".mypy_cache",
+        ".pytest_cache",
+        ".ruff_cache",
+        "site-packages",
+    }
+)
+DEFAULT_EXCLUDES: Tuple[str, ...] = (
+    *(f"{d}/" for d in sorted(PRUNE_DIRS)),
+    "*.egg-info/",
+    "/build/",
+    "/dist/",
+    # Per-run artifacts written by the actuator
+    "logs/actuator/",
+)
+IGNORE_FILE = ".codegraphignore"
+
+
+# --- gitignore patterns --- #
+
+
+def _glob_to_regex(glob: str) -> str:
+    out: List[str] = []
+    i, n = 0, len(glob)
+    while i < n:
+        c = glob[i]
+        if c == "*":
+            if glob[i : i + 2] == "**":
+                i += 2
+                if glob[i : i + 1] == "/":
+                    # "**/" matches zero or more leading directories
+                    out.append("(?:.*/)?")
+                    i += 1
+                else:
+                    out.append(".*")
+                continue
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = glob.find("]", i + 1)
+            if j < 0:
+                out.append(re.escape(c))
+            else:
+                body = glob[i + 1 : j]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = j
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(glob[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+class IgnoreRules:
+    """Ordered gitignore-style rules; the last matching rule wins."""
+
+    def __init__(self) -> None:
+        # (base dir relative to root, compiled pattern, negated, directories only)
+        self.rules: List[Tuple[str, "re.Pattern[str]", bool, bool]] = []
+        self._dirs: Dict[str, bool] = {}
+
+    def add(self, pattern: str, base: str = "") -> None:
+        pat = pattern.rstrip("\n")
+        if not pat.strip() or pat.startswith("#"):
+            return
+        if not pat.endswith("\\ "):
+            pat = pat.rstrip()
+        negate = pat.startswith("!")
+        if negate:
+            pat = pat[1:]
+        elif pat.startswith("\\"):
+            pat = pat[1:]
+        dir_only = pat.endswith("/")
+        pat = pat.rstrip("/")
+        if not pat:
+            return
+        # A slash anywhere but the end anchors the pattern to ``base``
+        anchored = "/" in pat
+        body = _glob_to_regex(pat.lstrip("/"))
+        regex = body if anchored else f"(?:.*/)?{body}"
+        self.rules.append((base, re.compile(regex + r"\Z"), negate, dir_only))
+        self._dirs = {}
+
+    def add_lines(self, lines: Iterable[str], base: str = "") -> None:
+        for line in lines:
+            self.add(line, base)
+
+    def add_file(self, path: str, base: str = "") -> None:
+        if not os.path.isfile(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as rf:
+                self.add_lines(rf, base)
+        except OSError:
+            pass
+
+    def ignored(self, rel: str, is_dir: bool = False) -> bool:
+        """Whether ``rel`` (posix path relative to the root) is ignored."""
+        result = False
+        for base, rx, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not rel.startswith(base + "/"):
+                    continue
+                sub = rel[len(base) + 1 :]
+            else:
+                sub = rel
+            if rx.match(sub):
+                result = not negate
+        return result
+
+    def ignored_path(self, rel: str) -> bool:
+        """Like ``ignored`` but also true when any parent directory is."""
+        parent = rel.rpartition("/")[0]
+        return bool(parent and self._dir_ignored(parent)) or self.ignored(rel)
+
+    def _dir_ignored(self, rel: str) -> bool:
+        hit = self._dirs.get(rel)
+        if hit is None:
+            parent = rel.rpartition("/")[0]
+            hit = bool(parent and self._dir_ignored(parent)) or self.ignored(rel, True)
+            self._dirs[rel] = hit
+        return hit
+
+
+def exclude_rules(root: str, excludes: Optional[Iterable[str]] = None) -> IgnoreRules:
+    rules = IgnoreRules()
+    rules.add_lines(DEFAULT_EXCLUDES)
+    rules.add_file(os.path.join(root, IGNORE_FILE))
+    rules.add_lines(excludes or ())
+    return rules
+
+
+# --- Enumeration --- #
+
+
+def _git(root: str, *args: str) -> Optional[bytes]:
+    try:
+        proc = subprocess.run(
+            ["git", "-C", root, *args],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            timeout=60,
+        )
+    except Exception:
+        return None
+    return proc.stdout if proc.returncode == 0 else None
+
+
+def git_files(root: str, suffix: str = ".py") -> Optional[List[str]]:
+    """Root-relative paths git sees under ``root``: tracked files still present
+    plus untracked files not ignored. None when ``root`` is not in a work tree
+    or the listing is empty (e.g. ``root`` sits inside an ignored directory)."""
+    listed = _git(
+        root, "ls-files", "-z", "--cached", "--others", "--exclude-standard",
+        "--", f"*{suffix}",
+    )
+    if not listed:
+        return None
+    files = {os.fsdecode(p) for p in listed.split(b"\0") if p}
+    status = _git(root, "status", "--porcelain", "-z", "--untracked-files=no", "--", ".")
+    if status:
+        # Porcelain paths are relative to the top level, not ``root``
+        prefix = os.fsdecode(_git(root, "rev-parse", "--show-prefix") or b"").strip()
+        entries = status.split(b"\0")
+        i = 0
+        while i < len(entries):
+            entry = entries[i]
+            i += 1
+            if len(entry) < 4:
+                continue
+            xy, path = entry[:2], os.fsdecode(entry[3:])
+            if xy[:1] in (b"R", b"C"):
+                i += 1  # -z puts the rename source in the next field
+            if b"D" in xy and path.startswith(prefix):
+                files.discard(path[len(prefix) :])
+    return sorted(files)
+
+
+def walk_files(root: str, rules: IgnoreRules, suffix: str = ".py") -> List[str]:
+    """Root-relative paths from a pruned walk honouring nested .gitignore files."""
+    rules.add_file(os.path.join(root, ".git", "info", "exclude"))
+    out: List[str] = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel_dir = os.path.relpath(dirpath, root).replace(os.sep, "/")
+        rel_dir = "" if rel_dir == "." else rel_dir
+        if ".gitignore" in filenames:
+            rules.add_file(os.path.join(dirpath, ".gitignore"), rel_dir)
+        prefix = rel_dir + "/" if rel_dir else ""
+        dirnames[:] = sorted(
+            d
+            for d in dirnames
+            if d not in PRUNE_DIRS and not rules.ignored(prefix + d, is_dir=True)
+        )
+        for fn in filenames:
+            if fn.endswith(suffix) and not rules.ignored(prefix + fn):
+                out.append(prefix + fn)
+    return out
+
+
+def list_files(
+    root: str,
+    excludes: Optional[Iterable[str]] = None,
+    suffix: str = ".py",
+    use_git: bool = True,
+) -> List[str]:
+    """Absolute paths of the ``suffix`` files to index under ``root``."""
+    root = os.path.abspath(root)
+    rules = exclude_rules(root, excludes)
+    rel = git_files(root, suffix) if use_git else None
+    if rel is not None:
+        rel = [p for p in rel if not rules.ignored_path(p)]
+    else:
+        rel = walk_files(root, rules, suffix)
+    return sorted(os.path.join(root, *p.split("/")) for p in rel)
@@ -0,0 +1,244 @@
+"""CSR export of CodeGraph's call, import and containment graphs.
+
+Nodes get dense integer ids: the indexed symbols (modules included) first, then
+external endpoints (unresolved callees, imported modules outside the repo).
+Each graph is stored as compressed sparse rows, the layout
+``scipy.sparse.csr_matrix((data, indices, indptr))`` expects:
+
+    <kind>_indptr   int64, n_nodes + 1: row i spans indices[indptr[i]:indptr[i + 1]]
+    <kind>_indices  int32: target node ids, sorted and unique within each row
+
+for ``kind`` in ``calls`` (caller -> callee), ``imports`` (module -> entries of
+``module_imports``) and ``contains`` (symbol -> directly nested symbol). The
+string table is ``strings_offsets`` (int64, n_nodes + 1) into the UTF-8 bytes
+of ``strings_data``, and ``meta`` holds JSON (root, node counts, kinds).
+
+Every array is a plain ``.npy`` file, either in a directory or in an
+uncompressed ``.npz``, and is written without numpy. ``load_csr``
+memory-maps the file(s). Arrays come back as numpy arrays when numpy is
+installed and as ``memoryview``s otherwise; neither copies the data.
+"""
+
+import ast
+import json
+import mmap
+import os
+import struct
+import sys
+import zipfile
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+KINDS = ("calls", "imports", "contains")
+_VERSION = 1
+_MAGIC = b"\x93NUMPY"
+# array typecode -> .npy dtype descr (little-endian on disk)
+_DESCR = {"i": "<i4", "q": "<i8", "B": "|u1"}
+_TYPECODE = {v: k for k, v in _DESCR.items()}
+
+try:
+    import numpy as _np  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - numpy is optional
+    _np = None
+
+
+# --- Building --- #
+
+
+def _csr(n: int, edges: Iterator[Tuple[int, int]]) -> Tuple["array[int]", "array[int]"]:
+    rows: Dict[int, set] = {}
+    for a, b in edges:
+        rows.setdefault(a, set()).add(b)
+    indptr = array("q", [0])
+    indices = array("i")
+    for i in range(n):
+        targets = rows.get(i)
+        if targets:
+            indices.extend(sorted(targets))
+        indptr.append(len(indices))
+    return indptr, indices
+
+
+def csr_arrays(graph: Any) -> Dict[str, "array[int]"]:
+    """Name -> array of every member of the export."""
+    nodes: List[str] = list(graph.symbols_by_fqn)
+    ids: Dict[str, int] = {f: i for i, f in enumerate(nodes)}
+    n_symbols = len(nodes)
+
+    def node(name: str) -> int:
+        i = ids.get(name)
+        if i is None:
+            i = ids[name] = len(nodes)
+            nodes.append(name)
+        return i
+
+    calls = [(node(a), node(b)) for a, b in graph.iter_calls()]
+    imports = [
+        (node(m), node(dep)) for m, deps in graph.module_imports.items() for dep in deps
+    ]
+    contains = [
+        (ids[p], ids[c]) for p, kids in graph._children_index().items() for c in kids
+    ]
+    n = len(nodes)
+    out: Dict[str, "array[int]"] = {}
+    for kind, edges in (("calls", calls), ("imports", imports), ("contains", contains)):
+        out[f"{kind}_indptr"], out[f"{kind}_indices"] = _csr(n, iter(edges))
+
+    offsets = array("q", [0])
+    data = bytearray()
+    for s in nodes:
+        data += s.encode("utf-8")
+        offsets.append(len(data))
+    out["strings_offsets"] = offsets
+    out["strings_data"] = array("B", bytes(data))
+    meta = {
+        "version": _VERSION,
+        "root": graph.root,
+        "nodes": n,
+        "symbols": n_symbols,
+        "kinds": list(KINDS),
+    }
+    out["meta"] = array("B", json.dumps(meta).encode("utf-8"))
+    return out
+
+
+# --- .npy / .npz writing --- #
+
+
+def _npy_header(arr: "array[int]") -> bytes:
+    d = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (
+        _DESCR[arr.typecode],
+        len(arr),
+    )
+    # Magic + version + length + dict + padding + "\n" is a multiple of 64
+    pad = -(len(_MAGIC) + 4 + len(d) + 1) % 64
+    text = (d + " " * pad + "\n").encode("latin1")
+    return _MAGIC + b"\x01\x00" + struct.pack("<H", len(text)) + text
+
+
+def _npy_bytes(arr: "array[int]") -> bytes:
+    if sys.byteorder == "big" and arr.itemsize > 1:
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def save_csr(graph: Any, path: str) -> str:
+    """Write the export to ``path``: an uncompressed ``.npz`` when the name
+    ends in ``.npz``, otherwise a directory of ``.npy`` files."""
+    arrays = csr_arrays(graph)
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    if path.endswith(".npz"):
+        tmp = path + ".tmp"
+        with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for name, arr in arrays.items():
+                with zf.open(name + ".npy", "w", force_zip64=True) as wf:
+                    wf.write(_npy_header(arr))
+                    wf.write(_npy_bytes(arr))
+        os.replace(tmp, path)
+    else:
+        os.makedirs(path, exist_ok=True)
+        for name, arr in arrays.items():
+            with open(os.path.join(path, name + ".npy"), "wb") as wf:
+                wf.write(_npy_header(arr))
+                wf.write(_npy_bytes(arr))
+    return path
+
+
+# --- Loading --- #
+
+
+def _parse_header(buf: Any, offset: int) -> Tuple[str, int, int]:
+    """(descr, length, data offset) of the .npy member starting at ``offset``."""
+    if bytes(buf[offset : offset + 6]) != _MAGIC:
+        raise ValueError("not a .npy array")
+    major = buf[offset + 6]
+    if major == 1:
+        (hlen,) = struct.unpack("<H", bytes(buf[offset + 8 : offset + 10]))
+        start = offset + 10
+    else:
+        (hlen,) = struct.unpack("<I", bytes(buf[offset + 8 : offset + 12]))
+        start = offset + 12
+    header = ast.literal_eval(bytes(buf[start : start + hlen]).decode("latin1"))
+    if header.get("fortran_order") or len(header["shape"]) != 1:
+        raise ValueError("only 1-d C-order arrays are supported")
+    return header["descr"], int(header["shape"][0]), start + hlen
+
+
+def _view(buf: Any, offset: int) -> Any:
+    descr, n, start = _parse_header(buf, offset)
+    if _np is not None:
+        return _np.frombuffer(buf, dtype=_np.dtype(descr), count=n, offset=start)
+    code = _TYPECODE.get(descr)
+    if code is None:
+        raise ValueError(f"unsupported dtype {descr}")
+    size = array(code).itemsize
+    raw = memoryview(buf)[start : start + n * size]
+    if sys.byteorder == "big" and size > 1:  # pragma: no cover
+        arr = array(code, raw.tobytes())
+        arr.byteswap()
+        return memoryview(arr)
+    return raw.cast(code)
+
+
+def _map(path: str) -> Any:
+    with open(path, "rb") as rf:
+        if not os.fstat(rf.fileno()).st_size:
+            return b""
+        return mmap.mmap(rf.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class CSRGraph:
+    """Memory-mapped CSR export (see the module docstring for the layout)."""
+
+    def __init__(self, arrays: Dict[str, Any]) -> None:
+        self.arrays = arrays
+        self.meta: Dict[str, Any] = json.loads(bytes(arrays["meta"]).decode("utf-8"))
+        self._ids: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return int(self.meta["nodes"])
+
+    def indptr(self, kind: str) -> Any:
+        return self.arrays[f"{kind}_indptr"]
+
+    def indices(self, kind: str) -> Any:
+        return self.arrays[f"{kind}_indices"]
+
+    def node(self, i: int) -> str:
+        off = self.arrays["strings_offsets"]
+        return bytes(self.arrays["strings_data"][off[i] : off[i + 1]]).decode("utf-8")
+
+    def node_id(self, name: str) -> Optional[int]:
+        """Id of ``name``; the name -> id map is decoded on first use."""
+        if self._ids is None:
+            self._ids = {self.node(i): i for i in range(len(self))}
+        return self._ids.get(name)
+
+    def is_symbol(self, i: int) -> bool:
+        return i < int(self.meta["symbols"])
+
+    def successors(self, kind: str, i: int) -> Any:
+        ptr = self.indptr(kind)
+        return self.indices(kind)[ptr[i] : ptr[i + 1]]
+
+
+def load_csr(path: str) -> CSRGraph:
+    """Memory-map an export written by ``save_csr``."""
+    arrays: Dict[str, Any] = {}
+    if os.path.isdir(path):
+        for fn in sorted(os.listdir(path)):
+            if fn.endswith(".npy"):
+                arrays[fn[:-4]] = _view(_map(os.path.join(path, fn)), 0)
+        return CSRGraph(arrays)
+    buf = _map(path)
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{info.filename} is compressed; cannot memory-map")
+            # Data follows the local header: 30 fixed bytes + name + extra
+            local = info.header_offset
+            name_len, extra_len = struct.unpack("<HH", buf[local + 26 : local + 30])
+            arrays[info.filename[:-4]] = _view(buf, local + 30 + name_len + extra_len)
+    return CSRGraph(arrays)
@@ -0,0 +1,333 @@
+"""Immutable, memory-mapped CodeGraph snapshot for read-only workers.
+
+``write_snapshot`` serializes the query subset of a CodeGraph into one file;
+``GraphSnapshot`` maps it read-only and answers ``find_symbol``, ``defs_in``,
+``who_calls``, ``tests_for_module``, ``module_for_file`` and
+``file_for_module`` in place. No per-symbol Python objects are built. Every
+process mapping the same file shares one physical copy through the page
+cache.
+
+Layout: ``MAGIC``, a u64 length, a JSON header (version, root, and per-section
+``[offset, typecode, count]``), then 8-byte-aligned little-endian sections:
+
+    str_off, str_data   string table, sorted by UTF-8 bytes (u64 offsets)
+    sym                 11 u32 per symbol: fqn, name, qualname, kind, module,
+                        file, line, end_line, doc, signature, returns
+    sym_by_name         symbol indexes ordered by name (graph order within a name)
+    mod, mod_defs       5 u32 per module (module, file, is_test, start, count),
+                        sorted by module; defs are FQN string ids
+    file_mod            (file, module) pairs sorted by file
+    refs, refs_callers  (short name, start, count) sorted by short name; callers
+    tests, tests_vals   (module key, start, count) sorted by key; test modules
+
+String ids follow the sort order, so a name is found by bisecting the table and
+every keyed table is bisected by string id. ``NONE`` marks a missing string.
+The file is replaced atomically, so mapped readers keep a consistent view.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from tools.code_graph import Symbol, _path_key
+
+MAGIC = b"CGSNAP\x00\x01"
+_VERSION = 1
+NONE = 0xFFFFFFFF
+SNAPSHOT_FILE = "snapshot.bin"
+_SYM_WIDTH = 11
+_MOD_WIDTH = 5
+
+
+# --- Writing --- #
+
+
+class _Strings:
+    def __init__(self) -> None:
+        self.ids: Dict[str, int] = {}
+
+    def add(self, s: Optional[str]) -> None:
+        if s is not None:
+            self.ids.setdefault(s, 0)
+
+    def freeze(self) -> Tuple[List[bytes], Dict[str, int]]:
+        ordered = sorted((s.encode("utf-8"), s) for s in self.ids)
+        self.ids = {s: i for i, (_, s) in enumerate(ordered)}
+        return [b for b, _ in ordered], self.ids
+
+
+def _keyed(
+    items: Iterable[Tuple[str, List[str]]], sid: Dict[str, int]
+) -> Tuple["array[int]", "array[int]"]:
+    """(key, start, count) records sorted by key id, plus the flat value ids."""
+    rows = sorted((sid[k], [sid[v] for v in vals]) for k, vals in items)
+    table, values = array("I"), array("I")
+    for key, vals in rows:
+        table.extend((key, len(values), len(vals)))
+        values.extend(vals)
+    return table, values
+
+
+def write_snapshot(graph: Any, path: str) -> str:
+    syms = list(graph.symbols_by_fqn.values())
+    s = graph._strings.strings
+    refs = {short: [s[a] for a in arr[0::2]] for short, arr in graph.refs_by_short.items()}
+
+    st = _Strings()
+    for sym in syms:
+        for v in (sym.fqn, sym.name, sym.qualname, sym.kind, sym.module, sym.file):
+            st.add(v)
+        for v in (sym.doc, sym.signature, sym.returns):
+            st.add(v)
+    for m, mi in graph.modules.items():
+        st.add(m)
+        st.add(mi.file)
+        st.add(_path_key(mi.file))
+        for d in mi.defs:
+            st.add(d)
+    for short, callers in refs.items():
+        st.add(short)
+        for c in callers:
+            st.add(c)
+    for key, tests in graph.module_to_tests.items():
+        st.add(key)
+        for t in tests:
+            st.add(t)
+    blobs, sid = st.freeze()
+
+    def ref(v: Optional[str]) -> int:
+        return NONE if v is None else sid[v]
+
+    sections: Dict[str, "array[int]"] = {}
+    str_off = array("Q", [0])
+    total = 0
+    for b in blobs:
+        total += len(b)
+        str_off.append(total)
+    sections["str_off"] = str_off
+    sections["str_data"] = array("B", b"".join(blobs))
+
+    sym = array("I")
+    for x in syms:
+        sym.extend(
+            (
+                sid[x.fqn], sid[x.name], sid[x.qualname], sid[x.kind], sid[x.module],
+                sid[x.file], x.line, x.end_line, ref(x.doc), ref(x.signature),
+                ref(x.returns),
+            )
+        )
+    sections["sym"] = sym
+    sections["sym_by_name"] = array(
+        "I", sorted(range(len(syms)), key=lambda i: (sid[syms[i].name], i))
+    )
+
+    mod, mod_defs = array("I"), array("I")
+    for m in sorted(graph.modules, key=sid.__getitem__):
+        mi = graph.modules[m]
+        mod.extend((sid[m], sid[mi.file], int(mi.is_test), len(mod_defs), len(mi.defs)))
+        mod_defs.extend(sid[d] for d in mi.defs)
+    sections["mod"], sections["mod_defs"] = mod, mod_defs
+    file_mod = array("I")
+    paths = ((_path_key(mi.file), m) for m, mi in graph.modules.items())
+    for f, m in sorted((sid[p], sid[m]) for p, m in paths):
+        file_mod.extend((f, m))
+    sections["file_mod"] = file_mod
+    sections["refs"], sections["refs_callers"] = _keyed(refs.items(), sid)
+    sections["tests"], sections["tests_vals"] = _keyed(graph.module_to_tests.items(), sid)
+
+    # Header offsets depend on the header's own length; iterate to a fixed point
+    layout: Dict[str, List[Any]] = {}
+    header = b""
+    while True:
+        pos = len(MAGIC) + 8 + len(header)
+        new_layout: Dict[str, List[Any]] = {}
+        for name, arr in sections.items():
+            pos += -pos % 8
+            new_layout[name] = [pos, arr.typecode, len(arr)]
+            pos += len(arr) * arr.itemsize
+        new_header = json.dumps(
+            {"version": _VERSION, "root": graph.root, "sections": new_layout}
+        ).encode("utf-8")
+        if new_header == header:
+            break
+        header, layout = new_header, new_layout
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp, "wb") as wf:
+        wf.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        for name, arr in sections.items():
+            wf.write(b"\0" * (layout[name][0] - wf.tell()))
+            if sys.byteorder == "big" and arr.itemsize > 1:  # pragma: no cover
+                arr = array(arr.typecode, arr)
+                arr.byteswap()
+            wf.write(arr.tobytes())
+    os.replace(tmp, path)
+    return path
+
+
+# --- Reading --- #
+
+
+class GraphSnapshot:
+    """Read-only CodeGraph queries answered from a mapped snapshot file."""
+
+    def __init__(self, path: str) -> None:
+        if os.path.isdir(path):
+            path = os.path.join(path, ".codegraph", SNAPSHOT_FILE)
+        self.path = path
+        with open(path, "rb") as rf:
+            self._mm = mmap.mmap(rf.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = self._mm
+        if buf[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: not a CodeGraph snapshot")
+        (hlen,) = struct.unpack_from("<Q", buf, len(MAGIC))
+        start = len(MAGIC) + 8
+        header = json.loads(bytes(buf[start : start + hlen]).decode("utf-8"))
+        if header.get("version") != _VERSION:
+            raise ValueError(f"{path}: unsupported snapshot version")
+        self.root: str = header["root"]
+        self._view = memoryview(buf)
+        for name, (off, code, n) in header["sections"].items():
+            size = array(code).itemsize
+            raw = self._view[off : off + n * size]
+            if sys.byteorder == "big" and size > 1:  # pragma: no cover
+                arr = array(code, raw.tobytes())
+                arr.byteswap()
+                setattr(self, "_" + name, arr)
+            else:
+                setattr(self, "_" + name, raw.cast(code))
+        self._nstr = len(self._str_off) - 1
+
+    def close(self) -> None:
+        # Section views hold exports of the mapping; release them first
+        for name, v in list(vars(self).items()):
+            if isinstance(v, memoryview) and name != "_view":
+                v.release()
+        self._view.release()
+        self._mm.close()
+
+    def __enter__(self) -> "GraphSnapshot":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # --- String table --- #
+
+    def _str(self, i: int) -> Optional[str]:
+        if i == NONE:
+            return None
+        return bytes(self._str_data[self._str_off[i] : self._str_off[i + 1]]).decode("utf-8")
+
+    def _sid(self, s: str) -> Optional[int]:
+        key = s.encode("utf-8")
+        off, data = self._str_off, self._str_data
+        lo, hi = 0, self._nstr
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(data[off[mid] : off[mid + 1]]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._nstr and bytes(data[off[lo] : off[lo + 1]]) == key:
+            return lo
+        return None
+
+    @staticmethod
+    def _bisect(table: Any, width: int, key: int, field: int = 0) -> int:
+        """First record index whose ``field`` is >= ``key``."""
+        lo, hi = 0, len(table) // width
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if table[mid * width + field] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _record(self, table: Any, width: int, key: Optional[int]) -> Optional[int]:
+        if key is None:
+            return None
+        i = self._bisect(table, width, key)
+        if i < len(table) // width and table[i * width] == key:
+            return i * width
+        return None
+
+    def _values(self, table: Any, values: Any, key: str) -> List[str]:
+        r = self._record(table, 3, self._sid(key))
+        if r is None:
+            return []
+        start, n = table[r + 1], table[r + 2]
+        return [self._str(v) or "" for v in values[start : start + n]]
+
+    # --- Queries --- #
+
+    def _symbol(self, i: int) -> Symbol:
+        f = self._sym[i * _SYM_WIDTH : (i + 1) * _SYM_WIDTH]
+        return Symbol(
+            fqn=self._str(f[0]) or "",
+            name=self._str(f[1]) or "",
+            qualname=self._str(f[2]) or "",
+            kind=self._str(f[3]) or "",
+            module=self._str(f[4]) or "",
+            file=self._str(f[5]) or "",
+            line=f[6],
+            end_line=f[7],
+            doc=self._str(f[8]),
+            signature=self._str(f[9]),
+            returns=self._str(f[10]),
+        )
+
+    def find_symbol(self, name: str) -> List[Symbol]:
+        key = self._sid(name)
+        if key is None:
+            return []
+        order, sym = self._sym_by_name, self._sym
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if sym[order[mid] * _SYM_WIDTH + 1] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        out: List[Symbol] = []
+        while lo < len(order) and sym[order[lo] * _SYM_WIDTH + 1] == key:
+            out.append(self._symbol(order[lo]))
+            lo += 1
+        return out
+
+    def defs_in(self, module: str) -> List[str]:
+        r = self._record(self._mod, _MOD_WIDTH, self._sid(module))
+        if r is None:
+            return []
+        start, n = self._mod[r + 3], self._mod[r + 4]
+        return [self._str(d) or "" for d in self._mod_defs[start : start + n]]
+
+    def who_calls(self, fqn: str) -> List[str]:
+        # Same short-name semantics as CodeGraph.who_calls
+        return self._values(self._refs, self._refs_callers, fqn.split(".")[-1])
+
+    def tests_for_module(self, module: str) -> List[str]:
+        out = set(self._values(self._tests, self._tests_vals, module.split(".")[0]))
+        out.update(self._values(self._tests, self._tests_vals, module))
+        return sorted(out)
+
+    def module_for_file(self, path: str) -> Optional[str]:
+        # Same path normalization and symlink handling as CodeGraph
+        p = path if os.path.isabs(path) else os.path.join(self.root, path)
+        r = self._record(self._file_mod, 2, self._sid(_path_key(p)))
+        if r is None:
+            rel = os.path.relpath(os.path.realpath(p), os.path.realpath(self.root))
+            if rel != os.pardir and not rel.startswith(os.pardir + os.sep):
+                key = _path_key(os.path.join(self.root, rel))
+                r = self._record(self._file_mod, 2, self._sid(key))
+        return None if r is None else self._str(self._file_mod[r + 1])
+
+    def file_for_module(self, module: str) -> Optional[str]:
+        r = self._record(self._mod, _MOD_WIDTH, self._sid(module))
+        return None if r is None else self._str(self._mod[r + 1])
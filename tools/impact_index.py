@@ -0,0 +1,187 @@
+"""Reverse-dependency index with memoized transitive impact closures.
+
+``ImpactIndex`` keeps forward (module -> modules it imports) and reverse
+(module -> modules importing it) edges up to date as modules are reindexed.
+Transitive closures are computed on the condensation of the reverse graph
+(strongly connected components, so import cycles collapse to one node) and
+memoized per component until an edge changes.
+
+Alongside the resolved edges it keeps each module's raw import targets (and
+their dotted prefixes), so ``naming`` finds importers of a module that did not
+exist yet when they were indexed.
+"""
+
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class ImpactIndex:
+    def __init__(self) -> None:
+        self.deps: Dict[str, Set[str]] = {}
+        self.rdeps: Dict[str, Set[str]] = {}
+        self._comp: Optional[Dict[str, int]] = None  # module -> component id
+        self._members: List[List[str]] = []
+        self._dag: List[Set[int]] = []  # component -> components importing it
+        self._memo: Dict[int, frozenset] = {}
+        self.names: Dict[str, Set[str]] = {}  # module -> raw targets + prefixes
+        self.rnames: Dict[str, Set[str]] = {}
+
+    # --- Maintenance --- #
+
+    def set_deps(self, module: str, deps: Iterable[str]) -> None:
+        new = set(deps)
+        new.discard(module)
+        old = self.deps.get(module, set())
+        if new == old and module in self.deps:
+            return
+        for d in old - new:
+            importers = self.rdeps.get(d)
+            if importers is not None:
+                importers.discard(module)
+        for d in new - old:
+            self.rdeps.setdefault(d, set()).add(module)
+        self.deps[module] = new
+        self._invalidate()
+
+    def set_names(self, module: str, targets: Iterable[str]) -> None:
+        new: Set[str] = set()
+        for t in targets:
+            while t and t not in new:
+                new.add(t)
+                t = t.rpartition(".")[0]
+        old = self.names.get(module, set())
+        for t in old - new:
+            named = self.rnames.get(t)
+            if named is not None:
+                named.discard(module)
+                if not named:
+                    del self.rnames[t]
+        for t in new - old:
+            self.rnames.setdefault(t, set()).add(module)
+        self.names[module] = new
+
+    def remove(self, module: str) -> None:
+        self.set_deps(module, ())
+        self.deps.pop(module, None)
+        self.set_names(module, ())
+        self.names.pop(module, None)
+
+    def _invalidate(self) -> None:
+        self._comp = None
+        self._memo = {}
+
+    # --- Query --- #
+
+    def importers(self, module: str) -> List[str]:
+        return sorted(self.rdeps.get(module, ()))
+
+    def naming(self, module: str) -> List[str]:
+        """Modules whose raw import targets are ``module`` or lie inside it."""
+        return sorted(self.rnames.get(module, ()))
+
+    def impacted(self, modules: Iterable[str], depth: Optional[int] = None) -> List[str]:
+        """``modules`` plus every module importing them, transitively or up to
+        ``depth`` import hops."""
+        seeds = set(modules)
+        if depth is not None:
+            seen = set(seeds)
+            frontier = seeds
+            for _ in range(max(0, depth)):
+                nxt = set()
+                for m in frontier:
+                    nxt.update(self.rdeps.get(m, ()))
+                frontier = nxt - seen
+                if not frontier:
+                    break
+                seen |= frontier
+            return sorted(seen)
+        if self._comp is None:
+            self._condense()
+        comp = self._comp or {}
+        out: Set[str] = set()
+        for m in seeds:
+            c = comp.get(m)
+            if c is None:
+                out.add(m)
+            else:
+                out |= self._closure(c)
+        return sorted(out)
+
+    # --- Condensation --- #
+
+    def _condense(self) -> None:
+        """Tarjan's SCC algorithm (iterative) over the reverse-import graph."""
+        nodes = set(self.deps) | set(self.rdeps)
+        index: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        on_stack: Set[str] = set()
+        stack: List[str] = []
+        comp: Dict[str, int] = {}
+        members: List[List[str]] = []
+        counter = 0
+        for start in nodes:
+            if start in index:
+                continue
+            work = [(start, iter(self.rdeps.get(start, ())))]
+            index[start] = low[start] = counter
+            counter += 1
+            stack.append(start)
+            on_stack.add(start)
+            while work:
+                v, it = work[-1]
+                advanced = False
+                for w in it:
+                    if w not in index:
+                        index[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack.add(w)
+                        work.append((w, iter(self.rdeps.get(w, ()))))
+                        advanced = True
+                        break
+                    if w in on_stack:
+                        low[v] = min(low[v], index[w])
+                if advanced:
+                    continue
+                work.pop()
+                if work:
+                    u = work[-1][0]
+                    low[u] = min(low[u], low[v])
+                if low[v] == index[v]:
+                    cid = len(members)
+                    group: List[str] = []
+                    while True:
+                        w = stack.pop()
+                        on_stack.discard(w)
+                        comp[w] = cid
+                        group.append(w)
+                        if w == v:
+                            break
+                    members.append(group)
+        dag: List[Set[int]] = [set() for _ in members]
+        for m, importers in self.rdeps.items():
+            c = comp[m]
+            for imp in importers:
+                ci = comp[imp]
+                if ci != c:
+                    dag[c].add(ci)
+        self._comp, self._members, self._dag, self._memo = comp, members, dag, {}
+
+    def _closure(self, c: int) -> frozenset:
+        memo = self._memo
+        if c in memo:
+            return memo[c]
+        # Post-order over the DAG without recursion
+        stack = [(c, False)]
+        while stack:
+            x, expanded = stack.pop()
+            if x in memo:
+                continue
+            if expanded:
+                acc = set(self._members[x])
+                for y in self._dag[x]:
+                    acc |= memo[y]
+                memo[x] = frozenset(acc)
+            else:
+                stack.append((x, True))
+                stack.extend((y, False) for y in self._dag[x] if y not in memo)
+        return memo[c]
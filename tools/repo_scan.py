@@ -1,10 +1,64 @@
+import os
+import re
 import subprocess
-from typing import List
+from typing import Any, Iterator, List, Optional, Tuple
 
+from tools.file_enum import PRUNE_DIRS
 
-def ripgrep(pattern: str, path: str = ".") -> List[str]:
+
+def ripgrep(pattern: str, path: str = ".", graph: Optional[Any] = None) -> List[str]:
+    """``rg -n pattern path`` lines.
+
+    Without rg on PATH, a ``graph`` already loaded by the caller answers through
+    its trigram-narrowed ``search_refs`` (indexed Python files only). Without
+    one, every text file under ``path`` is scanned in Python.
+    """
     try:
         out = subprocess.check_output(["rg", "-n", pattern, path], text=True)
         return out.splitlines()
+    except FileNotFoundError:
+        pass
+    except Exception:
+        return []
+    try:
+        if graph is not None:
+            return [
+                f"{os.path.join(graph.root, rel)}:{ln}:{txt}"
+                for rel, ln, txt in graph.search_refs(pattern)
+            ]
+        return list(_scan(pattern, path))
     except Exception:
         return []
+
+
+def _scan(pattern: str, path: str) -> Iterator[str]:
+    try:
+        rx = re.compile(pattern)
+    except re.error:
+        rx = re.compile(re.escape(pattern))
+    if os.path.isfile(path):
+        # Like rg, a single file is reported without its name
+        for ln, txt in _matches(rx, path):
+            yield f"{ln}:{txt}"
+        return
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = sorted(
+            d for d in dirnames if d not in PRUNE_DIRS and not d.startswith(".")
+        )
+        for fn in sorted(filenames):
+            fp = os.path.join(dirpath, fn)
+            for ln, txt in _matches(rx, fp):
+                yield f"{fp}:{ln}:{txt}"
+
+
+def _matches(rx: "re.Pattern[str]", fp: str) -> Iterator[Tuple[int, str]]:
+    try:
+        with open(fp, "rb") as rf:
+            if b"\0" in rf.read(8192):
+                return  # binary
+        with open(fp, "r", encoding="utf-8", errors="ignore") as rf:
+            for i, line in enumerate(rf, start=1):
+                if rx.search(line):
+                    yield i, line.rstrip("\n")
+    except OSError:
+        return
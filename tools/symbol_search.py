@@ -0,0 +1,92 @@
+"""Ranked full-text search over CodeGraph symbols.
+
+Symbols are indexed on four fields (name, qualname, doc, signature) whose terms
+are identifier parts: ``parseHTTPResponse_v2`` -> ``parse http response v2``.
+``SymbolSearchIndex`` scores with BM25 over field-weighted term frequencies; the
+SQLite backend uses FTS5's ``bm25()`` with the same weights and tokenization.
+"""
+
+import heapq
+import math
+import re
+from typing import Any, Dict, List, Tuple
+
+# name, qualname, doc, signature
+FIELD_WEIGHTS = (3.0, 1.0, 1.0, 0.5)
+
+_WORD = re.compile(r"[A-Za-z0-9]+")
+_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+
+def search_terms(text: str) -> List[str]:
+    """Lower-cased identifier parts of ``text`` (snake_case and camelCase split)."""
+    out: List[str] = []
+    for word in _WORD.findall(text or ""):
+        for part in _CAMEL.findall(word):
+            if len(part) > 1:
+                out.append(part.lower())
+    return out
+
+
+def symbol_fields(sym: Any) -> Tuple[str, str, str, str]:
+    return (sym.name or "", sym.qualname or "", sym.doc or "", sym.signature or "")
+
+
+class SymbolSearchIndex:
+    """Incrementally maintained inverted index with BM25 ranking."""
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self) -> None:
+        self.postings: Dict[str, Dict[str, float]] = {}  # term -> fqn -> tf
+        self.doc_len: Dict[str, float] = {}
+        self.total_len = 0.0
+
+    def add(self, fqn: str, fields: Tuple[str, ...]) -> None:
+        if fqn in self.doc_len:
+            self.remove(fqn)
+        tf: Dict[str, float] = {}
+        length = 0.0
+        for text, w in zip(fields, FIELD_WEIGHTS, strict=True):
+            for t in search_terms(text):
+                tf[t] = tf.get(t, 0.0) + w
+                length += w
+        for t, n in tf.items():
+            self.postings.setdefault(t, {})[fqn] = n
+        self.doc_len[fqn] = length
+        self.total_len += length
+
+    def remove(self, fqn: str, fields: Tuple[str, ...] = ()) -> None:
+        length = self.doc_len.pop(fqn, None)
+        if length is None:
+            return
+        self.total_len -= length
+        terms = {t for text in fields for t in search_terms(text)}
+        if not terms:
+            # fields unknown: fall back to scanning the vocabulary
+            terms = {t for t, p in self.postings.items() if fqn in p}
+        for t in terms:
+            p = self.postings.get(t)
+            if p is not None:
+                p.pop(fqn, None)
+                if not p:
+                    del self.postings[t]
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        n_docs = len(self.doc_len)
+        if not n_docs:
+            return []
+        avgdl = (self.total_len / n_docs) or 1.0
+        scores: Dict[str, float] = {}
+        for t in set(search_terms(query)):
+            p = self.postings.get(t)
+            if not p:
+                continue
+            idf = math.log(1.0 + (n_docs - len(p) + 0.5) / (len(p) + 0.5))
+            for fqn, tf in p.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[fqn] / avgdl)
+                scores[fqn] = scores.get(fqn, 0.0) + idf * tf * (self.k1 + 1) / (
+                    tf + norm
+                )
+        return heapq.nsmallest(k, scores.items(), key=lambda kv: (-kv[1], kv[0]))
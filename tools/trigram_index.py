@@ -0,0 +1,209 @@
+"""Trigram index for narrowing regex/literal searches to candidate files.
+
+In the style of Google Code Search: every file is indexed by the set of
+(lower-cased) 3-character substrings it contains. A regex is reduced to a boolean
+query over trigrams that any match must contain (literal runs are ANDed,
+alternations ORed, optional parts dropped); only files satisfying the query are
+scanned. Files are keyed by content hash so the index can be synced against the
+hashes CodeGraph's change detection already maintains.
+
+Each file's trigram list is kept next to the postings, so removing a file only
+touches its own postings, and freed file ids are reused. The persisted index
+stores live files only; postings are rebuilt from the per-file lists on load.
+"""
+
+import marshal
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+try:  # Python 3.11+
+    from re import _parser as _sre_parse  # type: ignore[attr-defined]
+except ImportError:  # pragma: no cover
+    import sre_parse as _sre_parse  # type: ignore[no-redef]
+
+_VERSION = 2
+
+# Trigram query: None matches every file; otherwise ("tri", s), ("and", [...])
+# or ("or", [...]).
+Query = Optional[Tuple[str, Any]]
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _and(parts: List[Query]) -> Query:
+    parts = [p for p in parts if p is not None]
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else ("and", parts)
+
+
+def _literal_query(lit: str) -> Query:
+    if len(lit) < 3:
+        return None
+    return _and([("tri", t) for t in sorted(_trigrams(lit))])
+
+
+def _required(seq: Any) -> Query:
+    """Trigram query implied by a parsed regex sequence."""
+    c = _sre_parse
+    parts: List[Query] = []
+    buf: List[str] = []
+
+    def flush() -> None:
+        if buf:
+            parts.append(_literal_query("".join(buf).lower()))
+            buf.clear()
+
+    for op, av in seq:
+        if op is c.LITERAL:
+            buf.append(chr(av))
+            continue
+        flush()
+        if op is c.SUBPATTERN:
+            parts.append(_required(av[-1]))
+        elif op is c.BRANCH:
+            alts = [_required(s) for s in av[1]]
+            if all(a is not None for a in alts):
+                parts.append(("or", alts))
+        elif op in (c.MAX_REPEAT, c.MIN_REPEAT) or op is getattr(
+            c, "POSSESSIVE_REPEAT", None
+        ):
+            lo, _, item = av
+            if lo >= 1:
+                parts.append(_required(item))
+        elif op is getattr(c, "ATOMIC_GROUP", None):
+            parts.append(_required(av))
+    flush()
+    return _and(parts)
+
+
+def regex_query(pattern: str) -> Query:
+    """Reduce ``pattern`` to a trigram query; None if it cannot be narrowed."""
+    try:
+        return _required(_sre_parse.parse(pattern))
+    except Exception:
+        return _literal_query(pattern.lower())
+
+
+class TrigramIndex:
+    def __init__(self) -> None:
+        self.paths: List[Optional[str]] = []  # file id -> path (None if free)
+        self.ids: Dict[str, int] = {}
+        self.hashes: Dict[str, str] = {}  # path -> content hash it was indexed at
+        self.postings: Dict[str, Set[int]] = {}
+        self.file_trigrams: List[List[str]] = []  # file id -> its trigrams
+        self.free: List[int] = []  # removed file ids, reused by add()
+        self.dirty = False
+
+    # --- Maintenance --- #
+
+    def sync(self, file_hashes: Dict[str, str]) -> None:
+        """Bring the index in line with ``file_hashes`` (path -> content hash),
+        re-reading only files that are new or whose hash changed."""
+        stale = [p for p in self.ids if file_hashes.get(p) != self.hashes.get(p)]
+        self.remove(stale)
+        for p, h in file_hashes.items():
+            if p not in self.ids:
+                self.add(p, h)
+
+    def add(self, path: str, content_hash: str) -> None:
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as rf:
+                text = rf.read().lower()
+        except OSError:
+            return
+        self._insert(path, content_hash, [sys.intern(t) for t in _trigrams(text)])
+        self.dirty = True
+
+    def _insert(self, path: str, content_hash: str, trigrams: List[str]) -> None:
+        if self.free:
+            fid = self.free.pop()
+            self.paths[fid] = path
+            self.file_trigrams[fid] = trigrams
+        else:
+            fid = len(self.paths)
+            self.paths.append(path)
+            self.file_trigrams.append(trigrams)
+        self.ids[path] = fid
+        self.hashes[path] = content_hash
+        for t in trigrams:
+            self.postings.setdefault(t, set()).add(fid)
+
+    def remove(self, paths: Iterable[str]) -> None:
+        for p in paths:
+            fid = self.ids.pop(p, None)
+            self.hashes.pop(p, None)
+            if fid is None:
+                continue
+            for t in self.file_trigrams[fid]:
+                ids = self.postings.get(t)
+                if ids is not None:
+                    ids.discard(fid)
+                    if not ids:
+                        del self.postings[t]
+            self.paths[fid] = None
+            self.file_trigrams[fid] = []
+            self.free.append(fid)
+            self.dirty = True
+
+    # --- Query --- #
+
+    def candidates(self, pattern: str) -> Optional[Set[str]]:
+        """Files that may match ``pattern``; None means the pattern could not be
+        narrowed and every file must be scanned."""
+        ids = self._eval(regex_query(pattern))
+        if ids is None:
+            return None
+        return {p for p in (self.paths[i] for i in ids) if p is not None}
+
+    def _eval(self, q: Query) -> Optional[Set[int]]:
+        if q is None:
+            return None
+        kind, arg = q
+        if kind == "tri":
+            return self.postings.get(arg, set())
+        subs = [self._eval(x) for x in arg]
+        if kind == "or":
+            if any(s is None for s in subs):
+                return None
+            out: Set[int] = set()
+            for s in subs:
+                out |= s  # type: ignore[operator]
+            return out
+        known = sorted((s for s in subs if s is not None), key=len)
+        if not known:
+            return None
+        out = set(known[0])
+        for s in known[1:]:
+            out &= s
+            if not out:
+                break
+        return out
+
+    # --- Persistence --- #
+
+    def save(self, path: str) -> None:
+        live = [(p, self.hashes[p], self.file_trigrams[i]) for p, i in self.ids.items()]
+        data = marshal.dumps({"version": _VERSION, "files": live})
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as wf:
+            wf.write(data)
+        os.replace(tmp, path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: str) -> "TrigramIndex":
+        idx = cls()
+        try:
+            with open(path, "rb") as rf:
+                data = marshal.loads(rf.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return idx
+        if data.get("version") != _VERSION:
+            return idx
+        for p, h, trigrams in data["files"]:
+            idx._insert(p, h, [sys.intern(t) for t in trigrams])
+        return idx
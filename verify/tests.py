@@ -4,12 +4,18 @@ from typing import List, Optional
 import os
 from sandbox.docker_runner import run_in_sandbox
 
+# Where the sandbox mounts the working tree; coverage recorded there carries
+# this prefix (CodeGraph.attach_coverage maps it back via ``paths``)
+SANDBOX_WORKDIR = "/work"
+
 
 def run_tests(
     select_patterns: Optional[List[str]] = None, *, nodeids: Optional[List[str]] = None
 ) -> bool:
-    # Save junit xml to logs/ and coverage xml for later gating
+    # Save junit xml to logs/ and coverage xml for later gating; the raw
+    # coverage.py data file goes next to it (CodeGraph.attach_coverage reads it)
     junit_path = "logs/junit.xml"
+    cov_env = {"COVERAGE_FILE": "logs/.coverage"}
     try:
         os.makedirs(os.path.dirname(junit_path), exist_ok=True)
     except Exception:
@@ -20,6 +26,7 @@ def run_tests(
         "--maxfail=1",
         f"--junitxml={junit_path}",
         "--cov=.",
+        "--cov-context=test",
         "--cov-report=xml:logs/coverage.xml",
         "-o",
         "junit_family=xunit2",
@@ -39,7 +46,7 @@ def run_tests(
             args.extend(["-k", pat])
     # Prefer sandbox when enabled in configs/sandbox.yaml, else local
     try:
-        # Run inside container with repo mounted at /work
+        # Run inside container with repo mounted at SANDBOX_WORKDIR
         timeout = None
         try:
             timeout = int(_os.environ.get("PER_STEP_SECONDS", "0") or 0) or None
@@ -47,10 +54,10 @@ def run_tests(
             timeout = None
         rc = run_in_sandbox(
             args,
-            mounts=[{"source": os.getcwd(), "target": "/work"}],
-            env={},
+            mounts=[{"source": os.getcwd(), "target": SANDBOX_WORKDIR}],
+            env=dict(cov_env),
             timeout=timeout or None,
-            workdir="/work",
+            workdir=SANDBOX_WORKDIR,
         )
         if rc != 0:
             return False
@@ -59,6 +66,7 @@ def run_tests(
         try:
             res = subprocess.run(
                 args,
+                env={**os.environ, **cov_env},
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True,